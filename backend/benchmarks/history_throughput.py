@@ -0,0 +1,73 @@
+"""
+Throughput benchmark: a 500-row history page with the default JSON encoder
+vs. the orjson default response class.
+
+Builds the page from synthetic transaction documents and serves it from
+small in-process apps that differ only in ``default_response_class``. The
+page is served both through a ``response_model`` (FastAPI serializes it and
+hands the result to the response class) and as a plain dict (FastAPI runs
+``jsonable_encoder`` first). A third route serves it through
+services.serialization.render, which /transactions/history uses and which
+bypasses the response class. No database is needed; run from the backend
+directory:
+
+    python -m benchmarks.history_throughput --rows 500 --seconds 3
+"""
+
+import argparse
+import time
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from models.transaction import TransactionPage
+from services.serialization import ORJSONResponse, render
+from benchmarks.response_serialization import documents, project
+
+def build_app(response_class, page):
+    app = FastAPI(default_response_class=response_class)
+
+    @app.get("/history/model", response_model=TransactionPage)
+    async def history_model():
+        return page
+
+    @app.get("/history/dict")
+    async def history_dict():
+        return page
+
+    @app.get("/history/render")
+    async def history_render():
+        return render(TransactionPage, page)
+
+    return app
+
+def throughput(client, path, seconds):
+    body = client.get(path).content
+    requests = 0
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        client.get(path)
+        requests += 1
+    return requests / (time.perf_counter() - start), body
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    page = {"transactions": project(documents(args.rows)), "next_cursor": None}
+    bodies = {}
+    for name, response_class in (("json", JSONResponse), ("orjson", ORJSONResponse)):
+        with TestClient(build_app(response_class, page)) as client:
+            for route in ("model", "dict", "render"):
+                rate, body = throughput(client, f"/history/{route}", args.seconds)
+                bodies.setdefault(route, set()).add(body)
+                print(f"{name:<7} {route:<7} {rate:8.1f} req/s")
+
+    # The encoder must not change what clients receive
+    for route, variants in bodies.items():
+        assert len(variants) == 1, f"{route} responses differ between encoders"
+
+if __name__ == "__main__":
+    main()
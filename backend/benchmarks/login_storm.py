@@ -0,0 +1,104 @@
+"""
+Login-storm benchmark: tail latency of /user/balance during concurrent logins.
+
+Against a running API, a steady stream of cheap balance reads is measured
+first on its own and then while a pool of clients hammers /auth/login.
+With password hashing on the event loop every login stalls the reads on
+that worker; with the hashing pool the reads should barely move. Run from
+the backend directory:
+
+    python -m benchmarks.login_storm --url http://localhost:8001/api --logins 200
+"""
+
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+CREDENTIALS = {"email": "john@example.com", "password": "password123"}
+
+def login(url):
+    response = requests.post(f"{url}/auth/login", json=CREDENTIALS, timeout=60)
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+def read_balances(url, token, stop, samples):
+    headers = {"Authorization": f"Bearer {token}"}
+    with requests.Session() as session:
+        while not stop.is_set():
+            start = time.perf_counter()
+            session.get(f"{url}/user/balance", headers=headers, timeout=60)
+            samples.append((time.perf_counter() - start) * 1000)
+
+def report(name, samples):
+    samples = sorted(samples)
+    print(
+        f"{name:<14} n={len(samples):<6} "
+        f"p50={samples[len(samples) // 2]:8.2f}ms "
+        f"p95={samples[int(len(samples) * 0.95)]:8.2f}ms "
+        f"p99={samples[int(len(samples) * 0.99)]:8.2f}ms "
+        f"max={samples[-1]:8.2f}ms "
+        f"mean={statistics.mean(samples):8.2f}ms"
+    )
+
+def run_readers(url, token, readers, duration, storm=None):
+    stop = threading.Event()
+    samples = []
+    threads = [
+        threading.Thread(target=read_balances, args=(url, token, stop, samples))
+        for _ in range(readers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    if storm:
+        storm()
+    else:
+        time.sleep(duration)
+
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8001/api")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--login-concurrency", type=int, default=32)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--baseline-seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    token = login(args.url)
+
+    baseline = run_readers(args.url, token, args.readers, args.baseline_seconds)
+    report("baseline", baseline)
+
+    login_latencies = []
+    login_statuses = {}
+
+    def timed_login(_):
+        start = time.perf_counter()
+        response = requests.post(f"{args.url}/auth/login", json=CREDENTIALS, timeout=60)
+        login_latencies.append((time.perf_counter() - start) * 1000)
+        login_statuses[response.status_code] = login_statuses.get(response.status_code, 0) + 1
+
+    def storm():
+        with ThreadPoolExecutor(max_workers=args.login_concurrency) as pool:
+            list(pool.map(timed_login, range(args.logins)))
+
+    during_storm = run_readers(args.url, token, args.readers, None, storm=storm)
+    report("during storm", during_storm)
+    report("logins", login_latencies)
+    print(f"login status codes: {login_statuses}")
+
+    # Only shown when the benchmark user has the admin scope
+    stats = requests.get(f"{args.url}/internal/hashing-stats", headers={"Authorization": f"Bearer {token}"}, timeout=10)
+    if stats.ok:
+        print(stats.json())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Throughput benchmark: OTP verifications per second on one worker.
+
+Issues ``--codes`` codes against the MongoDB configured in backend/.env and
+verifies them with ``--concurrency`` requests in flight, first with a wrong
+code (an attempt is counted) and then with the right one (the code is
+consumed). Codes go to an in-memory sink instead of the configured
+delivery, and everything is removed afterwards. Run from the backend
+directory:
+
+    python -m benchmarks.otp_verification --codes 5000 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import time
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).parent.parent / '.env')
+
+from database import get_database
+from services import otp
+
+PURPOSE = "benchmark"
+
+class MemorySink(otp.OTPDelivery):
+    def __init__(self):
+        self.codes = {}
+
+    async def send(self, recipient, code, purpose):
+        self.codes[recipient] = code
+
+async def run_all(calls, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(call):
+        async with semaphore:
+            return await call()
+
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*(bounded(call) for call in calls))
+    return outcomes, time.perf_counter() - start
+
+async def main(codes, concurrency):
+    db = await get_database()
+    sink = MemorySink()
+    emails = [f"otp{i}@benchmark.local" for i in range(codes)]
+    try:
+        issue = [lambda email=email: otp.issue(db, email, PURPOSE, sink=sink) for email in emails]
+        _, elapsed = await run_all(issue, concurrency)
+        print(f"issue          {codes / elapsed:9.0f}/s")
+
+        wrong = [
+            lambda email=email: otp.verify(db, email, PURPOSE, f"{(int(sink.codes[email]) + 1) % 10 ** otp.OTP_LENGTH:0{otp.OTP_LENGTH}d}")
+            for email in emails
+        ]
+        outcomes, elapsed = await run_all(wrong, concurrency)
+        assert set(outcomes) == {otp.INVALID}, set(outcomes)
+        print(f"verify wrong   {codes / elapsed:9.0f}/s")
+
+        right = [lambda email=email: otp.verify(db, email, PURPOSE, sink.codes[email]) for email in emails]
+        outcomes, elapsed = await run_all(right, concurrency)
+        assert set(outcomes) == {otp.VERIFIED}, set(outcomes)
+        print(f"verify right   {codes / elapsed:9.0f}/s")
+        print(f"cache: {otp.otp_cache_stats()}")
+    finally:
+        await db.otp_codes.delete_many({"_id": {"$regex": f"^{PURPOSE}:"}})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--codes", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+    asyncio.run(main(args.codes, args.concurrency))
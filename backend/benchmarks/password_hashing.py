@@ -0,0 +1,62 @@
+"""
+Micro-benchmark: hash and verify cost per password scheme and cost setting.
+
+Prints the mean and p95 time of pwd_context-style hash() and verify() for
+bcrypt, scrypt and (when argon2-cffi is installed) argon2 at a few cost
+settings, so login latency can be traded against security deliberately.
+Run from the backend directory:
+
+    python -m benchmarks.password_hashing --iterations 20
+"""
+
+import argparse
+import statistics
+import time
+from passlib.context import CryptContext
+from passlib.hash import argon2
+
+PASSWORD = "correct horse battery staple"
+
+CANDIDATES = [
+    ("bcrypt", {"bcrypt__rounds": 10}),
+    ("bcrypt", {"bcrypt__rounds": 12}),
+    ("scrypt", {"scrypt__rounds": 14, "scrypt__block_size": 8}),
+    ("scrypt", {"scrypt__rounds": 15, "scrypt__block_size": 8}),
+    ("scrypt", {"scrypt__rounds": 16, "scrypt__block_size": 8}),
+    ("argon2", {"argon2__time_cost": 2, "argon2__memory_cost": 19456}),
+    ("argon2", {"argon2__time_cost": 3, "argon2__memory_cost": 65536}),
+]
+
+def timed(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.mean(samples), samples[int(len(samples) * 0.95)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'scheme':<8} {'settings':<40} {'hash mean':>10} {'hash p95':>10} {'verify mean':>12} {'verify p95':>11}")
+    for scheme, settings in CANDIDATES:
+        if scheme == "argon2" and not argon2.has_backend():
+            print(f"{scheme:<8} skipped, argon2-cffi is not installed")
+            continue
+
+        context = CryptContext(schemes=[scheme], **settings)
+        hashed = context.hash(PASSWORD)
+        hash_mean, hash_p95 = timed(lambda: context.hash(PASSWORD), args.iterations)
+        verify_mean, verify_p95 = timed(lambda: context.verify(PASSWORD, hashed), args.iterations)
+
+        described = ", ".join(f"{k.split('__')[1]}={v}" for k, v in settings.items())
+        print(
+            f"{scheme:<8} {described:<40} "
+            f"{hash_mean:8.1f}ms {hash_p95:8.1f}ms {verify_mean:10.1f}ms {verify_p95:9.1f}ms"
+        )
+
+if __name__ == "__main__":
+    main()
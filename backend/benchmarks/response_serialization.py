@@ -0,0 +1,119 @@
+"""
+Micro-benchmark: per-row cost of serializing a 1k-row history page.
+
+Compares the old list-endpoint path with the projection/serialization fast
+path in services.serialization, on synthetic transaction documents shaped
+like what Mongo returns:
+
+- validated: full documents copied field by field into TransactionResponse,
+  then FastAPI's response_model validation and JSONResponse encoding
+- construct: projected documents, model_construct and model_dump_json
+- render: projected documents validated and encoded by pydantic-core in one
+  pass (services.serialization.render, what the endpoints use)
+
+Needs no database. Run from the backend directory:
+
+    python -m benchmarks.response_serialization --rows 1000 --iterations 50
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from models.transaction import Transaction, TransactionPage, TransactionResponse
+from services.serialization import projection, render
+
+def documents(rows):
+    start = datetime.utcnow()
+    return [
+        {
+            "_id": uuid.uuid4().hex[:24],
+            **Transaction(
+                user_id="benchmark",
+                type="debit" if i % 3 else "credit",
+                amount=10.0 + i,
+                description=f"Payment {i}",
+                category="Shopping",
+                recipient_name="Merchant",
+                recipient_account="ACC0000000000",
+                balance_after=100000.0 - i,
+                date=start - timedelta(minutes=i)
+            ).model_dump()
+        } for i in range(rows)
+    ]
+
+def project(docs):
+    fields = [name for name, included in projection(TransactionResponse).items() if included]
+    return [{name: doc[name] for name in fields if name in doc} for doc in docs]
+
+async def validated(docs, field):
+    page = TransactionPage(
+        transactions=[
+            TransactionResponse(
+                id=t["id"],
+                type=t["type"],
+                amount=t["amount"],
+                description=t["description"],
+                category=t["category"],
+                recipient_name=t.get("recipient_name"),
+                recipient_account=t.get("recipient_account"),
+                balance_after=t["balance_after"],
+                date=t["date"],
+                status=t["status"]
+            ) for t in docs
+        ],
+        next_cursor=None
+    )
+    content = await serialize_response(field=field, response_content=page)
+    return JSONResponse(content).body
+
+async def construct(docs, field):
+    page = TransactionPage.model_construct(
+        transactions=[TransactionResponse.model_construct(**doc) for doc in docs],
+        next_cursor=None
+    )
+    return page.model_dump_json().encode()
+
+async def rendered(docs, field):
+    return render(TransactionPage, {"transactions": docs, "next_cursor": None}).body
+
+async def timed(fn, docs, field, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fn(docs, field)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    full = documents(args.rows)
+    projected = project(full)
+    field = create_response_field(name="response", type_=TransactionPage)
+
+    async def run():
+        # Every path must produce the same JSON
+        expected = await validated(full, field)
+        assert expected == await construct(projected, field) == await rendered(projected, field)
+        paths = (("validated", validated, full), ("construct", construct, projected), ("render", rendered, projected))
+        for name, fn, docs in paths:
+            samples = sorted(await timed(fn, docs, field, args.iterations))
+            mean = statistics.mean(samples)
+            print(
+                f"{name:<10} page mean={mean:8.2f}ms p95={samples[int(len(samples) * 0.95)]:8.2f}ms "
+                f"per row={mean * 1000 / args.rows:7.2f}us"
+            )
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
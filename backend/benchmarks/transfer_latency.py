@@ -0,0 +1,94 @@
+"""
+Latency benchmark: sequential money-movement writes vs. the transfer engine.
+
+Replays an EMI payment (balance, loan, EMI record, transaction) against the
+MongoDB configured in backend/.env, first the way pay_emi used to do it
+(read user, then four awaited writes) and then through
+services.transfers.execute_transfer. Run from the backend directory:
+
+    python -m benchmarks.transfer_latency --iterations 500
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import date, datetime
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).parent.parent / '.env')
+
+from database import get_database
+from models.loan import EMIPayment
+from models.transaction import Transaction
+from services.transfers import execute_transfer, supports_transactions
+
+EMI = 10.0
+DUE_DATE = datetime.combine(date.today(), datetime.min.time())
+
+async def legacy_payment(db, user_id, loan_id):
+    user = await db.users.find_one({"id": user_id})
+    new_balance = user["balance"] - EMI
+    await db.users.update_one({"id": user_id}, {"$set": {"balance": new_balance}})
+    await db.loans.update_one({"id": loan_id}, {"$inc": {"outstanding": -EMI}})
+    emi_payment = EMIPayment(loan_id=loan_id, user_id=user_id, amount=EMI, due_date=DUE_DATE)
+    await db.emi_payments.insert_one(emi_payment.dict())
+    transaction = Transaction(
+        user_id=user_id, type="debit", amount=EMI, description="Benchmark EMI",
+        category="EMI", balance_after=new_balance
+    )
+    await db.transactions.insert_one(transaction.dict())
+
+async def engine_payment(db, user_id, loan_id):
+    emi_payment = EMIPayment(loan_id=loan_id, user_id=user_id, amount=EMI, due_date=DUE_DATE)
+    await execute_transfer(
+        db,
+        user_id,
+        -EMI,
+        transaction=dict(type="debit", amount=EMI, description="Benchmark EMI", category="EMI"),
+        inserts=[("emi_payments", emi_payment.dict())],
+        updates=[("loans", {"id": loan_id}, {"$inc": {"outstanding": -EMI}}, {"$inc": {"outstanding": EMI}})]
+    )
+
+async def measure(name, payment, db, user_id, loan_id, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await payment(db, user_id, loan_id)
+        samples.append((time.perf_counter() - start) * 1000)
+
+    samples.sort()
+    print(
+        f"{name:<8} n={iterations:<6} "
+        f"mean={statistics.mean(samples):7.2f}ms "
+        f"p50={samples[len(samples) // 2]:7.2f}ms "
+        f"p95={samples[int(len(samples) * 0.95)]:7.2f}ms "
+        f"p99={samples[int(len(samples) * 0.99)]:7.2f}ms"
+    )
+
+async def main(iterations):
+    db = await get_database()
+    user_id = f"bench-{uuid.uuid4()}"
+    loan_id = f"bench-{uuid.uuid4()}"
+    await db.users.insert_one({"id": user_id, "balance": EMI * iterations * 4})
+    await db.loans.insert_one({"id": loan_id, "user_id": user_id, "outstanding": EMI * iterations * 4})
+
+    try:
+        print(f"Multi-document transactions: {await supports_transactions(db)}")
+        # Warm up the connection pool before timing anything
+        await measure("warmup", legacy_payment, db, user_id, loan_id, 20)
+        await measure("legacy", legacy_payment, db, user_id, loan_id, iterations)
+        await measure("engine", engine_payment, db, user_id, loan_id, iterations)
+    finally:
+        await db.users.delete_one({"id": user_id})
+        await db.loans.delete_one({"id": loan_id})
+        await db.emi_payments.delete_many({"user_id": user_id})
+        await db.transactions.delete_many({"user_id": user_id})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.iterations))
@@ -1,31 +1,134 @@
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import ReadPreference, WriteConcern
+from typing import Optional
+from services.pool_monitor import PoolMonitor
 import os
 
-MONGO_URL = os.environ.get('MONGO_URL')
-DB_NAME = os.environ.get('DB_NAME', 'banking_app')
+def _optional_int(name: str) -> Optional[int]:
+    value = os.environ.get(name)
+    return int(value) if value else None
 
-client = AsyncIOMotorClient(MONGO_URL)
-database = client[DB_NAME]
+def client_options() -> dict:
+    """Motor client settings from the environment, read when the client is created.
+
+    server.py loads .env after importing the routes (and this module), so
+    reading them at import time would miss it.
+    """
+    options = {
+        "maxPoolSize": int(os.environ.get("MONGO_MAX_POOL_SIZE", "100")),
+        "minPoolSize": int(os.environ.get("MONGO_MIN_POOL_SIZE", "0")),
+        "maxIdleTimeMS": _optional_int("MONGO_MAX_IDLE_TIME_MS"),
+        # Fail a checkout instead of queueing forever when the pool is exhausted
+        "waitQueueTimeoutMS": _optional_int("MONGO_WAIT_QUEUE_TIMEOUT_MS"),
+        "serverSelectionTimeoutMS": int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+        "connectTimeoutMS": int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+        "socketTimeoutMS": _optional_int("MONGO_SOCKET_TIMEOUT_MS"),
+        "appname": os.environ.get("MONGO_APP_NAME", "securebank-api"),
+    }
+    return {name: value for name, value in options.items() if value is not None}
+
+def database_options() -> dict:
+    """Read preference and write concern for the application database.
+
+    Money movements read balances back from their own writes, so anything
+    other than the default "primary" read preference only suits read-mostly
+    workers such as reporting.
+    """
+    options = {
+        "read_preference": getattr(ReadPreference, os.environ.get("MONGO_READ_PREFERENCE", "primary").upper()),
+    }
+    w = os.environ.get("MONGO_WRITE_CONCERN")
+    if w:
+        options["write_concern"] = WriteConcern(
+            w=int(w) if w.isdigit() else w,
+            wtimeout=_optional_int("MONGO_WRITE_TIMEOUT_MS"),
+            j=os.environ.get("MONGO_JOURNAL", "").lower() in ("1", "true", "yes") or None
+        )
+    return options
+
+class ConnectionManager:
+    """Owns the Motor client: created on first use, closed on shutdown"""
+
+    def __init__(self):
+        self.client: Optional[AsyncIOMotorClient] = None
+        self.database: Optional[AsyncIOMotorDatabase] = None
+        self.monitor = PoolMonitor()
+        self.options: dict = {}
+
+    def connect(self) -> AsyncIOMotorDatabase:
+        if self.database is None:
+            self.options = client_options()
+            self.client = AsyncIOMotorClient(
+                os.environ.get('MONGO_URL'),
+                event_listeners=[self.monitor],
+                **self.options
+            )
+            self.database = self.client.get_database(
+                os.environ.get('DB_NAME', 'banking_app'),
+                **database_options()
+            )
+        return self.database
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+        self.client = None
+        self.database = None
+
+    def stats(self) -> dict:
+        return {
+            "connected": self.client is not None,
+            "settings": self.options,
+            "pools": self.monitor.stats(),
+        }
+
+connections = ConnectionManager()
 
 async def get_database():
-    return database
+    return connections.connect()
 
 # Initialize collections
 async def init_database():
     """Initialize database with indexes and sample data"""
-    db = database
+    db = connections.connect()
     
     # Create indexes
     await db.users.create_index("email", unique=True)
     await db.users.create_index("account_number", unique=True)
-    await db.transactions.create_index([("user_id", 1), ("date", -1)])
-    await db.loans.create_index([("user_id", 1), ("status", 1)])
-    await db.investments.create_index([("user_id", 1), ("status", 1)])
+    # id breaks ties between equal dates so keyset pagination never needs an in-memory sort
+    await db.transactions.create_index([("user_id", 1), ("date", -1), ("id", -1)])
+    # Ids derived from idempotency keys must never be recorded twice
+    await db.transactions.create_index("id", unique=True)
+    await db.transaction_rollups.create_index([("user_id", 1), ("month", -1), ("category", 1)], unique=True)
+    await db.loans.create_index([("user_id", 1), ("status", 1), ("next_due_date", 1)])
+    await db.loans.create_index([("user_id", 1), ("status", 1), ("created_at", -1), ("id", -1)])
+    # Serves the bulk "loans due" scan across all users; id orders ties for keyset batches
+    await db.loans.create_index([("status", 1), ("next_due_date", 1), ("id", 1)])
+    # At most one payment per installment, whoever collects it
+    await db.emi_payments.create_index([("loan_id", 1), ("due_date", 1)], unique=True)
+    await db.emi_payments.create_index([("status", 1), ("payment_date", 1)])
+    await db.scheduler_runs.create_index([("job", 1), ("status", 1)])
+    # Also serves the portfolio $match through its (user_id, status) prefix
+    await db.investments.create_index([("user_id", 1), ("status", 1), ("created_at", -1), ("id", -1)])
+    # Revaluation updates every active holding of an instrument at once
+    await db.investments.create_index([("name", 1), ("status", 1)])
     await db.payment_requests.create_index([("user_id", 1), ("status", 1)])
     await db.loan_applications.create_index([("user_id", 1), ("status", 1)])
+    # Serves the recovery sweep over stale pending entries
+    await db.transfer_journal.create_index([("status", 1), ("created_at", 1)])
+    # Finds the transfer behind an EMI claim when reconciling it
+    await db.transfer_journal.create_index("updated.id")
+    # Idempotency keys expire on their own once their retry window has passed
+    await db.idempotency_keys.create_index("expires_at", expireAfterSeconds=0)
+    # Refresh tokens (spent ones included, for reuse detection) expire on their own
+    await db.refresh_tokens.create_index("expires_at", expireAfterSeconds=0)
+    await db.refresh_tokens.create_index("family_id")
+    await db.refresh_tokens.create_index("user_id")
+    # Codes are looked up by _id; expired ones are removed by the TTL monitor
+    await db.otp_codes.create_index("expires_at", expireAfterSeconds=0)
     
     print("Database initialized with indexes")
 
 # Close database connection
 async def close_database():
-    client.close()
\ No newline at end of file
+    connections.close()
\ No newline at end of file
@@ -13,7 +13,10 @@ class Investment(BaseModel):
     returns: float
     returns_percent: float
     units: Optional[float] = None
-    maturity_date: Optional[date] = None
+    maturity_date: Optional[datetime] = None  # stored as midnight, BSON has no date type
+    # Last market price applied by the revaluation job
+    price: Optional[float] = None
+    priced_at: Optional[datetime] = None
     status: str = "active"  # "active", "matured", "sold"
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -21,8 +24,9 @@ class Investment(BaseModel):
 class InvestmentCreate(BaseModel):
     type: str
     name: str
-    amount: float
-    units: Optional[float] = None
+    amount: float = Field(gt=0)
+    # Derived from amount and the market price; if sent, it has to agree
+    units: Optional[float] = Field(None, gt=0)
     maturity_date: Optional[date] = None
 
 class InvestmentResponse(BaseModel):
@@ -38,14 +42,27 @@ class InvestmentResponse(BaseModel):
     status: str
     created_at: datetime
 
+class InvestmentPage(BaseModel):
+    investments: List[InvestmentResponse]
+    next_cursor: Optional[str] = None
+
 class InvestmentUpdate(BaseModel):
     current_value: Optional[float] = None
     returns: Optional[float] = None
     returns_percent: Optional[float] = None
 
+class PortfolioTypeSummary(BaseModel):
+    type: str
+    invested: float
+    current_value: float
+    returns: float
+    returns_percent: float
+    investments_count: int
+
 class PortfolioSummary(BaseModel):
     total_invested: float
     total_current_value: float
     total_returns: float
     total_returns_percent: float
-    investments_count: int
\ No newline at end of file
+    investments_count: int
+    by_type: List[PortfolioTypeSummary] = []
\ No newline at end of file
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Annotated, Optional, List
 from datetime import datetime, date
 import uuid
 
@@ -13,7 +13,11 @@ class Loan(BaseModel):
     interest_rate: float
     tenure: int  # in months
     remaining_months: int
-    next_due_date: date
+    next_due_date: datetime  # stored as midnight, BSON has no date type
+    # Amortization state: schedule parameters plus a cursor of paid installments
+    installments_paid: int = 0
+    first_due_date: Optional[datetime] = None
+    due_day: Optional[int] = None
     status: str = "active"  # "active", "closed", "defaulted"
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -36,6 +40,10 @@ class LoanResponse(BaseModel):
     status: str
     created_at: datetime
 
+class LoanPage(BaseModel):
+    loans: List[LoanResponse]
+    next_cursor: Optional[str] = None
+
 class LoanApplication(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
@@ -59,6 +67,40 @@ class EMIPayment(BaseModel):
     loan_id: str
     user_id: str
     amount: float
+    principal: Optional[float] = None
+    interest: Optional[float] = None
+    installment: Optional[int] = None
     payment_date: datetime = Field(default_factory=datetime.utcnow)
-    due_date: date
-    status: str = "completed"
\ No newline at end of file
+    due_date: datetime  # stored as midnight, BSON has no date type
+    status: str = "completed"  # "pending" while the debit is in flight, "completed"
+
+class ScheduleRow(BaseModel):
+    month: int
+    emi: float
+    interest: float
+    principal: float
+    outstanding: float
+
+class EMISchedule(BaseModel):
+    loan_amount: float
+    interest_rate: float
+    tenure_months: int
+    emi: float
+    total_amount: float
+    total_interest: float
+    schedule: List[ScheduleRow]
+
+MAX_CALCULATOR_SCENARIOS = 10000
+
+class CalculatorGridRequest(BaseModel):
+    loan_amounts: List[Annotated[float, Field(gt=0)]] = Field(..., min_length=1)
+    interest_rates: List[Annotated[float, Field(ge=0)]] = Field(..., min_length=1)
+    tenure_months: List[Annotated[int, Field(gt=0, le=600)]] = Field(..., min_length=1)
+
+class CalculatorScenario(BaseModel):
+    loan_amount: float
+    interest_rate: float
+    tenure_months: int
+    emi: float
+    total_amount: float
+    total_interest: float
@@ -38,14 +38,66 @@ class TransactionResponse(BaseModel):
     date: datetime
     status: str
 
+class TransactionPage(BaseModel):
+    transactions: List[TransactionResponse]
+    next_cursor: Optional[str] = None
+
+class MonthlyTotal(BaseModel):
+    month: str  # "YYYY-MM"
+    credit: float
+    debit: float
+    net: float
+    count: int
+
+class CategoryTotal(BaseModel):
+    category: str
+    type: str
+    total: float
+    count: int
+
+class BalancePoint(BaseModel):
+    month: str
+    closing_balance: float
+
+class SpendingAnalytics(BaseModel):
+    from_date: datetime
+    to_date: datetime
+    monthly: List[MonthlyTotal]
+    categories: List[CategoryTotal]
+    balances: List[BalancePoint]
+
+class SpendingSummary(BaseModel):
+    monthly: List[MonthlyTotal]
+    categories: List[CategoryTotal]
+
 class SendMoneyRequest(BaseModel):
     recipient_name: str
     recipient_account: str
     recipient_phone: Optional[str] = None
-    amount: float
+    amount: float = Field(..., gt=0)
     description: Optional[str] = None
     pin: str
 
+MAX_BATCH_ITEMS = 500
+
+class BatchSendMoneyRequest(BaseModel):
+    items: List[SendMoneyRequest] = Field(..., min_length=1, max_length=MAX_BATCH_ITEMS)
+
+class BatchItemResult(BaseModel):
+    index: int
+    status: str  # "completed" or "rejected"
+    transaction_id: Optional[str] = None
+    amount: float
+    balance_after: Optional[float] = None
+    error: Optional[str] = None
+
+class BatchSendMoneyResponse(BaseModel):
+    succeeded: int
+    failed: int
+    total_debited: float
+    new_balance: Optional[float] = None
+    results: List[BatchItemResult]
+
 class RequestMoneyRequest(BaseModel):
     recipient_name: str
     recipient_phone: Optional[str] = None
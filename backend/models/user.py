@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field, EmailStr
 from typing import Optional, List
 from datetime import datetime
+from enum import Enum
 import uuid
 
 class User(BaseModel):
@@ -16,12 +17,16 @@ class User(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     is_active: bool = True
+    # Bumped to revoke every access token issued before
+    token_version: int = 0
 
 class UserCreate(BaseModel):
     name: str
     email: EmailStr
     phone: str
     password: str
+    # From /auth/verify-otp, proving the email was verified
+    verification_token: str
 
 class UserUpdate(BaseModel):
     name: Optional[str] = None
@@ -44,7 +49,35 @@ class LoginRequest(BaseModel):
     email: EmailStr
     password: str
 
+class Principal(BaseModel):
+    """Who a request is authenticated as, taken from the access token's claims"""
+    user_id: str
+    email: str
+    scopes: List[str] = []
+    token_version: int = 0
+
 class LoginResponse(BaseModel):
     user: UserResponse
     access_token: str
-    token_type: str = "bearer"
\ No newline at end of file
+    refresh_token: Optional[str] = None
+    token_type: str = "bearer"
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class TokenResponse(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+
+class OTPPurpose(str, Enum):
+    SIGNUP = "signup"
+
+class OTPRequest(BaseModel):
+    email: EmailStr
+    purpose: OTPPurpose = OTPPurpose.SIGNUP
+
+class OTPVerifyRequest(BaseModel):
+    email: EmailStr
+    otp: str
+    purpose: OTPPurpose = OTPPurpose.SIGNUP
\ No newline at end of file
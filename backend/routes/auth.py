@@ -1,16 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from datetime import timedelta
-from models.user import UserCreate, LoginRequest, LoginResponse
+from models.user import (
+    UserCreate, LoginRequest, LoginResponse, OTPPurpose, OTPRequest, OTPVerifyRequest, RefreshRequest, TokenResponse
+)
 from services.auth import (
     authenticate_user, 
     create_user, 
-    create_access_token, 
     get_current_user,
-    user_to_response,
-    ACCESS_TOKEN_EXPIRE_MINUTES
+    get_principal,
+    issue_access_token,
+    revoke_tokens,
+    user_to_response
 )
+from services import otp
+from services.ledger import current_balance
+from services.refresh_tokens import issue_refresh_token, revoke_refresh_token, rotate_refresh_token
 from database import get_database
 from typing import Optional
 
@@ -19,15 +24,18 @@ security = HTTPBearer()
 
 @router.post("/signup", response_model=LoginResponse)
 async def signup(user: UserCreate, db: AsyncIOMotorDatabase = Depends(get_database)):
+    if not await otp.consume_proof(db, user.verification_token, user.email, OTPPurpose.SIGNUP.value):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email not verified, request and verify an OTP first"
+        )
     try:
         new_user = await create_user(db, user)
-        access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = create_access_token(
-            data={"sub": new_user.email}, expires_delta=access_token_expires
-        )
+        access_token = issue_access_token(new_user.dict())
         return LoginResponse(
             user=user_to_response(new_user.dict()),
-            access_token=access_token
+            access_token=access_token,
+            refresh_token=await issue_refresh_token(db, new_user.id)
         )
     except HTTPException as e:
         raise e
@@ -46,30 +54,74 @@ async def login(login_data: LoginRequest, db: AsyncIOMotorDatabase = Depends(get
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user["email"]}, expires_delta=access_token_expires
-    )
+    access_token = issue_access_token(user)
     return LoginResponse(
         user=user_to_response(user),
-        access_token=access_token
+        access_token=access_token,
+        refresh_token=await issue_refresh_token(db, user["id"])
     )
 
+@router.post("/refresh", response_model=TokenResponse)
+async def refresh(request: RefreshRequest, db: AsyncIOMotorDatabase = Depends(get_database)):
+    """New access token for a refresh token, which is rotated in the process"""
+    user_id, refresh_token = await rotate_refresh_token(db, request.refresh_token)
+    user = await db.users.find_one(
+        {"id": user_id},
+        {"_id": 0, "id": 1, "email": 1, "token_version": 1, "is_active": 1}
+    )
+    if user is None or not user.get("is_active", True):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token"
+        )
+    return TokenResponse(access_token=issue_access_token(user), refresh_token=refresh_token)
+
+@router.post("/logout")
+async def logout(request: RefreshRequest, db: AsyncIOMotorDatabase = Depends(get_database)):
+    """End the session a refresh token belongs to"""
+    await revoke_refresh_token(db, request.refresh_token)
+    return {"message": "Signed out"}
+
 @router.get("/me")
 async def get_current_user_info(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     user = await get_current_user(credentials.credentials, db)
+    user["balance"] = await current_balance(db, user["id"])
     return user_to_response(user)
 
+@router.post("/logout-all")
+async def logout_all(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Revoke every access token of the current user, including this one"""
+    principal = await get_principal(credentials.credentials, db)
+    await revoke_tokens(db, principal.user_id)
+    return {"message": "All sessions signed out"}
+
+@router.post("/request-otp")
+async def request_otp(request: OTPRequest, db: AsyncIOMotorDatabase = Depends(get_database)):
+    # Signup codes go to the email being registered
+    expires_at = await otp.issue(db, request.email, request.purpose.value)
+    return {"message": "OTP sent", "expires_at": expires_at}
+
 @router.post("/verify-otp")
-async def verify_otp(otp: str, email: str):
-    # Mock OTP verification - in real app, this would verify against stored OTP
-    if len(otp) == 6 and otp.isdigit():
-        return {"message": "OTP verified successfully", "verified": True}
-    else:
+async def verify_otp(request: OTPVerifyRequest, db: AsyncIOMotorDatabase = Depends(get_database)):
+    outcome = await otp.verify(db, request.email, request.purpose.value, request.otp)
+    if outcome == otp.VERIFIED:
+        return {
+            "message": "OTP verified successfully",
+            "verified": True,
+            "verification_token": otp.issue_proof(request.email, request.purpose.value),
+        }
+    if outcome == otp.LOCKED:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid OTP"
-        )
\ No newline at end of file
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many incorrect attempts, request a new OTP"
+        )
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Invalid or expired OTP"
+    )
\ No newline at end of file
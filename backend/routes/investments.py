@@ -1,139 +1,134 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from typing import List
-from models.investment import Investment, InvestmentCreate, InvestmentResponse, InvestmentUpdate, PortfolioSummary
-from services.auth import get_current_user
+from typing import Optional
+from models.investment import (
+    Investment,
+    InvestmentCreate,
+    InvestmentResponse,
+    InvestmentPage,
+    InvestmentUpdate,
+    PortfolioSummary
+)
+from services.auth import SCOPE_BANKING, get_principal
+from services.idempotency import IdempotentRequest, idempotency_key
+from services.pagination import keyset_filter, keyset_sort, page_size, paginate
+from services.serialization import projection, render
+from services.portfolio import portfolio_summary
+from services.prices import price_feed
+from services.transfers import execute_transfer
+from services.valuation import valuation
 from database import get_database
 from datetime import datetime
-import random
 
 router = APIRouter()
 security = HTTPBearer()
 
+UNITS_PRECISION = 6
+# Largest gap (in currency) allowed between client-sent units * price and amount
+UNITS_TOLERANCE = 0.01
+
 @router.get("/portfolio", response_model=PortfolioSummary)
 async def get_portfolio_summary(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    user = await get_current_user(credentials.credentials, db)
-    
-    investments = await db.investments.find({"user_id": user["id"], "status": "active"}).to_list(100)
-    
-    if not investments:
-        return PortfolioSummary(
-            total_invested=0,
-            total_current_value=0,
-            total_returns=0,
-            total_returns_percent=0,
-            investments_count=0
-        )
+    principal = await get_principal(credentials.credentials, db)
     
-    total_invested = sum(inv["amount"] for inv in investments)
-    total_current_value = sum(inv["current_value"] for inv in investments)
-    total_returns = total_current_value - total_invested
-    total_returns_percent = (total_returns / total_invested * 100) if total_invested > 0 else 0
-    
-    return PortfolioSummary(
-        total_invested=total_invested,
-        total_current_value=total_current_value,
-        total_returns=total_returns,
-        total_returns_percent=round(total_returns_percent, 2),
-        investments_count=len(investments)
-    )
+    # Totals per type are computed in the database, over every active holding
+    return await portfolio_summary(db, principal.user_id)
 
-@router.get("/", response_model=List[InvestmentResponse])
+@router.get("/", response_model=InvestmentPage)
 async def get_user_investments(
+    investment_status: str = Query("active", alias="status", pattern="^(active|matured|sold)$"),
+    limit: Optional[int] = 50,
+    cursor: Optional[str] = None,
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    user = await get_current_user(credentials.credentials, db)
+    principal = await get_principal(credentials.credentials, db)
+    limit = page_size(limit)
     
-    investments = await db.investments.find({"user_id": user["id"], "status": "active"}).to_list(100)
+    # One page of holdings, newest first, served by the (user_id, status, created_at, id) index
+    query = {"user_id": principal.user_id, "status": investment_status, **keyset_filter("created_at", cursor)}
+    investments = await db.investments.find(query, projection(InvestmentResponse)).sort(
+        keyset_sort("created_at")
+    ).limit(limit + 1).to_list(limit + 1)
+    investments, next_cursor = paginate(investments, "created_at", limit)
     
-    return [
-        InvestmentResponse(
-            id=inv["id"],
-            type=inv["type"],
-            name=inv["name"],
-            amount=inv["amount"],
-            current_value=inv["current_value"],
-            returns=inv["returns"],
-            returns_percent=inv["returns_percent"],
-            units=inv.get("units"),
-            maturity_date=inv.get("maturity_date"),
-            status=inv["status"],
-            created_at=inv["created_at"]
-        ) for inv in investments
-    ]
+    return render(InvestmentPage, {"investments": investments, "next_cursor": next_cursor})
 
 @router.post("/", response_model=InvestmentResponse)
 async def create_investment(
     investment_data: InvestmentCreate,
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: AsyncIOMotorDatabase = Depends(get_database)
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    idempotency: IdempotentRequest = Depends(idempotency_key)
 ):
-    user = await get_current_user(credentials.credentials, db)
-    
-    # Check if user has sufficient balance
-    if user["balance"] < investment_data.amount:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Insufficient balance for investment"
+    principal = await get_principal(credentials.credentials, db, scope=SCOPE_BANKING)
+    
+    async with idempotency.claim(db, principal.user_id) as replay:
+        if replay:
+            return replay
+        
+        # Units are bought at the latest market price; unpriced instruments
+        # (e.g. fixed deposits) hold no units and stay valued at cost
+        quote = await price_feed.quote(investment_data.name)
+        price = quote.price if quote else None
+        units = round(investment_data.amount / price, UNITS_PRECISION) if price else None
+        if investment_data.units is not None and (
+            units is None or abs(investment_data.units * price - investment_data.amount) > UNITS_TOLERANCE
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Units do not match the amount at the current market price"
+            )
+        
+        investment = Investment(
+            user_id=principal.user_id,
+            type=investment_data.type,
+            name=investment_data.name,
+            amount=investment_data.amount,
+            units=units,
+            maturity_date=investment_data.maturity_date,
+            price=price,
+            priced_at=quote.as_of if quote else None,
+            **valuation(investment_data.amount, units, price)
         )
-    
-    # Update user balance
-    new_balance = user["balance"] - investment_data.amount
-    await db.users.update_one(
-        {"id": user["id"]},
-        {"$set": {"balance": new_balance, "updated_at": datetime.utcnow()}}
-    )
-    
-    # Create investment with mock current value (slightly higher than invested amount)
-    returns_percent = random.uniform(5, 20)  # Mock returns between 5-20%
-    current_value = investment_data.amount * (1 + returns_percent / 100)
-    returns = current_value - investment_data.amount
-    
-    investment = Investment(
-        user_id=user["id"],
-        type=investment_data.type,
-        name=investment_data.name,
-        amount=investment_data.amount,
-        current_value=current_value,
-        returns=returns,
-        returns_percent=returns_percent,
-        units=investment_data.units,
-        maturity_date=investment_data.maturity_date
-    )
-    
-    await db.investments.insert_one(investment.dict())
-    
-    # Create transaction record
-    from models.transaction import Transaction
-    transaction = Transaction(
-        user_id=user["id"],
-        type="debit",
-        amount=investment_data.amount,
-        description=f"Investment in {investment_data.name}",
-        category="Investment",
-        balance_after=new_balance
-    )
-    
-    await db.transactions.insert_one(transaction.dict())
-    
-    return InvestmentResponse(
-        id=investment.id,
-        type=investment.type,
-        name=investment.name,
-        amount=investment.amount,
-        current_value=investment.current_value,
-        returns=investment.returns,
-        returns_percent=investment.returns_percent,
-        units=investment.units,
-        maturity_date=investment.maturity_date,
-        status=investment.status,
-        created_at=investment.created_at
-    )
+        
+        # Debit user balance and record the holding and transaction in one unit
+        result = await execute_transfer(
+            db,
+            principal.user_id,
+            -investment_data.amount,
+            transaction=dict(
+                id=idempotency.transaction_id(),
+                type="debit",
+                amount=investment_data.amount,
+                description=f"Investment in {investment_data.name}",
+                category="Investment"
+            ),
+            inserts=[("investments", investment.dict())]
+        )
+        if result is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Insufficient balance for investment"
+            )
+        
+        return idempotency.respond(InvestmentResponse(
+            id=investment.id,
+            type=investment.type,
+            name=investment.name,
+            amount=investment.amount,
+            current_value=investment.current_value,
+            returns=investment.returns,
+            returns_percent=investment.returns_percent,
+            units=investment.units,
+            maturity_date=investment.maturity_date,
+            status=investment.status,
+            created_at=investment.created_at
+        ))
 
 @router.put("/{investment_id}", response_model=InvestmentResponse)
 async def update_investment(
@@ -142,10 +137,10 @@ async def update_investment(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    user = await get_current_user(credentials.credentials, db)
+    principal = await get_principal(credentials.credentials, db)
     
     # Get investment
-    investment = await db.investments.find_one({"id": investment_id, "user_id": user["id"]})
+    investment = await db.investments.find_one({"id": investment_id, "user_id": principal.user_id})
     if not investment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -177,21 +172,9 @@ async def update_investment(
         )
     
     # Get updated investment
-    updated_investment = await db.investments.find_one({"id": investment_id})
+    updated_investment = await db.investments.find_one({"id": investment_id}, projection(InvestmentResponse))
     
-    return InvestmentResponse(
-        id=updated_investment["id"],
-        type=updated_investment["type"],
-        name=updated_investment["name"],
-        amount=updated_investment["amount"],
-        current_value=updated_investment["current_value"],
-        returns=updated_investment["returns"],
-        returns_percent=updated_investment["returns_percent"],
-        units=updated_investment.get("units"),
-        maturity_date=updated_investment.get("maturity_date"),
-        status=updated_investment["status"],
-        created_at=updated_investment["created_at"]
-    )
+    return InvestmentResponse.model_validate(updated_investment)
 
 @router.delete("/{investment_id}")
 async def sell_investment(
@@ -199,42 +182,38 @@ async def sell_investment(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    user = await get_current_user(credentials.credentials, db)
+    principal = await get_principal(credentials.credentials, db, scope=SCOPE_BANKING)
     
-    # Get investment
-    investment = await db.investments.find_one({"id": investment_id, "user_id": user["id"]})
+    investment = await db.investments.find_one(
+        {"id": investment_id, "user_id": principal.user_id, "status": "active"}
+    )
     if not investment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Investment not found"
         )
     
-    # Update user balance with current value
-    new_balance = user["balance"] + investment["current_value"]
-    await db.users.update_one(
-        {"id": user["id"]},
-        {"$set": {"balance": new_balance, "updated_at": datetime.utcnow()}}
-    )
-    
-    # Mark investment as sold
-    await db.investments.update_one(
-        {"id": investment_id},
-        {"$set": {"status": "sold", "updated_at": datetime.utcnow()}}
+    # Credit the current value and mark the holding sold in one unit. The
+    # update is conditional, so only one concurrent sale of a holding (at the
+    # value it was read at) can win; the others fail with TransferConflict.
+    new_balance, transaction = await execute_transfer(
+        db,
+        principal.user_id,
+        investment["current_value"],
+        transaction=dict(
+            type="credit",
+            amount=investment["current_value"],
+            description=f"Investment sold - {investment['name']}",
+            category="Investment"
+        ),
+        updates=[(
+            "investments",
+            {"id": investment_id, "status": "active", "current_value": investment["current_value"]},
+            {"$set": {"status": "sold", "updated_at": datetime.utcnow()}},
+            {"$set": {"status": "active", "updated_at": investment["updated_at"]}}
+        )]
     )
     
-    # Create transaction record
-    from models.transaction import Transaction
-    transaction = Transaction(
-        user_id=user["id"],
-        type="credit",
-        amount=investment["current_value"],
-        description=f"Investment sold - {investment['name']}",
-        category="Investment",
-        balance_after=new_balance
-    )
-    
-    await db.transactions.insert_one(transaction.dict())
-    
     return {
         "message": "Investment sold successfully",
         "transaction_id": transaction.id,
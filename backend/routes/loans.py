@@ -1,40 +1,50 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from typing import List
-from models.loan import Loan, LoanCreate, LoanResponse, LoanApplication, LoanApplicationCreate, EMIPayment
-from services.auth import get_current_user
+from typing import List, Optional
+from models.loan import (
+    Loan,
+    LoanCreate,
+    LoanResponse,
+    LoanPage,
+    LoanApplication,
+    LoanApplicationCreate,
+    EMISchedule,
+    ScheduleRow,
+    CalculatorGridRequest,
+    CalculatorScenario,
+    MAX_CALCULATOR_SCENARIOS
+)
+from services.auth import SCOPE_BANKING, get_principal
+from services.idempotency import IdempotentRequest, idempotency_key
+from services.pagination import keyset_filter, keyset_sort, page_size, paginate
+from services.serialization import projection, render
+from services import amortization, emi
+import numpy as np
 from database import get_database
-from datetime import datetime, date
-import calendar
 
 router = APIRouter()
 security = HTTPBearer()
 
-@router.get("/", response_model=List[LoanResponse])
+@router.get("/", response_model=LoanPage)
 async def get_user_loans(
+    loan_status: str = Query("active", alias="status", pattern="^(active|closed|defaulted)$"),
+    limit: Optional[int] = 50,
+    cursor: Optional[str] = None,
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    user = await get_current_user(credentials.credentials, db)
+    principal = await get_principal(credentials.credentials, db)
+    limit = page_size(limit)
     
-    loans = await db.loans.find({"user_id": user["id"], "status": "active"}).to_list(100)
+    # One page of loans, newest first, served by the (user_id, status, created_at, id) index
+    query = {"user_id": principal.user_id, "status": loan_status, **keyset_filter("created_at", cursor)}
+    loans = await db.loans.find(query, projection(LoanResponse)).sort(
+        keyset_sort("created_at")
+    ).limit(limit + 1).to_list(limit + 1)
+    loans, next_cursor = paginate(loans, "created_at", limit)
     
-    return [
-        LoanResponse(
-            id=loan["id"],
-            type=loan["type"],
-            amount=loan["amount"],
-            outstanding=loan["outstanding"],
-            emi=loan["emi"],
-            interest_rate=loan["interest_rate"],
-            tenure=loan["tenure"],
-            remaining_months=loan["remaining_months"],
-            next_due_date=loan["next_due_date"],
-            status=loan["status"],
-            created_at=loan["created_at"]
-        ) for loan in loans
-    ]
+    return render(LoanPage, {"loans": loans, "next_cursor": next_cursor})
 
 @router.post("/apply", response_model=dict)
 async def apply_for_loan(
@@ -42,11 +52,11 @@ async def apply_for_loan(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    user = await get_current_user(credentials.credentials, db)
+    principal = await get_principal(credentials.credentials, db)
     
     # Create loan application
     application = LoanApplication(
-        user_id=user["id"],
+        user_id=principal.user_id,
         loan_type=loan_app.loan_type,
         requested_amount=loan_app.requested_amount,
         monthly_income=loan_app.monthly_income,
@@ -66,110 +76,115 @@ async def apply_for_loan(
 async def pay_emi(
     loan_id: str,
     credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    idempotency: IdempotentRequest = Depends(idempotency_key)
+):
+    principal = await get_principal(credentials.credentials, db, scope=SCOPE_BANKING)
+    
+    async with idempotency.claim(db, principal.user_id) as replay:
+        if replay:
+            return replay
+        
+        # Get loan details
+        loan = await db.loans.find_one({"id": loan_id, "user_id": principal.user_id})
+        if not loan:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Loan not found"
+            )
+        
+        if loan["status"] != "active":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Loan is already closed"
+            )
+        
+        # Debit the installment, advance the schedule and record the payment in one unit
+        result = await emi.pay_installment(db, loan, transaction_id=idempotency.transaction_id())
+        if result is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Insufficient balance for EMI payment"
+            )
+        new_balance, transaction, installment = result
+        
+        return idempotency.respond({
+            "message": "EMI paid successfully",
+            "transaction_id": transaction.id,
+            "new_balance": new_balance,
+            "amount_paid": installment["amount"],
+            "principal": installment["principal"],
+            "interest": installment["interest"],
+            "remaining_amount": installment["outstanding_after"],
+            "next_due_date": installment["next_due_date"]
+        })
+
+@router.get("/due", response_model=List[LoanResponse])
+async def get_due_loans(
+    days: int = Query(7, ge=0, le=90),
+    credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    user = await get_current_user(credentials.credentials, db)
-    
-    # Get loan details
-    loan = await db.loans.find_one({"id": loan_id, "user_id": user["id"]})
-    if not loan:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Loan not found"
-        )
-    
-    # Check if user has sufficient balance
-    if user["balance"] < loan["emi"]:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Insufficient balance for EMI payment"
-        )
-    
-    # Update user balance
-    new_balance = user["balance"] - loan["emi"]
-    await db.users.update_one(
-        {"id": user["id"]},
-        {"$set": {"balance": new_balance, "updated_at": datetime.utcnow()}}
-    )
-    
-    # Calculate new loan details
-    new_outstanding = loan["outstanding"] - loan["emi"]
-    new_remaining_months = loan["remaining_months"] - 1
-    
-    # Calculate next due date (add 1 month)
-    current_due = loan["next_due_date"]
-    if isinstance(current_due, str):
-        current_due = datetime.strptime(current_due, "%Y-%m-%d").date()
-    
-    next_month = current_due.month + 1
-    next_year = current_due.year
-    if next_month > 12:
-        next_month = 1
-        next_year += 1
-    
-    next_due_date = date(next_year, next_month, current_due.day)
-    
-    # Update loan
-    await db.loans.update_one(
-        {"id": loan_id},
-        {"$set": {
-            "outstanding": max(0, new_outstanding),
-            "remaining_months": max(0, new_remaining_months),
-            "next_due_date": next_due_date,
-            "status": "closed" if new_outstanding <= 0 else "active"
-        }}
-    )
+    principal = await get_principal(credentials.credentials, db)
     
-    # Create EMI payment record
-    emi_payment = EMIPayment(
-        loan_id=loan_id,
-        user_id=user["id"],
-        amount=loan["emi"],
-        due_date=current_due
-    )
-    
-    await db.emi_payments.insert_one(emi_payment.dict())
-    
-    # Create transaction record
-    from models.transaction import Transaction
-    transaction = Transaction(
-        user_id=user["id"],
-        type="debit",
-        amount=loan["emi"],
-        description=f"EMI Payment - {loan['type']}",
-        category="EMI",
-        balance_after=new_balance
-    )
-    
-    await db.transactions.insert_one(transaction.dict())
+    loans = await emi.due_loans(db, days, user_id=principal.user_id)
     
-    return {
-        "message": "EMI paid successfully",
-        "transaction_id": transaction.id,
-        "new_balance": new_balance,
-        "remaining_amount": max(0, new_outstanding)
-    }
+    return render(List[LoanResponse], loans)
 
 @router.get("/calculator")
 async def calculate_emi(
-    loan_amount: float,
-    interest_rate: float,
-    tenure_months: int
+    loan_amount: float = Query(..., gt=0),
+    interest_rate: float = Query(..., ge=0),
+    tenure_months: int = Query(..., gt=0, le=600)
 ):
     # Calculate EMI using the formula: EMI = [P * r * (1 + r)^n] / [(1 + r)^n - 1]
     # Where P = Principal, r = Monthly interest rate, n = Number of months
+    # Identical queries are answered from an in-process LRU memo
+    return dict(amortization.calculate(loan_amount, interest_rate, tenure_months))
+
+@router.get("/calculator/schedule", response_model=EMISchedule)
+async def calculate_emi_schedule(
+    loan_amount: float = Query(..., gt=0),
+    interest_rate: float = Query(..., ge=0),
+    tenure_months: int = Query(..., gt=0, le=600)
+):
+    summary = amortization.calculate(loan_amount, interest_rate, tenure_months)
+    rows = amortization.calculate_schedule(loan_amount, interest_rate, tenure_months)
+    
+    return EMISchedule(
+        **summary,
+        schedule=[
+            ScheduleRow(month=month, emi=emi, interest=interest, principal=principal, outstanding=outstanding)
+            for month, emi, interest, principal, outstanding in rows
+        ]
+    )
+
+@router.post("/calculator/batch", response_model=List[CalculatorScenario])
+async def calculate_emi_batch(grid: CalculatorGridRequest):
+    scenarios = len(grid.loan_amounts) * len(grid.interest_rates) * len(grid.tenure_months)
+    if scenarios > MAX_CALCULATOR_SCENARIOS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many scenarios ({scenarios}), at most {MAX_CALCULATOR_SCENARIOS} allowed"
+        )
     
-    monthly_rate = interest_rate / (12 * 100)
-    emi = (loan_amount * monthly_rate * (1 + monthly_rate)**tenure_months) / ((1 + monthly_rate)**tenure_months - 1)
-    
-    total_amount = emi * tenure_months
-    total_interest = total_amount - loan_amount
-    
-    return {
-        "loan_amount": loan_amount,
-        "interest_rate": interest_rate,
-        "tenure_months": tenure_months,
-        "emi": round(emi, 2),
-        "total_amount": round(total_amount, 2),
-        "total_interest": round(total_interest, 2)
-    }
\ No newline at end of file
+    # Every combination is evaluated in a single vectorized call
+    results = amortization.evaluate_grid(grid.loan_amounts, grid.interest_rates, grid.tenure_months)
+    columns = zip(
+        results["loan_amount"].tolist(),
+        results["interest_rate"].tolist(),
+        results["tenure_months"].tolist(),
+        np.round(results["emi"], 2).tolist(),
+        np.round(results["total_amount"], 2).tolist(),
+        np.round(results["total_interest"], 2).tolist(),
+    )
+    return [
+        CalculatorScenario(
+            loan_amount=loan_amount,
+            interest_rate=interest_rate,
+            tenure_months=tenure_months,
+            emi=emi,
+            total_amount=total_amount,
+            total_interest=total_interest
+        ) for loan_amount, interest_rate, tenure_months, emi, total_amount, total_interest in columns
+    ]
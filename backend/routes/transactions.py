@@ -1,17 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from typing import List, Optional
 from models.transaction import (
-    Transaction, 
     TransactionCreate, 
     TransactionResponse, 
+    TransactionPage,
+    SpendingAnalytics,
+    SpendingSummary,
     SendMoneyRequest,
+    BatchSendMoneyRequest,
+    BatchSendMoneyResponse,
+    BatchItemResult,
     RequestMoneyRequest,
     PaymentRequest,
     PaymentRequestResponse
 )
-from services.auth import get_current_user
+from services.auth import SCOPE_BANKING, get_principal
+from services.idempotency import IdempotentRequest, idempotency_key
+from services.transfers import execute_transfer, execute_batch_transfer
+from services.pagination import keyset_filter, keyset_sort, page_size, paginate
+from services.serialization import projection, render
+from services.statements import statement_query, stream_statement
+from services.analytics import spending_analytics
+from services import rollups
 from database import get_database
 from datetime import datetime, timedelta
 import uuid
@@ -23,51 +36,123 @@ security = HTTPBearer()
 async def send_money(
     send_request: SendMoneyRequest,
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: AsyncIOMotorDatabase = Depends(get_database)
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    idempotency: IdempotentRequest = Depends(idempotency_key)
 ):
-    user = await get_current_user(credentials.credentials, db)
+    principal = await get_principal(credentials.credentials, db, scope=SCOPE_BANKING)
     
+    async with idempotency.claim(db, principal.user_id) as replay:
+        if replay:
+            return replay
+        
+        # Validate PIN (mock validation)
+        if len(send_request.pin) != 4 or not send_request.pin.isdigit():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid PIN"
+            )
+        
+        # Debit sender's balance and record the transaction in one unit
+        result = await execute_transfer(
+            db,
+            principal.user_id,
+            -send_request.amount,
+            transaction=dict(
+                id=idempotency.transaction_id(),
+                type="debit",
+                amount=send_request.amount,
+                description=f"Transfer to {send_request.recipient_name}",
+                category="Transfer",
+                recipient_name=send_request.recipient_name,
+                recipient_account=send_request.recipient_account,
+                recipient_phone=send_request.recipient_phone
+            )
+        )
+        if result is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Insufficient balance"
+            )
+        new_balance, transaction = result
+        
+        return idempotency.respond({
+            "message": "Money sent successfully",
+            "transaction_id": transaction.id,
+            "new_balance": new_balance
+        })
+
+def _send_money_error(send_request: SendMoneyRequest) -> Optional[str]:
     # Validate PIN (mock validation)
     if len(send_request.pin) != 4 or not send_request.pin.isdigit():
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid PIN"
-        )
-    
-    # Check balance
-    if user["balance"] < send_request.amount:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Insufficient balance"
-        )
-    
-    # Update sender's balance
-    new_balance = user["balance"] - send_request.amount
-    await db.users.update_one(
-        {"id": user["id"]},
-        {"$set": {"balance": new_balance, "updated_at": datetime.utcnow()}}
-    )
-    
-    # Create transaction record
-    transaction = Transaction(
-        user_id=user["id"],
-        type="debit",
-        amount=send_request.amount,
-        description=f"Transfer to {send_request.recipient_name}",
-        category="Transfer",
-        recipient_name=send_request.recipient_name,
-        recipient_account=send_request.recipient_account,
-        recipient_phone=send_request.recipient_phone,
-        balance_after=new_balance
-    )
-    
-    await db.transactions.insert_one(transaction.dict())
+        return "Invalid PIN"
+    return None
+
+@router.post("/batch-send", response_model=BatchSendMoneyResponse)
+async def batch_send_money(
+    batch: BatchSendMoneyRequest,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    idempotency: IdempotentRequest = Depends(idempotency_key)
+):
+    principal = await get_principal(credentials.credentials, db, scope=SCOPE_BANKING)
     
-    return {
-        "message": "Money sent successfully",
-        "transaction_id": transaction.id,
-        "new_balance": new_balance
-    }
+    async with idempotency.claim(db, principal.user_id) as replay:
+        if replay:
+            return replay
+        
+        # Validate every item up front; invalid ones are rejected individually
+        results = []
+        accepted = []
+        for index, item in enumerate(batch.items):
+            error = _send_money_error(item)
+            if error:
+                results.append(BatchItemResult(index=index, status="rejected", amount=item.amount, error=error))
+            else:
+                accepted.append((index, item))
+        
+        new_balance = None
+        total = sum(item.amount for _, item in accepted)
+        if accepted:
+            # One atomic debit for the total and one insert_many for all records
+            result = await execute_batch_transfer(
+                db,
+                principal.user_id,
+                [
+                    dict(
+                        id=idempotency.transaction_id(position),
+                        type="debit",
+                        amount=item.amount,
+                        description=item.description or f"Transfer to {item.recipient_name}",
+                        category="Transfer",
+                        recipient_name=item.recipient_name,
+                        recipient_account=item.recipient_account,
+                        recipient_phone=item.recipient_phone
+                    ) for position, (_, item) in enumerate(accepted)
+                ]
+            )
+            if result is None:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Insufficient balance for batch total"
+                )
+            new_balance, records = result
+            for (index, item), record in zip(accepted, records):
+                results.append(BatchItemResult(
+                    index=index,
+                    status="completed",
+                    transaction_id=record.id,
+                    amount=item.amount,
+                    balance_after=record.balance_after
+                ))
+        
+        results.sort(key=lambda r: r.index)
+        return idempotency.respond(BatchSendMoneyResponse(
+            succeeded=len(accepted),
+            failed=len(batch.items) - len(accepted),
+            total_debited=total,
+            new_balance=new_balance,
+            results=results
+        ))
 
 @router.post("/request-money", response_model=PaymentRequestResponse)
 async def request_money(
@@ -75,11 +160,11 @@ async def request_money(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    user = await get_current_user(credentials.credentials, db)
+    principal = await get_principal(credentials.credentials, db)
     
     # Create payment request
     payment_request = PaymentRequest(
-        user_id=user["id"],
+        user_id=principal.user_id,
         recipient_name=request_data.recipient_name,
         recipient_phone=request_data.recipient_phone,
         amount=request_data.amount,
@@ -102,107 +187,141 @@ async def request_money(
         payment_link=payment_link
     )
 
-@router.get("/history", response_model=List[TransactionResponse])
+@router.get("/history", response_model=TransactionPage)
 async def get_transaction_history(
     limit: Optional[int] = 50,
+    cursor: Optional[str] = None,
     category: Optional[str] = None,
     type: Optional[str] = None,
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    user = await get_current_user(credentials.credentials, db)
+    principal = await get_principal(credentials.credentials, db)
+    limit = page_size(limit)
     
     # Build query
-    query = {"user_id": user["id"]}
+    query = {"user_id": principal.user_id, **keyset_filter("date", cursor)}
     if category:
         query["category"] = category
     if type:
         query["type"] = type
     
-    # Get transactions
-    transactions = await db.transactions.find(query).sort("date", -1).limit(limit).to_list(limit)
-    
-    return [
-        TransactionResponse(
-            id=t["id"],
-            type=t["type"],
-            amount=t["amount"],
-            description=t["description"],
-            category=t["category"],
-            recipient_name=t.get("recipient_name"),
-            recipient_account=t.get("recipient_account"),
-            balance_after=t["balance_after"],
-            date=t["date"],
-            status=t["status"]
-        ) for t in transactions
-    ]
+    # Get one page of transactions, newest first, continuing after the cursor
+    transactions = await db.transactions.find(query, projection(TransactionResponse)).sort(
+        keyset_sort("date")
+    ).limit(limit + 1).to_list(limit + 1)
+    transactions, next_cursor = paginate(transactions, "date", limit)
+    
+    return render(TransactionPage, {"transactions": transactions, "next_cursor": next_cursor})
+
+@router.get("/statement")
+async def export_statement(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None,
+    category: Optional[str] = None,
+    gzip: bool = False,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    principal = await get_principal(credentials.credentials, db)
+    
+    query = statement_query(principal.user_id, from_date, to_date, category)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="statement.{format}"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    
+    return StreamingResponse(
+        stream_statement(db, query, format=format, compress=gzip),
+        media_type=media_type,
+        headers=headers
+    )
 
-@router.get("/recent")
+@router.get("/analytics", response_model=SpendingAnalytics)
+async def get_spending_analytics(
+    months: int = Query(12, ge=1, le=120),
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    principal = await get_principal(credentials.credentials, db)
+    
+    # Default window: the last `months` months up to now
+    to_date = to_date or datetime.utcnow()
+    from_date = from_date or to_date - timedelta(days=31 * months)
+    
+    return await spending_analytics(db, principal.user_id, from_date, to_date)
+
+@router.get("/summary", response_model=SpendingSummary)
+async def get_spending_summary(
+    months: int = Query(6, ge=1, le=120),
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    principal = await get_principal(credentials.credentials, db)
+    
+    # Read the precomputed monthly rollups instead of aggregating history
+    today = datetime.utcnow()
+    start = today.year * 12 + today.month - months
+    from_month = f"{start // 12:04d}-{start % 12 + 1:02d}"
+    
+    return await rollups.summary(db, principal.user_id, from_month)
+
+@router.get("/recent", response_model=List[TransactionResponse])
 async def get_recent_transactions(
     limit: Optional[int] = 5,
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    user = await get_current_user(credentials.credentials, db)
+    principal = await get_principal(credentials.credentials, db)
     
     transactions = await db.transactions.find(
-        {"user_id": user["id"]}
+        {"user_id": principal.user_id},
+        projection(TransactionResponse)
     ).sort("date", -1).limit(limit).to_list(limit)
     
-    return [
-        TransactionResponse(
-            id=t["id"],
-            type=t["type"],
-            amount=t["amount"],
-            description=t["description"],
-            category=t["category"],
-            recipient_name=t.get("recipient_name"),
-            recipient_account=t.get("recipient_account"),
-            balance_after=t["balance_after"],
-            date=t["date"],
-            status=t["status"]
-        ) for t in transactions
-    ]
+    return render(List[TransactionResponse], transactions)
 
 @router.post("/qr-payment")
 async def process_qr_payment(
     merchant_id: str,
-    amount: float,
-    description: str,
+    amount: float = Query(..., gt=0),
+    description: str = Query(...),
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: AsyncIOMotorDatabase = Depends(get_database)
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    idempotency: IdempotentRequest = Depends(idempotency_key)
 ):
-    user = await get_current_user(credentials.credentials, db)
+    principal = await get_principal(credentials.credentials, db, scope=SCOPE_BANKING)
     
-    # Check balance
-    if user["balance"] < amount:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Insufficient balance"
+    async with idempotency.claim(db, principal.user_id) as replay:
+        if replay:
+            return replay
+        
+        # Debit balance and record the transaction in one unit
+        result = await execute_transfer(
+            db,
+            principal.user_id,
+            -amount,
+            transaction=dict(
+                id=idempotency.transaction_id(),
+                type="debit",
+                amount=amount,
+                description=description,
+                category="Payment",
+                recipient_name=merchant_id
+            )
         )
-    
-    # Update balance
-    new_balance = user["balance"] - amount
-    await db.users.update_one(
-        {"id": user["id"]},
-        {"$set": {"balance": new_balance, "updated_at": datetime.utcnow()}}
-    )
-    
-    # Create transaction
-    transaction = Transaction(
-        user_id=user["id"],
-        type="debit",
-        amount=amount,
-        description=description,
-        category="Payment",
-        recipient_name=merchant_id,
-        balance_after=new_balance
-    )
-    
-    await db.transactions.insert_one(transaction.dict())
-    
-    return {
-        "message": "Payment successful",
-        "transaction_id": transaction.id,
-        "new_balance": new_balance
-    }
\ No newline at end of file
+        if result is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Insufficient balance"
+            )
+        new_balance, transaction = result
+        
+        return idempotency.respond({
+            "message": "Payment successful",
+            "transaction_id": transaction.id,
+            "new_balance": new_balance
+        })
\ No newline at end of file
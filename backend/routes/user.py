@@ -2,7 +2,9 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from models.user import UserUpdate, UserResponse
-from services.auth import get_current_user, user_to_response
+from services.auth import SCOPE_BANKING, get_current_user, get_principal, invalidate_user, user_to_response
+from services.ledger import apply_delta, current_balance
+from services.serialization import projection
 from database import get_database
 from datetime import datetime
 
@@ -15,6 +17,7 @@ async def get_profile(
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     user = await get_current_user(credentials.credentials, db)
+    user["balance"] = await current_balance(db, user["id"])
     return user_to_response(user)
 
 @router.put("/profile", response_model=UserResponse)
@@ -40,9 +43,10 @@ async def update_profile(
             {"id": current_user["id"]},
             {"$set": update_data}
         )
+        invalidate_user(current_user["id"])
     
     # Get updated user
-    updated_user = await db.users.find_one({"id": current_user["id"]})
+    updated_user = await db.users.find_one({"id": current_user["id"]}, projection(UserResponse))
     return user_to_response(updated_user)
 
 @router.get("/balance")
@@ -50,8 +54,8 @@ async def get_balance(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    user = await get_current_user(credentials.credentials, db)
-    return {"balance": user["balance"]}
+    principal = await get_principal(credentials.credentials, db)
+    return {"balance": await current_balance(db, principal.user_id)}
 
 @router.post("/update-balance")
 async def update_balance(
@@ -59,18 +63,13 @@ async def update_balance(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    user = await get_current_user(credentials.credentials, db)
-    new_balance = user["balance"] + amount
+    principal = await get_principal(credentials.credentials, db, scope=SCOPE_BANKING)
+    new_balance = await apply_delta(db, principal.user_id, amount)
     
-    if new_balance < 0:
+    if new_balance is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Insufficient balance"
         )
     
-    await db.users.update_one(
-        {"id": user["id"]},
-        {"$set": {"balance": new_balance, "updated_at": datetime.utcnow()}}
-    )
-    
     return {"balance": new_balance, "message": "Balance updated successfully"}
\ No newline at end of file
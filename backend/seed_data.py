@@ -6,6 +6,15 @@ from models.transaction import Transaction
 from models.loan import Loan
 from models.investment import Investment
 from services.auth import get_password_hash
+from services.amortization import add_months, as_datetime
+
+def schedule_state(next_due: date, installments_paid: int) -> dict:
+    """Schedule cursor for a sample loan that is already part-way through its tenure"""
+    return {
+        "installments_paid": installments_paid,
+        "first_due_date": as_datetime(add_months(next_due, -installments_paid, next_due.day)),
+        "due_day": next_due.day,
+    }
 
 async def seed_database():
     """Seed the database with sample data"""
@@ -94,7 +103,8 @@ async def seed_database():
             interest_rate=8.5,
             tenure=240,
             remaining_months=180,
-            next_due_date=datetime.combine(date.today() + timedelta(days=15), datetime.min.time())
+            next_due_date=datetime.combine(date.today() + timedelta(days=15), datetime.min.time()),
+            **schedule_state(date.today() + timedelta(days=15), installments_paid=60)
         ),
         Loan(
             user_id=sample_user.id,
@@ -105,7 +115,8 @@ async def seed_database():
             interest_rate=12.5,
             tenure=60,
             remaining_months=30,
-            next_due_date=datetime.combine(date.today() + timedelta(days=10), datetime.min.time())
+            next_due_date=datetime.combine(date.today() + timedelta(days=10), datetime.min.time()),
+            **schedule_state(date.today() + timedelta(days=10), installments_paid=30)
         )
     ]
     
@@ -1,7 +1,10 @@
-from fastapi import FastAPI, APIRouter
+from fastapi import FastAPI, APIRouter, Depends, Request
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from motor.motor_asyncio import AsyncIOMotorDatabase
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from pathlib import Path
+import asyncio
 import os
 import logging
 
@@ -11,17 +14,42 @@ from routes.user import router as user_router
 from routes.transactions import router as transactions_router
 from routes.loans import router as loans_router
 from routes.investments import router as investments_router
-from database import init_database, close_database
+from database import init_database, close_database, connections, get_database
+from services.auth import SCOPE_ADMIN, get_principal, principal_cache_stats, token_version_cache_stats
+from services.tokens import verifier
+from services.hashing import hashing_pool
+from services.idempotency import idempotency_cache_stats
+from services.otp import otp_cache_stats
+from services.rate_limit import RATE_LIMIT_ENABLED, RateLimitMiddleware
+from services.emi_scheduler import EMI_AUTO_DEBIT_INTERVAL, auto_debit_loop
+from services.serialization import ORJSONResponse
+from services.transfers import TRANSFER_RECOVERY_INTERVAL, TransferConflict, TransferFailed, recovery_loop
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # Create the main app
-app = FastAPI(title="SecureBank API", version="1.0.0")
+app = FastAPI(title="SecureBank API", version="1.0.0", default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
+security = HTTPBearer()
+
+async def require_admin(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    await get_principal(credentials.credentials, db, scope=SCOPE_ADMIN)
+
+# Operational endpoints, for tokens with the admin scope only
+internal_router = APIRouter(dependencies=[Depends(require_admin)])
+
+# Throttle per route group before any handler runs; added first so CORS
+# still wraps its 429s
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -31,6 +59,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(TransferConflict)
+async def transfer_conflict_handler(request: Request, exc: TransferConflict):
+    return ORJSONResponse(
+        status_code=409,
+        content={"detail": "A concurrent request changed this item, no money was moved"}
+    )
+
+@app.exception_handler(TransferFailed)
+async def transfer_failed_handler(request: Request, exc: TransferFailed):
+    return ORJSONResponse(
+        status_code=500,
+        content={"detail": "Transfer could not be completed, no money was moved"}
+    )
+
 # Include routers
 api_router.include_router(auth_router, prefix="/auth", tags=["Authentication"])
 api_router.include_router(user_router, prefix="/user", tags=["User"])
@@ -47,6 +89,26 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "SecureBank API"}
 
+@internal_router.get("/cache-stats")
+async def cache_stats():
+    return {
+        "principal_cache": principal_cache_stats(),
+        "token_version_cache": token_version_cache_stats(),
+        "token_verify_cache": verifier.stats(),
+        "idempotency_cache": idempotency_cache_stats(),
+        "otp_cache": otp_cache_stats(),
+    }
+
+@internal_router.get("/hashing-stats")
+async def hashing_stats():
+    return {"password_hashing": hashing_pool.stats()}
+
+@internal_router.get("/pool-stats")
+async def pool_stats():
+    return {"mongo": connections.stats()}
+
+api_router.include_router(internal_router, prefix="/internal", tags=["Internal"])
+
 # Include the API router in the main app
 app.include_router(api_router)
 
@@ -57,12 +119,25 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+background_tasks = []
+
 @app.on_event("startup")
 async def startup_event():
     await init_database()
+    if TRANSFER_RECOVERY_INTERVAL > 0:
+        db = await get_database()
+        background_tasks.append(asyncio.create_task(recovery_loop(db, TRANSFER_RECOVERY_INTERVAL)))
+    if EMI_AUTO_DEBIT_INTERVAL > 0:
+        db = await get_database()
+        background_tasks.append(asyncio.create_task(auto_debit_loop(db, EMI_AUTO_DEBIT_INTERVAL)))
+        logger.info("EMI auto-debit scheduled every %s seconds", EMI_AUTO_DEBIT_INTERVAL)
     logger.info("SecureBank API started successfully")
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
     await close_database()
+    hashing_pool.shutdown()
     logger.info("SecureBank API shutdown complete")
\ No newline at end of file
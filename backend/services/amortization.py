@@ -0,0 +1,168 @@
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Sequence
+import calendar
+import numpy as np
+
+# Distinct calculator queries remembered per worker
+CALCULATOR_CACHE_SIZE = 4096
+
+def monthly_rate(annual_rate):
+    return np.asarray(annual_rate, dtype=float) / (12 * 100)
+
+def compute_emi(principal, annual_rate, months):
+    """EMI = P * r * (1 + r)^n / ((1 + r)^n - 1), element-wise over arrays.
+
+    Zero-interest loans fall back to P / n.
+    """
+    principal = np.asarray(principal, dtype=float)
+    months = np.asarray(months, dtype=float)
+    r = monthly_rate(annual_rate)
+    growth = np.power(1 + r, months)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        emi = np.where(r > 0, principal * r * growth / (growth - 1), principal / months)
+    return emi
+
+def compute_schedule(principal: float, annual_rate: float, months: int) -> dict:
+    """Month-by-month amortization schedule as arrays.
+
+    Uses the closed form for the outstanding balance after k payments,
+    B_k = P(1 + r)^k - EMI((1 + r)^k - 1) / r, so the whole schedule is a
+    handful of vector operations instead of a Python loop.
+    """
+    r = float(monthly_rate(annual_rate))
+    emi = float(compute_emi(principal, annual_rate, months))
+    k = np.arange(months + 1, dtype=float)
+
+    if r > 0:
+        growth = np.power(1 + r, k)
+        balances = principal * growth - emi * (growth - 1) / r
+    else:
+        balances = principal - emi * k
+    balances = np.maximum(balances, 0.0)
+    balances[-1] = 0.0
+
+    interest = balances[:-1] * r
+    principal_paid = balances[:-1] - balances[1:]
+    return {
+        "month": np.arange(1, months + 1),
+        "emi": interest + principal_paid,
+        "interest": interest,
+        "principal": principal_paid,
+        "outstanding": balances[1:],
+        "monthly_emi": emi,
+    }
+
+def evaluate_grid(
+    loan_amounts: Sequence[float],
+    interest_rates: Sequence[float],
+    tenures: Sequence[int]
+) -> dict:
+    """EMI, total payable and total interest for every (amount, rate, tenure) combination"""
+    amount, rate, tenure = np.meshgrid(
+        np.asarray(loan_amounts, dtype=float),
+        np.asarray(interest_rates, dtype=float),
+        np.asarray(tenures, dtype=float),
+        indexing="ij"
+    )
+    amount, rate, tenure = amount.ravel(), rate.ravel(), tenure.ravel()
+    emi = compute_emi(amount, rate, tenure)
+    total = emi * tenure
+    return {
+        "loan_amount": amount,
+        "interest_rate": rate,
+        "tenure_months": tenure.astype(int),
+        "emi": emi,
+        "total_amount": total,
+        "total_interest": total - amount,
+    }
+
+@lru_cache(maxsize=CALCULATOR_CACHE_SIZE)
+def calculate(loan_amount: float, interest_rate: float, tenure_months: int) -> dict:
+    """Memoized single-scenario calculator result, rounded for display"""
+    emi = float(compute_emi(loan_amount, interest_rate, tenure_months))
+    total_amount = emi * tenure_months
+    return {
+        "loan_amount": loan_amount,
+        "interest_rate": interest_rate,
+        "tenure_months": tenure_months,
+        "emi": round(emi, 2),
+        "total_amount": round(total_amount, 2),
+        "total_interest": round(total_amount - loan_amount, 2),
+    }
+
+@lru_cache(maxsize=CALCULATOR_CACHE_SIZE // 16)
+def calculate_schedule(loan_amount: float, interest_rate: float, tenure_months: int) -> tuple:
+    """Memoized schedule as immutable (month, emi, interest, principal, outstanding) rows"""
+    schedule = compute_schedule(loan_amount, interest_rate, tenure_months)
+    return tuple(zip(
+        schedule["month"].tolist(),
+        np.round(schedule["emi"], 2).tolist(),
+        np.round(schedule["interest"], 2).tolist(),
+        np.round(schedule["principal"], 2).tolist(),
+        np.round(schedule["outstanding"], 2).tolist(),
+    ))
+
+def add_months(start: date, months: int, day: int) -> date:
+    """``start`` moved by ``months`` months onto ``day``, clamped to the month's end.
+
+    Clamping against the anchor day (not the previous due date) keeps a loan
+    due on the 31st on the 31st, 30th or 28th/29th as the months allow.
+    """
+    month_index = start.year * 12 + start.month - 1 + months
+    year, month = divmod(month_index, 12)
+    month += 1
+    return date(year, month, min(day, calendar.monthrange(year, month)[1]))
+
+def as_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return datetime.strptime(value[:10], "%Y-%m-%d").date()
+    return value
+
+def as_datetime(value: date) -> datetime:
+    """BSON has no date type, due dates are stored as midnight datetimes"""
+    return datetime.combine(value, datetime.min.time())
+
+def next_installment(loan: dict) -> dict:
+    """Split the loan's next installment into interest and principal.
+
+    Interest accrues on the outstanding balance at the monthly rate; the
+    rest of the EMI repays principal. The final installment (or one that
+    would overpay) settles exactly the remaining balance.
+    """
+    outstanding = loan["outstanding"]
+    r = float(monthly_rate(loan["interest_rate"]))
+    interest = round(outstanding * r, 2)
+    principal = round(loan["emi"] - interest, 2)
+    if loan["remaining_months"] <= 1 or principal >= outstanding:
+        principal = round(outstanding, 2)
+
+    current_due = as_date(loan["next_due_date"])
+    paid = loan.get("installments_paid")
+    if paid is None:
+        paid = loan["tenure"] - loan["remaining_months"]
+    if loan.get("first_due_date"):
+        first_due = as_date(loan["first_due_date"])
+        day = loan["due_day"]
+    else:
+        # Loans created before schedule state was stored anchor on their current due date
+        day = current_due.day
+        first_due = add_months(current_due, -paid, day)
+    next_due = add_months(first_due, paid + 1, day)
+
+    outstanding_after = round(max(0.0, outstanding - principal), 2)
+    return {
+        "installment": paid + 1,
+        "due_date": current_due,
+        "amount": round(interest + principal, 2),
+        "interest": interest,
+        "principal": principal,
+        "outstanding_after": outstanding_after,
+        "remaining_months": max(0, loan["remaining_months"] - 1),
+        "next_due_date": next_due,
+        "first_due_date": first_due,
+        "due_day": day,
+        "status": "closed" if outstanding_after <= 0 else "active",
+    }
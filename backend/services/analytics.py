@@ -0,0 +1,76 @@
+from datetime import datetime
+from typing import List
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from models.transaction import BalancePoint, CategoryTotal, MonthlyTotal, SpendingAnalytics
+
+MONTH = {"$dateToString": {"format": "%Y-%m", "date": "$date"}}
+
+def spending_pipeline(user_id: str, from_date: datetime, to_date: datetime) -> List[dict]:
+    """Monthly totals, category splits and month-end balances in one round trip.
+
+    The leading ``$match``/``$sort`` are served by the ``(user_id, date)``
+    index; only the grouped results leave the database.
+    """
+    return [
+        {"$match": {"user_id": user_id, "date": {"$gte": from_date, "$lt": to_date}}},
+        {"$sort": {"date": 1}},
+        {"$facet": {
+            "monthly": [
+                {"$group": {
+                    "_id": MONTH,
+                    "credit": {"$sum": {"$cond": [{"$eq": ["$type", "credit"]}, "$amount", 0]}},
+                    "debit": {"$sum": {"$cond": [{"$eq": ["$type", "debit"]}, "$amount", 0]}},
+                    "count": {"$sum": 1},
+                }},
+                {"$sort": {"_id": 1}},
+            ],
+            "categories": [
+                {"$group": {
+                    "_id": {"category": "$category", "type": "$type"},
+                    "total": {"$sum": "$amount"},
+                    "count": {"$sum": 1},
+                }},
+                {"$sort": {"total": -1}},
+            ],
+            "balances": [
+                {"$group": {"_id": MONTH, "closing_balance": {"$last": "$balance_after"}}},
+                {"$sort": {"_id": 1}},
+            ],
+        }},
+    ]
+
+async def spending_analytics(
+    db: AsyncIOMotorDatabase,
+    user_id: str,
+    from_date: datetime,
+    to_date: datetime
+) -> SpendingAnalytics:
+    pipeline = spending_pipeline(user_id, from_date, to_date)
+    results = await db.transactions.aggregate(pipeline).to_list(1)
+    facets = results[0] if results else {"monthly": [], "categories": [], "balances": []}
+
+    return SpendingAnalytics(
+        from_date=from_date,
+        to_date=to_date,
+        monthly=[
+            MonthlyTotal(
+                month=m["_id"],
+                credit=m["credit"],
+                debit=m["debit"],
+                net=m["credit"] - m["debit"],
+                count=m["count"]
+            ) for m in facets["monthly"]
+        ],
+        categories=[
+            CategoryTotal(
+                category=c["_id"]["category"],
+                type=c["_id"]["type"],
+                total=c["total"],
+                count=c["count"]
+            ) for c in facets["categories"]
+        ],
+        balances=[
+            BalancePoint(month=b["_id"], closing_balance=b["closing_balance"])
+            for b in facets["balances"]
+        ]
+    )
@@ -1,17 +1,98 @@
 from datetime import datetime, timedelta
 from typing import Optional
-from jose import JWTError, jwt
+from jose import JWTError
 from passlib.context import CryptContext
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from fastapi import HTTPException, status
-from models.user import User, UserCreate, UserResponse
+from models.user import Principal, User, UserCreate, UserResponse
+from services.cache import TTLCache
+from services.hashing import hashing_pool
+from services.refresh_tokens import revoke_user_refresh_tokens
+from services.tokens import verifier
+import logging
 import os
+import time
+
+logger = logging.getLogger(__name__)
 
-SECRET_KEY = os.environ.get("SECRET_KEY", "your-secret-key-here")
-ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Authenticated principals (verified claims + user document) keyed by token
+PRINCIPAL_CACHE_TTL = float(os.environ.get("PRINCIPAL_CACHE_TTL", "30"))
+PRINCIPAL_CACHE_SIZE = int(os.environ.get("PRINCIPAL_CACHE_SIZE", "10000"))
+
+# Everything the routes read from the user document except the password hash
+# and the balance. The balance changes with every transfer, and only the
+# worker that moved it could drop its cached principals, so it is always
+# read fresh (services.ledger.current_balance) instead of being cached
+USER_PROJECTION = {"_id": 0, "password": 0, "balance": 0}
+
+# Customer operations that move money
+SCOPE_BANKING = "banking"
+# Operational endpoints under /api/internal
+SCOPE_ADMIN = "admin"
+# Scopes of users whose document sets none; others are granted by setting
+# the document's "scopes" and take effect with the user's next token
+DEFAULT_SCOPES = [SCOPE_BANKING]
+# How long a worker trusts its cached token version; revoking tokens takes
+# effect on other workers within this many seconds
+TOKEN_VERSION_CACHE_TTL = float(os.environ.get("TOKEN_VERSION_CACHE_TTL", "30"))
+
+# user id -> tokens in principal_cache, so a user's entries can be dropped
+# together; kept in step with the cache, so it is bounded by it
+_tokens_by_user = {}
+
+def _forget_token(token: str, cached: tuple):
+    user_id = cached[1]["id"]
+    tokens = _tokens_by_user.get(user_id)
+    if tokens is not None:
+        tokens.discard(token)
+        if not tokens:
+            del _tokens_by_user[user_id]
+
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL, on_evict=_forget_token)
+token_versions = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=TOKEN_VERSION_CACHE_TTL)
+
+# Password hashing policy. The first available scheme hashes new passwords;
+# hashes in any other scheme (or with outdated cost settings) still verify
+# and are transparently upgraded on the next successful login.
+PASSWORD_SCHEMES = [
+    scheme.strip()
+    for scheme in os.environ.get("PASSWORD_SCHEMES", "scrypt,bcrypt").split(",")
+    if scheme.strip()
+]
+# bcrypt cost factor; each +1 doubles the time spent per hash
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+# scrypt work factor as log2(N); memory used is 128 * N * block size bytes
+SCRYPT_ROUNDS = int(os.environ.get("SCRYPT_ROUNDS", "14"))
+SCRYPT_BLOCK_SIZE = int(os.environ.get("SCRYPT_BLOCK_SIZE", "8"))
+# argon2 needs the optional argon2-cffi package
+ARGON2_TIME_COST = int(os.environ.get("ARGON2_TIME_COST", "2"))
+ARGON2_MEMORY_COST = int(os.environ.get("ARGON2_MEMORY_COST", "19456"))  # KiB
+
+def _available_schemes(schemes):
+    from passlib.registry import get_crypt_handler
+    available = []
+    for scheme in schemes:
+        handler = get_crypt_handler(scheme)
+        if not hasattr(handler, "has_backend") or handler.has_backend():
+            available.append(scheme)
+        else:
+            logger.warning("Password scheme %s has no backend installed, skipping it", scheme)
+    # Existing bcrypt hashes must always remain verifiable
+    if "bcrypt" not in available:
+        available.append("bcrypt")
+    return available
+
+pwd_context = CryptContext(
+    schemes=_available_schemes(PASSWORD_SCHEMES),
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    scrypt__rounds=SCRYPT_ROUNDS,
+    scrypt__block_size=SCRYPT_BLOCK_SIZE,
+    argon2__time_cost=ARGON2_TIME_COST,
+    argon2__memory_cost=ARGON2_MEMORY_COST,
+)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -19,6 +100,14 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password, hashed_password):
+    """verify_password on the hashing pool, keeping the event loop free"""
+    return await hashing_pool.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    """get_password_hash on the hashing pool, keeping the event loop free"""
+    return await hashing_pool.run(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -26,15 +115,38 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    return verifier.sign(to_encode)
+
+def issue_access_token(user: dict) -> str:
+    """Access token carrying the user id, token version and scopes.
+
+    ``sub`` (the email) is kept so tokens stay readable by older workers.
+    """
+    return create_access_token(
+        data={
+            "sub": user["email"],
+            "uid": user["id"],
+            "ver": user.get("token_version", 0),
+            "scopes": user.get("scopes", DEFAULT_SCOPES),
+        },
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
 
 async def authenticate_user(db: AsyncIOMotorDatabase, email: str, password: str):
     user = await db.users.find_one({"email": email})
     if not user:
         return False
-    if not verify_password(password, user["password"]):
+    if not await verify_password_async(password, user["password"]):
         return False
+
+    # Upgrade hashes made with a deprecated scheme or outdated cost settings
+    if pwd_context.needs_update(user["password"]):
+        new_hash = await get_password_hash_async(password)
+        await db.users.update_one(
+            {"id": user["id"], "password": user["password"]},
+            {"$set": {"password": new_hash}}
+        )
+        user["password"] = new_hash
     return user
 
 async def create_user(db: AsyncIOMotorDatabase, user: UserCreate):
@@ -47,7 +159,7 @@ async def create_user(db: AsyncIOMotorDatabase, user: UserCreate):
         )
     
     # Hash password
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     
     # Create user object
     new_user = User(
@@ -62,35 +174,110 @@ async def create_user(db: AsyncIOMotorDatabase, user: UserCreate):
     
     return new_user
 
-async def get_current_user(token: str, db: AsyncIOMotorDatabase):
-    credentials_exception = HTTPException(
+def invalidate_user(user_id: str):
+    """Drop every cached principal for a user after their document changed"""
+    for token in _tokens_by_user.pop(user_id, ()):
+        principal_cache.pop(token)
+
+def principal_cache_stats() -> dict:
+    return {**principal_cache.stats(), "users": len(_tokens_by_user)}
+
+def token_version_cache_stats() -> dict:
+    return token_versions.stats()
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _missing_scope(scope: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail=f"Token lacks the {scope} scope"
+    )
+
+def decode_token(token: str) -> dict:
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
+        payload = verifier.verify(token)
     except JWTError:
-        raise credentials_exception
-    
-    user = await db.users.find_one({"email": email})
-    if user is None:
-        raise credentials_exception
-    return user
+        raise _credentials_exception()
+    if payload.get("sub") is None:
+        raise _credentials_exception()
+    return payload
+
+async def get_current_user(token: str, db: AsyncIOMotorDatabase):
+    cached = principal_cache.get(token)
+    if cached is not None:
+        return dict(cached[1])
+
+    payload = decode_token(token)
+    if "uid" in payload:
+        user = await db.users.find_one({"id": payload["uid"]}, USER_PROJECTION)
+    else:
+        # Tokens issued before they carried the user id
+        user = await db.users.find_one({"email": payload["sub"]}, USER_PROJECTION)
+    if (
+        user is None
+        or not user.get("is_active", True)
+        or payload.get("ver", 0) < user.get("token_version", 0)
+    ):
+        raise _credentials_exception()
+
+    ttl = payload.get("exp", 0) - time.time()
+    principal_cache.set(token, (payload, user), ttl=ttl)
+    if token in principal_cache:
+        _tokens_by_user.setdefault(user["id"], set()).add(token)
+    return dict(user)
+
+async def _token_version(db: AsyncIOMotorDatabase, user_id: str) -> Optional[int]:
+    """Current token version of an active user (None if missing or inactive), cached"""
+    version = token_versions.get(user_id)
+    if version is None:
+        user = await db.users.find_one({"id": user_id}, {"_id": 0, "token_version": 1, "is_active": 1})
+        version = -1 if user is None or not user.get("is_active", True) else user.get("token_version", 0)
+        token_versions.set(user_id, version)
+    return None if version < 0 else version
+
+async def get_principal(token: str, db: AsyncIOMotorDatabase, scope: Optional[str] = None) -> Principal:
+    """Authenticate a request from its token's claims alone.
+
+    For routes that only need to know who is calling. Apart from a cached
+    token-version check, this never reads the user document. With ``scope``
+    the token must carry that scope, else the request is refused with 403.
+    """
+    payload = decode_token(token)
+    if "uid" not in payload:
+        user = await get_current_user(token, db)
+        principal = Principal(
+            user_id=user["id"],
+            email=user["email"],
+            scopes=user.get("scopes", DEFAULT_SCOPES),
+            token_version=user.get("token_version", 0)
+        )
+    else:
+        version = payload.get("ver", 0)
+        current = await _token_version(db, payload["uid"])
+        if current is None or version < current:
+            raise _credentials_exception()
+        principal = Principal(
+            user_id=payload["uid"],
+            email=payload["sub"],
+            scopes=payload.get("scopes", []),
+            token_version=version
+        )
+
+    if scope is not None and scope not in principal.scopes:
+        raise _missing_scope(scope)
+    return principal
+
+async def revoke_tokens(db: AsyncIOMotorDatabase, user_id: str):
+    """Invalidate every access and refresh token issued to a user so far"""
+    await db.users.update_one({"id": user_id}, {"$inc": {"token_version": 1}})
+    await revoke_user_refresh_tokens(db, user_id)
+    token_versions.pop(user_id)
+    invalidate_user(user_id)
 
 def user_to_response(user: dict) -> UserResponse:
-    return UserResponse(
-        id=user["id"],
-        name=user["name"],
-        email=user["email"],
-        phone=user["phone"],
-        account_number=user["account_number"],
-        ifsc_code=user["ifsc_code"],
-        balance=user["balance"],
-        account_type=user["account_type"],
-        created_at=user["created_at"],
-        is_active=user["is_active"]
-    )
\ No newline at end of file
+    return UserResponse.model_validate(user)
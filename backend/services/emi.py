@@ -0,0 +1,203 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+import logging
+import os
+import uuid
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+from models.loan import EMIPayment
+from models.transaction import Transaction
+from services import amortization
+from services.transfers import TRANSFER_RECOVERY_AFTER, TransferConflict, TransferFailed, execute_transfer
+
+logger = logging.getLogger(__name__)
+
+# Pending claims older than this were left behind by a crash. Must exceed
+# TRANSFER_RECOVERY_AFTER, so the transfer behind a claim is settled first.
+IN_DOUBT_AFTER = timedelta(seconds=int(os.environ.get("EMI_IN_DOUBT_AFTER", str(max(600, 2 * TRANSFER_RECOVERY_AFTER)))))
+
+# Loan fields the EMI payment advances, restored if the payment is compensated
+SCHEDULE_FIELDS = (
+    "outstanding",
+    "remaining_months",
+    "installments_paid",
+    "next_due_date",
+    "first_due_date",
+    "due_day",
+    "status",
+)
+
+async def pay_installment(
+    db: AsyncIOMotorDatabase,
+    loan: dict,
+    transaction_id: Optional[str] = None
+) -> Optional[Tuple[float, Transaction, dict]]:
+    """Debit the loan's next installment and advance its schedule by one.
+
+    Returns ``(new_balance, transaction, installment)``, or None when the
+    balance doesn't cover the installment. ``transaction_id`` is the id to
+    record the debit under (e.g. one derived from an idempotency key).
+
+    The installment is first claimed with a pending ``emi_payments`` record,
+    unique per (loan_id, due_date), and the claim is completed in the same
+    unit as the debit. A second attempt at the same installment (a
+    concurrent request, or a rerun before ``reconcile_claims`` has settled a
+    claim a crash left pending) fails with ``TransferConflict`` before any
+    money moves. The loan update is also conditional on the schedule being
+    where ``loan`` says it is.
+    """
+    installment = amortization.next_installment(loan)
+
+    emi_payment = EMIPayment(
+        loan_id=loan["id"],
+        user_id=loan["user_id"],
+        amount=installment["amount"],
+        principal=installment["principal"],
+        interest=installment["interest"],
+        installment=installment["installment"],
+        due_date=amortization.as_datetime(installment["due_date"]),
+        status="pending"
+    )
+    try:
+        await db.emi_payments.insert_one(emi_payment.dict())
+    except DuplicateKeyError as e:
+        # A claim left behind by a crash is settled here too, not only by the scheduler
+        reconciled = await reconcile_claims(db, loan_id=loan["id"])
+        if not reconciled.get("released"):
+            raise TransferConflict(f"installment {installment['installment']} of loan {loan['id']} is already claimed") from e
+        try:
+            await db.emi_payments.insert_one(emi_payment.dict())
+        except DuplicateKeyError as e:
+            raise TransferConflict(f"installment {installment['installment']} of loan {loan['id']} is already claimed") from e
+
+    try:
+        result = await execute_transfer(
+            db,
+            loan["user_id"],
+            -installment["amount"],
+            transaction=dict(
+                id=transaction_id or str(uuid.uuid4()),
+                type="debit",
+                amount=installment["amount"],
+                description=f"EMI Payment - {loan['type']}",
+                category="EMI"
+            ),
+            updates=[
+                (
+                    "emi_payments",
+                    {"id": emi_payment.id, "status": "pending"},
+                    {"$set": {"status": "completed", "payment_date": datetime.utcnow()}},
+                    {"$set": {"status": "pending"}}
+                ),
+                (
+                    "loans",
+                    {
+                        "id": loan["id"],
+                        "status": "active",
+                        "remaining_months": loan["remaining_months"],
+                        "next_due_date": loan["next_due_date"],
+                    },
+                    {"$set": {
+                        "outstanding": installment["outstanding_after"],
+                        "remaining_months": installment["remaining_months"],
+                        "installments_paid": installment["installment"],
+                        "next_due_date": amortization.as_datetime(installment["next_due_date"]),
+                        "first_due_date": amortization.as_datetime(installment["first_due_date"]),
+                        "due_day": installment["due_day"],
+                        "status": installment["status"],
+                    }},
+                    _restore(loan)
+                ),
+            ]
+        )
+    except TransferFailed:
+        await _release(db, emi_payment.id)
+        raise
+    if result is None:
+        await _release(db, emi_payment.id)
+        return None
+    new_balance, transaction = result
+    return new_balance, transaction, installment
+
+async def _release(db: AsyncIOMotorDatabase, payment_id: str):
+    # Nothing was moved, so the installment may be attempted again
+    await db.emi_payments.delete_one({"id": payment_id, "status": "pending"})
+
+async def reconcile_claims(
+    db: AsyncIOMotorDatabase,
+    older_than: timedelta = IN_DOUBT_AFTER,
+    loan_id: Optional[str] = None
+) -> dict:
+    """Settle pending claims older than ``older_than`` from the transfer journal.
+
+    - the claim's transfer completed: the claim is marked completed
+    - it was compensated or abandoned, or never journalled (it ran in a
+      database transaction that was rolled back, or the crash came before
+      the transfer started): the claim is released, so the installment can
+      be collected again
+    - it is still pending recovery: the claim is left for the next pass
+    - its compensation failed: the claim is left in place and logged. The
+      journal entry has the error. Fix the balance and loan by hand, then
+      delete the claim (or set it ``completed`` if the money did move).
+
+    Only claims of ``loan_id`` when given. Returns the number of claims per
+    outcome.
+    """
+    counts = defaultdict(int)
+    query = {"status": "pending", "payment_date": {"$lt": datetime.utcnow() - older_than}}
+    if loan_id:
+        query["loan_id"] = loan_id
+    cursor = db.emi_payments.find(query, {"_id": 0, "id": 1, "loan_id": 1})
+    async for claim in cursor:
+        journal = await db.transfer_journal.find_one(
+            {"updated.collection": "emi_payments", "updated.id": claim["id"]},
+            {"_id": 0, "id": 1, "status": 1},
+            sort=[("created_at", -1)]
+        )
+        status = journal["status"] if journal else None
+        if status == "completed":
+            await db.emi_payments.update_one(
+                {"id": claim["id"], "status": "pending"},
+                {"$set": {"status": "completed"}}
+            )
+            counts["completed"] += 1
+        elif status in (None, "compensated", "abandoned"):
+            await _release(db, claim["id"])
+            counts["released"] += 1
+        elif status == "compensation_failed":
+            logger.error(
+                "EMI claim %s of loan %s needs manual review, see transfer %s",
+                claim["id"], claim["loan_id"], journal["id"]
+            )
+            counts["needs_review"] += 1
+        else:
+            counts["in_doubt"] += 1
+    return dict(counts)
+
+def _restore(loan: dict) -> dict:
+    # Legacy loans lack the schedule state fields; undo removes them again
+    undo = {"$set": {f: loan[f] for f in SCHEDULE_FIELDS if f in loan}}
+    missing = {f: "" for f in SCHEDULE_FIELDS if f not in loan}
+    if missing:
+        undo["$unset"] = missing
+    return undo
+
+async def due_loans(
+    db: AsyncIOMotorDatabase,
+    days: int = 7,
+    user_id: Optional[str] = None,
+    limit: int = 1000
+) -> List[dict]:
+    """Active loans with an installment due within ``days`` days, earliest first.
+
+    Served from the ``(status, next_due_date)`` index, or the
+    ``(user_id, status, next_due_date)`` one when scoped to a user.
+    """
+    until = datetime.combine(datetime.utcnow().date() + timedelta(days=days), datetime.max.time())
+    query = {"status": "active", "next_due_date": {"$lte": until}}
+    if user_id:
+        query["user_id"] = user_id
+
+    cursor = db.loans.find(query, {"_id": 0}).sort("next_due_date", 1).limit(limit)
+    return await cursor.to_list(limit)
@@ -0,0 +1,193 @@
+"""
+EMI auto-debit runner.
+
+Scans active loans in ``(next_due_date, id)`` order, served by the
+``(status, next_due_date, id)`` index, in batches and collects every
+installment due up to the run's cutoff with bounded concurrency. Each
+installment is claimed through the unique ``(loan_id, due_date)`` index on
+``emi_payments``, so no installment is charged twice, whether by a rerun, a
+second worker or the user paying by hand.
+
+Progress is checkpointed on a ``scheduler_runs`` document after every
+batch. A run that crashed is resumed from its checkpoint with its original
+cutoff. Installments left pending by a crash keep their claim until
+``services.emi.reconcile_claims`` settles it from the transfer journal at
+the start of a later run. A claim whose compensation failed is never
+settled automatically; see ``reconcile_claims`` for the manual steps.
+
+Runs inside the API when ``EMI_AUTO_DEBIT_INTERVAL`` (seconds) is set, or
+once from the command line (run from the backend directory):
+
+    python -m services.emi_scheduler [--days 0] [--batch-size 200] [--concurrency 16]
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from services.emi import IN_DOUBT_AFTER, pay_installment, reconcile_claims
+from services.transfers import TransferConflict, TransferFailed
+
+logger = logging.getLogger(__name__)
+
+JOB = "emi_auto_debit"
+
+# 0 disables the in-process scheduler; enable it on one worker only
+EMI_AUTO_DEBIT_INTERVAL = int(os.environ.get("EMI_AUTO_DEBIT_INTERVAL", "0"))
+EMI_AUTO_DEBIT_BATCH_SIZE = int(os.environ.get("EMI_AUTO_DEBIT_BATCH_SIZE", "200"))
+EMI_AUTO_DEBIT_CONCURRENCY = int(os.environ.get("EMI_AUTO_DEBIT_CONCURRENCY", "16"))
+OUTCOMES = ("paid", "insufficient", "conflict", "failed")
+
+async def _start_or_resume(db: AsyncIOMotorDatabase, days: int) -> dict:
+    run = await db.scheduler_runs.find_one({"job": JOB, "status": "running"}, {"_id": 0})
+    if run:
+        logger.info("Resuming EMI auto-debit run %s from %s", run["id"], run["checkpoint"])
+        return run
+
+    now = datetime.utcnow()
+    run = {
+        "id": str(uuid.uuid4()),
+        "job": JOB,
+        "status": "running",
+        "cutoff": datetime.combine(now.date() + timedelta(days=days), datetime.max.time()),
+        "checkpoint": None,
+        "counts": dict.fromkeys(OUTCOMES, 0),
+        "collected": 0.0,
+        "elapsed": 0.0,
+        "started_at": now,
+        "updated_at": now,
+    }
+    await db.scheduler_runs.insert_one(dict(run))
+    return run
+
+def _due_query(cutoff: datetime, checkpoint: Optional[dict]) -> dict:
+    query = {"status": "active", "next_due_date": {"$lte": cutoff}}
+    if checkpoint:
+        query["$or"] = [
+            {"next_due_date": {"$gt": checkpoint["next_due_date"]}},
+            {"next_due_date": checkpoint["next_due_date"], "id": {"$gt": checkpoint["id"]}},
+        ]
+    return query
+
+async def _collect(db: AsyncIOMotorDatabase, loan: dict, limit: asyncio.Semaphore):
+    async with limit:
+        try:
+            result = await pay_installment(db, loan)
+        except TransferConflict:
+            return "conflict", 0.0
+        except TransferFailed:
+            return "failed", 0.0
+        except Exception:
+            logger.exception("EMI auto-debit of loan %s failed", loan["id"])
+            return "failed", 0.0
+    if result is None:
+        return "insufficient", 0.0
+    _, _, installment = result
+    return "paid", installment["amount"]
+
+async def run_auto_debit(
+    db: AsyncIOMotorDatabase,
+    days: int = 0,
+    batch_size: int = EMI_AUTO_DEBIT_BATCH_SIZE,
+    concurrency: int = EMI_AUTO_DEBIT_CONCURRENCY
+) -> dict:
+    """Collect installments due within ``days`` days; returns the run report.
+
+    Installments a loan has fallen behind on are collected one after the
+    other in the same run, as each payment moves the loan's due date on.
+    """
+    # Settle claims earlier crashes left behind, so their installments are collected again
+    reconciled = await reconcile_claims(db)
+    run = await _start_or_resume(db, days)
+    limit = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+    elapsed_before = run["elapsed"]
+
+    while True:
+        loans = await db.loans.find(
+            _due_query(run["cutoff"], run["checkpoint"]),
+            {"_id": 0}
+        ).sort([("next_due_date", 1), ("id", 1)]).limit(batch_size).to_list(batch_size)
+        if not loans:
+            break
+
+        outcomes = await asyncio.gather(*(_collect(db, loan, limit) for loan in loans))
+        counts = dict.fromkeys(OUTCOMES, 0)
+        for outcome, _ in outcomes:
+            counts[outcome] += 1
+        collected = round(sum(amount for _, amount in outcomes), 2)
+
+        run["checkpoint"] = {"next_due_date": loans[-1]["next_due_date"], "id": loans[-1]["id"]}
+        run["elapsed"] = elapsed_before + time.perf_counter() - started
+        await db.scheduler_runs.update_one(
+            {"id": run["id"]},
+            {
+                "$set": {"checkpoint": run["checkpoint"], "elapsed": run["elapsed"], "updated_at": datetime.utcnow()},
+                "$inc": {**{f"counts.{k}": v for k, v in counts.items()}, "collected": collected},
+            }
+        )
+        for outcome, count in counts.items():
+            run["counts"][outcome] += count
+        run["collected"] = round(run["collected"] + collected, 2)
+
+    in_doubt = await db.emi_payments.count_documents({
+        "status": "pending",
+        "payment_date": {"$lt": datetime.utcnow() - IN_DOUBT_AFTER},
+    })
+    processed = sum(run["counts"].values())
+    report = {
+        "run_id": run["id"],
+        **run["counts"],
+        "processed": processed,
+        "collected": run["collected"],
+        "in_doubt": in_doubt,
+        "reconciled": reconciled,
+        "elapsed_seconds": round(run["elapsed"], 3),
+        "loans_per_second": round(processed / run["elapsed"], 1) if run["elapsed"] else 0.0,
+    }
+    await db.scheduler_runs.update_one(
+        {"id": run["id"]},
+        {"$set": {"status": "completed", "report": report, "finished_at": datetime.utcnow()}}
+    )
+    logger.info("EMI auto-debit run finished: %s", report)
+    return report
+
+async def auto_debit_loop(db: AsyncIOMotorDatabase, interval: int = EMI_AUTO_DEBIT_INTERVAL):
+    """Run the auto-debit every ``interval`` seconds until cancelled"""
+    while True:
+        try:
+            await run_auto_debit(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # The run stays "running" and resumes from its checkpoint next time
+            logger.exception("EMI auto-debit run failed")
+        await asyncio.sleep(interval)
+
+if __name__ == "__main__":
+    import argparse
+    from pathlib import Path
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).parent.parent / '.env')
+    from database import get_database
+
+    parser = argparse.ArgumentParser(description="Collect due EMIs")
+    parser.add_argument("--days", type=int, default=0, help="also collect installments due within this many days")
+    parser.add_argument("--batch-size", type=int, default=EMI_AUTO_DEBIT_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=EMI_AUTO_DEBIT_CONCURRENCY)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    async def main():
+        db = await get_database()
+        report = await run_auto_debit(db, args.days, args.batch_size, args.concurrency)
+        for key, value in report.items():
+            print(f"{key}: {value}")
+
+    asyncio.run(main())
@@ -0,0 +1,189 @@
+"""
+Idempotency-Key support for money-moving endpoints.
+
+A client sends the same ``Idempotency-Key`` header when it retries a
+request. The first request claims the key in the TTL-indexed
+``idempotency_keys`` collection before moving any money, and stores its
+response once it succeeds. A retry then gets that stored response back
+(marked with ``Idempotent-Replayed: true``) without executing the writes
+again. Completed responses are also kept in an in-process cache, so hot
+retries don't reach the database.
+
+- A key reused for a different request (another endpoint, body or query)
+  is rejected with 422.
+- A retry arriving while the first request is still running gets 409.
+- A request that fails releases its key, since no money was moved, so it
+  can be retried with the same key.
+- A claim is a lease, held for ``IDEMPOTENCY_LEASE`` seconds. Once a claim
+  left behind by a crash has expired, a retry takes it over and runs the
+  request again, unless the first run's transaction exists (then it gets
+  409, as its money moved but its response was lost).
+
+Transactions recorded under a key get ids derived from it
+(``transaction_id``), so the check above finds them. Transaction ids are
+unique, so a takeover racing a first run that was only slow fails
+instead of moving the money twice.
+
+Endpoints use it as::
+
+    async with idempotency.claim(db, user["id"]) as replay:
+        if replay:
+            return replay
+        ...
+        result = await execute_transfer(db, user["id"], delta, transaction=dict(id=idempotency.transaction_id(), ...))
+        return idempotency.respond(content)
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Optional
+from fastapi import Header, HTTPException, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+from services.cache import TTLCache
+from services.serialization import ORJSONResponse
+import hashlib
+import os
+import uuid
+
+# How long keys (and the responses stored with them) are remembered
+IDEMPOTENCY_KEY_TTL = int(os.environ.get("IDEMPOTENCY_KEY_TTL", str(24 * 3600)))
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_CACHE_TTL = int(os.environ.get("IDEMPOTENCY_CACHE_TTL", "300"))
+# How long a claim blocks retries before one may take it over (seconds);
+# must exceed the time any request can take
+IDEMPOTENCY_LEASE = int(os.environ.get("IDEMPOTENCY_LEASE", "60"))
+MAX_KEY_LENGTH = 255
+
+_TRANSACTION_NAMESPACE = uuid.UUID("5b0c2a8e-3f1d-4c6b-9a57-2e8d1f4b7c30")
+
+response_cache = TTLCache(maxsize=IDEMPOTENCY_CACHE_SIZE, ttl=IDEMPOTENCY_CACHE_TTL)
+
+class IdempotentRequest:
+    def __init__(self, key: Optional[str], fingerprint: str):
+        self.key = key
+        self.fingerprint = fingerprint
+        self._db: Optional[AsyncIOMotorDatabase] = None
+        self._id: Optional[str] = None
+        self._claimed = False
+        self._lease = uuid.uuid4().hex
+        self._response: Any = None
+
+    def claim(self, db: AsyncIOMotorDatabase, user_id: str) -> "IdempotentRequest":
+        self._db = db
+        self._id = f"{user_id}:{self.key}"
+        return self
+
+    def transaction_id(self, index: int = 0) -> str:
+        """Id for the request's ``index``-th transaction, the same on every retry of the key"""
+        if not self.key:
+            return str(uuid.uuid4())
+        return str(uuid.uuid5(_TRANSACTION_NAMESPACE, f"{self._id}:{index}"))
+
+    def respond(self, content: Any) -> Any:
+        """Record the response to store for the key and return it unchanged"""
+        self._response = content
+        return content
+
+    def _check_fingerprint(self, stored: dict):
+        if stored["fingerprint"] != self.fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used for a different request"
+            )
+
+    def _replay(self, stored: dict) -> Response:
+        self._check_fingerprint(stored)
+        return ORJSONResponse(
+            content=stored["body"],
+            status_code=stored["status_code"],
+            headers={"Idempotent-Replayed": "true"}
+        )
+
+    async def __aenter__(self) -> Optional[Response]:
+        if not self.key:
+            return None
+
+        cached = response_cache.get(self._id)
+        if cached is not None:
+            return self._replay(cached)
+
+        now = datetime.utcnow()
+        try:
+            await self._db.idempotency_keys.insert_one({
+                "_id": self._id,
+                "fingerprint": self.fingerprint,
+                "status": "in_progress",
+                "lease": self._lease,
+                "locked_until": now + timedelta(seconds=IDEMPOTENCY_LEASE),
+                "created_at": now,
+                "expires_at": now + timedelta(seconds=IDEMPOTENCY_KEY_TTL),
+            })
+        except DuplicateKeyError:
+            stored = await self._db.idempotency_keys.find_one({"_id": self._id})
+            if stored is not None and stored["status"] == "completed":
+                response_cache.set(self._id, stored)
+                return self._replay(stored)
+            if stored is None or not await self._take_over(stored, now):
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key is still in progress"
+                )
+
+        self._claimed = True
+        return None
+
+    async def _take_over(self, stored: dict, now: datetime) -> bool:
+        """Claim the key from a run whose lease has expired; False if it is still held"""
+        self._check_fingerprint(stored)
+        # Claims made before leases existed expire one lease after creation
+        locked_until = stored.get("locked_until", stored["created_at"] + timedelta(seconds=IDEMPOTENCY_LEASE))
+        if locked_until > now:
+            return False
+        if await self._db.transactions.count_documents({"id": self.transaction_id()}, limit=1):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key already completed, but its response was lost"
+            )
+        taken = await self._db.idempotency_keys.update_one(
+            {"_id": self._id, "status": "in_progress", "lease": stored.get("lease")},
+            {"$set": {"lease": self._lease, "locked_until": now + timedelta(seconds=IDEMPOTENCY_LEASE)}}
+        )
+        return taken.modified_count == 1
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        if not self._claimed:
+            return False
+
+        if exc_type is not None:
+            # Nothing was moved, let a retry with the same key run again
+            await self._db.idempotency_keys.delete_one({"_id": self._id, "status": "in_progress", "lease": self._lease})
+            return False
+
+        stored = {
+            "fingerprint": self.fingerprint,
+            "status": "completed",
+            "status_code": status.HTTP_200_OK,
+            "body": jsonable_encoder(self._response),
+        }
+        await self._db.idempotency_keys.update_one(
+            {"_id": self._id},
+            {"$set": {**stored, "completed_at": datetime.utcnow()}}
+        )
+        response_cache.set(self._id, stored)
+        return False
+
+async def idempotency_key(
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, max_length=MAX_KEY_LENGTH)
+) -> IdempotentRequest:
+    """Dependency reading the Idempotency-Key header and fingerprinting the request"""
+    fingerprint = hashlib.sha256()
+    for part in (request.method, request.url.path, str(request.query_params)):
+        fingerprint.update(part.encode())
+        fingerprint.update(b"\0")
+    fingerprint.update(await request.body())
+    return IdempotentRequest(idempotency_key, fingerprint.hexdigest())
+
+def idempotency_cache_stats() -> dict:
+    return response_cache.stats()
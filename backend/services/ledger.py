@@ -0,0 +1,75 @@
+from datetime import datetime
+from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from services.auth import invalidate_user
+
+async def apply_delta(
+    db: AsyncIOMotorDatabase,
+    user_id: str,
+    amount: float,
+    session=None,
+    transfer_id: Optional[str] = None,
+    settles: bool = False
+) -> Optional[float]:
+    """Atomically add ``amount`` (negative for debits) to a user's balance.
+
+    The balance check and the write happen in a single conditional
+    ``find_one_and_update``, so concurrent requests can never overdraw the
+    account or overwrite each other's updates. Returns the new balance, or
+    ``None`` when the account does not exist or cannot cover the debit.
+
+    When a ``session`` is given the update joins its transaction, and the
+    caller is responsible for invalidating cached principals after commit.
+
+    ``transfer_id`` records the movement's journal entry in
+    ``pending_transfers`` in the same write, so crash recovery can tell
+    whether the balance moved. With ``settles`` the write instead reverses
+    a recorded movement: it only applies while the entry is still recorded
+    and removes it, so a reversal can never be applied twice.
+    """
+    query = {"id": user_id}
+    if amount < 0:
+        query["balance"] = {"$gte": -amount}
+    update = {
+        "$inc": {"balance": amount},
+        "$set": {"updated_at": datetime.utcnow()},
+    }
+    if transfer_id and settles:
+        query["pending_transfers"] = transfer_id
+        update["$pull"] = {"pending_transfers": transfer_id}
+    elif transfer_id:
+        update["$addToSet"] = {"pending_transfers": transfer_id}
+
+    updated = await db.users.find_one_and_update(
+        query,
+        update,
+        projection={"_id": 0, "balance": 1},
+        return_document=ReturnDocument.AFTER,
+        session=session,
+    )
+    if updated is None:
+        return None
+
+    if session is None:
+        invalidate_user(user_id)
+    return updated["balance"]
+
+async def current_balance(db: AsyncIOMotorDatabase, user_id: str) -> Optional[float]:
+    """A user's balance read straight from the database, or ``None`` for an unknown user"""
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "balance": 1})
+    return None if user is None else user["balance"]
+
+def _check_amount(amount: float):
+    if not amount > 0:
+        raise ValueError(f"amount must be positive, got {amount}")
+
+async def debit(db: AsyncIOMotorDatabase, user_id: str, amount: float) -> Optional[float]:
+    """Withdraw ``amount`` (> 0) if the balance covers it; returns the new balance or ``None``"""
+    _check_amount(amount)
+    return await apply_delta(db, user_id, -amount)
+
+async def credit(db: AsyncIOMotorDatabase, user_id: str, amount: float) -> Optional[float]:
+    """Deposit ``amount`` (> 0); returns the new balance or ``None`` for an unknown user"""
+    _check_amount(amount)
+    return await apply_delta(db, user_id, amount)
@@ -0,0 +1,204 @@
+"""
+One-time passcodes.
+
+``issue`` creates a random code for a recipient (email) and purpose, and
+hands it to the configured delivery. Each recipient and purpose has at
+most one live code, stored in the TTL-indexed ``otp_codes`` collection
+under ``purpose:email``. Verifying reads it by ``_id`` and never scans.
+Only an HMAC of the code is stored, keyed with ``OTP_SECRET``, so a
+database dump can't be brute-forced offline. Live codes are also kept in
+an in-process cache, so verification usually skips the read.
+
+``verify`` compares in constant time. A correct code is consumed with a
+conditional delete, so it works exactly once across workers. A wrong code
+increments ``attempts`` in the database, and after ``OTP_MAX_ATTEMPTS``
+the code is burned and a new one has to be requested.
+
+A verified code is exchanged for a proof (``issue_proof``), a short-lived
+signed token naming the email and purpose. The action the code guards,
+e.g. signup, spends the proof with ``consume_proof``, which records its id
+in ``otp_codes`` so it works once.
+
+Delivery is pluggable. ``LogDelivery`` (the default) and ``FileDelivery``
+are local sinks for development and tests; a real SMS or email provider
+subclasses ``OTPDelivery``. Choose with ``OTP_DELIVERY=log|file`` and
+``OTP_DELIVERY_FILE``. ``LogDelivery`` logs codes at DEBUG only.
+"""
+
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+from jose import JWTError
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+from services.cache import TTLCache
+from services.tokens import SECRET_KEY, verifier
+import asyncio
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+OTP_LENGTH = int(os.environ.get("OTP_LENGTH", "6"))
+OTP_TTL = int(os.environ.get("OTP_TTL", "300"))
+OTP_MAX_ATTEMPTS = int(os.environ.get("OTP_MAX_ATTEMPTS", "5"))
+OTP_CACHE_SIZE = int(os.environ.get("OTP_CACHE_SIZE", "10000"))
+OTP_SECRET = os.environ.get("OTP_SECRET", SECRET_KEY).encode()
+OTP_DELIVERY = os.environ.get("OTP_DELIVERY", "log")
+OTP_DELIVERY_FILE = os.environ.get(
+    "OTP_DELIVERY_FILE",
+    str(Path(__file__).parent.parent / "data" / "otp_outbox.log")
+)
+# How long a verified code's proof can be spent (seconds)
+OTP_PROOF_TTL = int(os.environ.get("OTP_PROOF_TTL", "600"))
+
+# Outcomes of verify
+VERIFIED = "verified"
+INVALID = "invalid"
+EXPIRED = "expired"
+LOCKED = "locked"
+
+class OTPDelivery(ABC):
+    """Sends a code to its recipient"""
+
+    @abstractmethod
+    async def send(self, recipient: str, code: str, purpose: str):
+        ...
+
+class LogDelivery(OTPDelivery):
+    """Logs codes at DEBUG, so they never reach production logs at INFO"""
+
+    async def send(self, recipient: str, code: str, purpose: str):
+        logger.debug("OTP for %s (%s): %s", recipient, purpose, code)
+
+class FileDelivery(OTPDelivery):
+    """Appends ``time recipient purpose code`` lines to a file"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _append(self, line: str):
+        with open(self.path, "a") as outbox:
+            outbox.write(line)
+
+    async def send(self, recipient: str, code: str, purpose: str):
+        line = f"{datetime.utcnow().isoformat()} {recipient} {purpose} {code}\n"
+        await asyncio.to_thread(self._append, line)
+
+def delivery_from_env() -> OTPDelivery:
+    if OTP_DELIVERY == "file":
+        return FileDelivery(OTP_DELIVERY_FILE)
+    return LogDelivery()
+
+delivery = delivery_from_env()
+# purpose:email -> {"code_hash", "expires_at" (epoch seconds)}
+live_codes = TTLCache(maxsize=OTP_CACHE_SIZE, ttl=OTP_TTL)
+
+def _key(email: str, purpose: str) -> str:
+    return f"{purpose}:{email.lower()}"
+
+def _digest(key: str, code: str) -> str:
+    return hmac.new(OTP_SECRET, f"{key}:{code}".encode(), hashlib.sha256).hexdigest()
+
+async def issue(
+    db: AsyncIOMotorDatabase,
+    email: str,
+    purpose: str,
+    sink: Optional[OTPDelivery] = None
+) -> datetime:
+    """Create and deliver a new code to ``email``, replacing any live one; returns its expiry"""
+    key = _key(email, purpose)
+    code = f"{secrets.randbelow(10 ** OTP_LENGTH):0{OTP_LENGTH}d}"
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=OTP_TTL)
+    code_hash = _digest(key, code)
+
+    await db.otp_codes.replace_one(
+        {"_id": key},
+        {"code_hash": code_hash, "attempts": 0, "created_at": now, "expires_at": expires_at},
+        upsert=True
+    )
+    live_codes.set(key, {"code_hash": code_hash, "expires_at": time.time() + OTP_TTL})
+    await (sink or delivery).send(email, code, purpose)
+    return expires_at
+
+async def _entry(db: AsyncIOMotorDatabase, key: str) -> Optional[dict]:
+    entry = live_codes.get(key)
+    if entry is None:
+        stored = await db.otp_codes.find_one({"_id": key}, {"code_hash": 1, "expires_at": 1})
+        if stored is None:
+            return None
+        ttl = (stored["expires_at"] - datetime.utcnow()).total_seconds()
+        entry = {"code_hash": stored["code_hash"], "expires_at": time.time() + ttl}
+        live_codes.set(key, entry, ttl=ttl)
+    return entry
+
+async def verify(db: AsyncIOMotorDatabase, email: str, purpose: str, code: str, _retry: bool = True) -> str:
+    """Check ``code`` and consume it if correct; returns one of the outcomes above"""
+    key = _key(email, purpose)
+    code_hash = _digest(key, code)
+
+    entry = await _entry(db, key)
+    if entry is None or entry["expires_at"] <= time.time():
+        return EXPIRED
+
+    if hmac.compare_digest(entry["code_hash"], code_hash):
+        live_codes.pop(key)
+        # Another worker may have consumed or burned it meanwhile
+        result = await db.otp_codes.delete_one({
+            "_id": key,
+            "code_hash": code_hash,
+            "attempts": {"$lt": OTP_MAX_ATTEMPTS},
+        })
+        return VERIFIED if result.deleted_count else EXPIRED
+
+    result = await db.otp_codes.update_one(
+        {"_id": key, "code_hash": entry["code_hash"], "attempts": {"$lt": OTP_MAX_ATTEMPTS - 1}},
+        {"$inc": {"attempts": 1}}
+    )
+    if result.matched_count:
+        return INVALID
+
+    live_codes.pop(key)
+    result = await db.otp_codes.delete_one({"_id": key, "code_hash": entry["code_hash"]})
+    if result.deleted_count:
+        # That was the last allowed attempt
+        return LOCKED
+    # The cached code was stale (consumed or re-issued by another worker)
+    return await verify(db, email, purpose, code, _retry=False) if _retry else INVALID
+
+def issue_proof(email: str, purpose: str) -> str:
+    """Proof that ``email`` verified a code for ``purpose``, after ``verify`` returned VERIFIED"""
+    return verifier.sign({
+        # No "sub", so it can never pass as an access token
+        "otp_email": email.lower(),
+        "otp_purpose": purpose,
+        "jti": str(uuid.uuid4()),
+        "exp": datetime.utcnow() + timedelta(seconds=OTP_PROOF_TTL),
+    })
+
+async def consume_proof(db: AsyncIOMotorDatabase, proof: str, email: str, purpose: str) -> bool:
+    """Spend a proof for ``email`` and ``purpose``; False if invalid, expired or spent"""
+    try:
+        claims = verifier.verify(proof)
+    except JWTError:
+        return False
+    if claims.get("otp_email") != email.lower() or claims.get("otp_purpose") != purpose:
+        return False
+    try:
+        await db.otp_codes.insert_one({
+            "_id": f"proof:{claims['jti']}",
+            "expires_at": datetime.utcfromtimestamp(claims["exp"]),
+        })
+    except DuplicateKeyError:
+        return False
+    return True
+
+def otp_cache_stats() -> dict:
+    return live_codes.stats()
@@ -0,0 +1,61 @@
+from datetime import datetime
+from typing import Any, Optional, Tuple
+from fastapi import HTTPException, status
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+def page_size(limit: Optional[int]) -> int:
+    """Clamp a client-supplied page size to the server-side bounds"""
+    if not limit or limit < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(limit, MAX_PAGE_SIZE)
+
+def encode_cursor(sort_value: Any, id: str) -> str:
+    """Opaque cursor pointing just past the row with the given sort key and id"""
+    if isinstance(sort_value, datetime):
+        payload = {"t": sort_value.isoformat(), "i": id}
+    else:
+        payload = {"v": sort_value, "i": id}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[Any, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if "t" in payload:
+            return datetime.fromisoformat(payload["t"]), payload["i"]
+        return payload["v"], payload["i"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def keyset_filter(field: str, cursor: Optional[str]) -> dict:
+    """Query clause selecting rows after ``cursor`` in ``(field, id)`` descending order"""
+    if not cursor:
+        return {}
+    value, id = decode_cursor(cursor)
+    return {"$or": [
+        {field: {"$lt": value}},
+        {field: value, "id": {"$lt": id}},
+    ]}
+
+def keyset_sort(field: str) -> list:
+    return [(field, -1), ("id", -1)]
+
+def paginate(rows: list, field: str, limit: int) -> Tuple[list, Optional[str]]:
+    """Trim rows fetched with ``limit + 1`` to a page and build the next cursor.
+
+    The extra row only signals that another page exists, so the last page
+    never hands out a cursor leading to an empty one.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last[field], last["id"])
@@ -0,0 +1,107 @@
+from collections import defaultdict
+from pymongo import monitoring
+import threading
+import time
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Connection pool metrics per server, for sizing pools per worker.
+
+    Motor runs pymongo in executor threads, so events arrive concurrently.
+    A checkout's wait is timed from its start event to its checked-out or
+    failed event, which pymongo publishes on the same thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pools = defaultdict(self._empty)
+
+    @staticmethod
+    def _empty() -> dict:
+        return {
+            "open": 0,
+            "checked_out": 0,
+            "peak_checked_out": 0,
+            "waiting": 0,
+            "peak_waiting": 0,
+            "checkouts": 0,
+            "checkout_failures": 0,
+            "total_wait": 0.0,
+            "max_wait": 0.0,
+            "cleared": 0,
+        }
+
+    def _key(self, event) -> str:
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def _finish_wait(self, pool: dict) -> None:
+        started = getattr(self._local, "started", None)
+        self._local.started = None
+        pool["waiting"] = max(0, pool["waiting"] - 1)
+        if started is not None:
+            wait = time.perf_counter() - started
+            pool["total_wait"] += wait
+            pool["max_wait"] = max(pool["max_wait"], wait)
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+        with self._lock:
+            pool = self._pools[self._key(event)]
+            pool["waiting"] += 1
+            pool["peak_waiting"] = max(pool["peak_waiting"], pool["waiting"])
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            pool = self._pools[self._key(event)]
+            self._finish_wait(pool)
+            pool["checkouts"] += 1
+            pool["checked_out"] += 1
+            pool["peak_checked_out"] = max(pool["peak_checked_out"], pool["checked_out"])
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            pool = self._pools[self._key(event)]
+            self._finish_wait(pool)
+            pool["checkout_failures"] += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            pool = self._pools[self._key(event)]
+            pool["checked_out"] = max(0, pool["checked_out"] - 1)
+
+    def connection_created(self, event):
+        with self._lock:
+            self._pools[self._key(event)]["open"] += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            pool = self._pools[self._key(event)]
+            pool["open"] = max(0, pool["open"] - 1)
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._pools[self._key(event)]["cleared"] += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._pools.pop(self._key(event), None)
+
+    def connection_ready(self, event):
+        pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            pools = {address: dict(pool) for address, pool in self._pools.items()}
+        for pool in pools.values():
+            total_wait = pool.pop("total_wait")
+            attempts = pool["checkouts"] + pool["checkout_failures"]
+            pool["avg_wait_ms"] = round(total_wait / attempts * 1000, 3) if attempts else 0.0
+            pool["max_wait_ms"] = round(pool.pop("max_wait") * 1000, 3)
+        return pools
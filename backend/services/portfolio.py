@@ -0,0 +1,48 @@
+from typing import List
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from models.investment import PortfolioSummary, PortfolioTypeSummary
+
+def returns_percent(invested: float, current_value: float) -> float:
+    return round((current_value - invested) / invested * 100, 2) if invested > 0 else 0
+
+def portfolio_pipeline(user_id: str) -> List[dict]:
+    """Invested and current value per investment type in one ``$group``.
+
+    The ``$match`` is served by the ``(user_id, status)`` index and only one
+    document per type leaves the database, however many holdings there are.
+    """
+    return [
+        {"$match": {"user_id": user_id, "status": "active"}},
+        {"$group": {
+            "_id": "$type",
+            "invested": {"$sum": "$amount"},
+            "current_value": {"$sum": "$current_value"},
+            "count": {"$sum": 1},
+        }},
+        {"$sort": {"current_value": -1}},
+    ]
+
+async def portfolio_summary(db: AsyncIOMotorDatabase, user_id: str) -> PortfolioSummary:
+    groups = await db.investments.aggregate(portfolio_pipeline(user_id)).to_list(None)
+
+    by_type = [
+        PortfolioTypeSummary(
+            type=g["_id"],
+            invested=g["invested"],
+            current_value=g["current_value"],
+            returns=g["current_value"] - g["invested"],
+            returns_percent=returns_percent(g["invested"], g["current_value"]),
+            investments_count=g["count"]
+        ) for g in groups
+    ]
+    total_invested = sum(t.invested for t in by_type)
+    total_current_value = sum(t.current_value for t in by_type)
+
+    return PortfolioSummary(
+        total_invested=total_invested,
+        total_current_value=total_current_value,
+        total_returns=total_current_value - total_invested,
+        total_returns_percent=returns_percent(total_invested, total_current_value),
+        investments_count=sum(t.investments_count for t in by_type),
+        by_type=by_type
+    )
@@ -0,0 +1,65 @@
+"""
+Market price feeds for investment valuation.
+
+A feed maps instrument ``name`` to its latest unit price (NAV for funds,
+last trade for stocks). ``CSVPriceFeed`` is the local stand-in: a file with
+``name,price,as_of`` rows that is re-read whenever it changes on disk.
+"""
+
+import asyncio
+import csv
+import os
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+PRICE_FEED_CSV = os.environ.get(
+    "PRICE_FEED_CSV",
+    str(Path(__file__).parent.parent / "data" / "prices.csv")
+)
+
+@dataclass(frozen=True)
+class Quote:
+    name: str
+    price: float
+    as_of: datetime
+
+class PriceFeed(ABC):
+    """Source of the latest quote per instrument"""
+
+    @abstractmethod
+    async def quotes(self) -> Dict[str, Quote]:
+        ...
+
+    async def quote(self, name: str) -> Optional[Quote]:
+        return (await self.quotes()).get(name)
+
+class CSVPriceFeed(PriceFeed):
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime: Optional[float] = None
+        self._quotes: Dict[str, Quote] = {}
+
+    def _read(self) -> Dict[str, Quote]:
+        with open(self.path, newline="") as f:
+            return {
+                row["name"]: Quote(
+                    name=row["name"],
+                    price=float(row["price"]),
+                    as_of=datetime.fromisoformat(row["as_of"]) if row.get("as_of") else datetime.utcnow()
+                ) for row in csv.DictReader(f)
+            }
+
+    async def quotes(self) -> Dict[str, Quote]:
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return {}
+        if mtime != self._mtime:
+            self._quotes = await asyncio.to_thread(self._read)
+            self._mtime = mtime
+        return self._quotes
+
+price_feed: PriceFeed = CSVPriceFeed(PRICE_FEED_CSV)
@@ -0,0 +1,210 @@
+"""
+Rate limiting for the API, as an ASGI middleware in front of the routes.
+
+Every request under ``/api`` falls into one route group and takes a token
+from that group's bucket for its caller:
+
+- auth: login, signup, refresh and OTP endpoints, per client IP
+- transfers: endpoints that move money, per user
+- reads: everything else, per user
+
+Users are identified from the access token's ``uid`` claim (through the
+cached token verifier). Requests without a valid token are limited per IP.
+Each group is configured as ``requests/seconds``, e.g.
+``RATE_LIMIT_AUTH=20/60``, which allows bursts of 20 requests that refill
+evenly over a minute.
+
+A rejected request gets a prebuilt 429 with ``Retry-After`` before routing
+starts, so it costs no database query, password hash or body parsing.
+Buckets live in process memory by default, one set per worker. With
+``RATE_LIMIT_REDIS_URL`` set (and the optional ``redis`` package
+installed) they are shared by all workers through Redis. If Redis is
+unreachable, requests are let through rather than failed.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from jose import JWTError
+from services.tokens import verifier
+import logging
+import math
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_AUTH = os.environ.get("RATE_LIMIT_AUTH", "20/60")
+RATE_LIMIT_TRANSFERS = os.environ.get("RATE_LIMIT_TRANSFERS", "30/60")
+RATE_LIMIT_READS = os.environ.get("RATE_LIMIT_READS", "600/60")
+# Buckets kept per worker; the least recently used are dropped beyond this
+RATE_LIMIT_MAX_KEYS = int(os.environ.get("RATE_LIMIT_MAX_KEYS", "100000"))
+RATE_LIMIT_REDIS_URL = os.environ.get("RATE_LIMIT_REDIS_URL")
+# Proxies in front of the API (the ingress by default); the client IP is the
+# X-Forwarded-For entry this many hops back. Set 0 only when clients connect
+# directly, as a client can then put anything in X-Forwarded-For.
+RATE_LIMIT_PROXY_HOPS = int(os.environ.get("RATE_LIMIT_PROXY_HOPS", "1"))
+
+@dataclass(frozen=True)
+class Rule:
+    group: str
+    burst: int
+    rate: float  # tokens per second
+    per_user: bool
+
+    @classmethod
+    def parse(cls, group: str, spec: str, per_user: bool) -> "Rule":
+        requests, seconds = spec.split("/")
+        return cls(group, int(requests), int(requests) / float(seconds), per_user)
+
+# (method or None for any, path prefix, group); the first match wins
+ROUTE_GROUPS: List[Tuple[Optional[str], str, str]] = [
+    ("POST", "/api/auth/login", "auth"),
+    ("POST", "/api/auth/signup", "auth"),
+    ("POST", "/api/auth/refresh", "auth"),
+    ("POST", "/api/auth/verify-otp", "auth"),
+    ("POST", "/api/auth/request-otp", "auth"),
+    ("POST", "/api/transactions/send-money", "transfers"),
+    ("POST", "/api/transactions/batch-send", "transfers"),
+    ("POST", "/api/transactions/qr-payment", "transfers"),
+    ("POST", "/api/loans/pay-emi/", "transfers"),
+    ("POST", "/api/user/update-balance", "transfers"),
+    ("POST", "/api/investments", "transfers"),
+    ("DELETE", "/api/investments/", "transfers"),
+    (None, "/api/health", None),
+    (None, "/api/", "reads"),
+]
+
+def default_rules() -> Dict[str, Rule]:
+    return {
+        "auth": Rule.parse("auth", RATE_LIMIT_AUTH, per_user=False),
+        "transfers": Rule.parse("transfers", RATE_LIMIT_TRANSFERS, per_user=True),
+        "reads": Rule.parse("reads", RATE_LIMIT_READS, per_user=True),
+    }
+
+class LocalBucketStore:
+    """Token buckets in this process's memory"""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    async def take(self, key: str, rule: Rule) -> float:
+        """Take one token; returns 0 if allowed, else seconds until one is available"""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(rule.burst), now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(rule.burst, bucket[0] + (now - bucket[1]) * rule.rate)
+            bucket[1] = now
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) / rule.rate
+
+# Refill and take in one atomic step; Redis's own clock keeps workers consistent
+_TAKE_SCRIPT = """
+local burst = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local retry = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return tostring(retry)
+"""
+
+class RedisBucketStore:
+    """Token buckets shared by all workers through Redis"""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+        self._client = redis.from_url(url)
+        self._take = self._client.register_script(_TAKE_SCRIPT)
+
+    async def take(self, key: str, rule: Rule) -> float:
+        try:
+            return float(await self._take(keys=[f"rate_limit:{key}"], args=[rule.burst, rule.rate]))
+        except Exception:
+            logger.exception("Rate limit store unavailable, letting the request through")
+            return 0.0
+
+def bucket_store():
+    if RATE_LIMIT_REDIS_URL:
+        try:
+            return RedisBucketStore(RATE_LIMIT_REDIS_URL)
+        except ImportError:
+            logger.warning("RATE_LIMIT_REDIS_URL is set but redis is not installed, using in-process buckets")
+    return LocalBucketStore()
+
+_TOO_MANY_REQUESTS = b'{"detail":"Too many requests, please retry later"}'
+
+class RateLimitMiddleware:
+    def __init__(self, app, rules: Optional[Dict[str, Rule]] = None, store=None, proxy_hops: int = RATE_LIMIT_PROXY_HOPS):
+        self.app = app
+        self.rules = rules if rules is not None else default_rules()
+        self.store = store if store is not None else bucket_store()
+        self.proxy_hops = proxy_hops
+
+    def _rule(self, method: str, path: str) -> Optional[Rule]:
+        for route_method, prefix, group in ROUTE_GROUPS:
+            if (route_method is None or route_method == method) and path.startswith(prefix):
+                return self.rules.get(group) if group else None
+        return None
+
+    def _client_ip(self, scope, headers: Dict[bytes, bytes]) -> str:
+        if self.proxy_hops:
+            forwarded = [ip.strip() for ip in headers.get(b"x-forwarded-for", b"").decode("latin-1").split(",") if ip.strip()]
+            if len(forwarded) >= self.proxy_hops:
+                return forwarded[-self.proxy_hops]
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    def _user_id(self, headers: Dict[bytes, bytes]) -> Optional[str]:
+        authorization = headers.get(b"authorization", b"")
+        if not authorization.lower().startswith(b"bearer "):
+            return None
+        try:
+            return verifier.verify(authorization[7:].decode("latin-1")).get("uid")
+        except (JWTError, UnicodeDecodeError):
+            return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            return await self.app(scope, receive, send)
+        rule = self._rule(scope["method"], scope["path"])
+        if rule is None:
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        user_id = self._user_id(headers) if rule.per_user else None
+        key = f"{rule.group}:user:{user_id}" if user_id else f"{rule.group}:ip:{self._client_ip(scope, headers)}"
+        retry_after = await self.store.take(key, rule)
+        if not retry_after:
+            return await self.app(scope, receive, send)
+
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(_TOO_MANY_REQUESTS)).encode()),
+                (b"retry-after", str(math.ceil(retry_after)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": _TOO_MANY_REQUESTS})
@@ -0,0 +1,90 @@
+"""
+Rotating refresh tokens.
+
+Login hands out a refresh token next to the short-lived access token, and
+``/auth/refresh`` trades it for a new pair without verifying the password
+again. Each refresh token works once. Spending it issues its successor in
+the same family (the chain started by one login). Only the SHA-256 digest
+is stored, in the TTL-indexed ``refresh_tokens`` collection, so a database
+read never reveals a usable token.
+
+Presenting a token that was already rotated means that two parties hold
+the chain, e.g. a stolen copy. The whole family is revoked so that neither
+can continue it. The exception is a re-presentation within
+``REFRESH_TOKEN_REUSE_GRACE`` seconds of the rotation, as when browser tabs
+sharing one stored token refresh at the same moment; it gets a successor
+of its own.
+
+A successor is only kept if its predecessor still exists once it has been
+written, so a rotation racing a logout or family revocation can't leave a
+live token behind.
+"""
+
+from datetime import datetime, timedelta
+from typing import Tuple
+from fastapi import HTTPException, status
+from motor.motor_asyncio import AsyncIOMotorDatabase
+import hashlib
+import logging
+import os
+import secrets
+import uuid
+
+logger = logging.getLogger(__name__)
+
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.environ.get("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+REFRESH_TOKEN_REUSE_GRACE = int(os.environ.get("REFRESH_TOKEN_REUSE_GRACE", "10"))
+
+def _digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def _invalid_refresh_token() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired refresh token"
+    )
+
+async def issue_refresh_token(db: AsyncIOMotorDatabase, user_id: str, family_id: str = None) -> str:
+    token = secrets.token_urlsafe(32)
+    now = datetime.utcnow()
+    await db.refresh_tokens.insert_one({
+        "_id": _digest(token),
+        "user_id": user_id,
+        "family_id": family_id or str(uuid.uuid4()),
+        "created_at": now,
+        "expires_at": now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    })
+    return token
+
+async def rotate_refresh_token(db: AsyncIOMotorDatabase, token: str) -> Tuple[str, str]:
+    """Spend ``token``; returns the user id and the token replacing it"""
+    now = datetime.utcnow()
+    digest = _digest(token)
+    stored = await db.refresh_tokens.find_one_and_update(
+        {"_id": digest, "rotated_at": None, "expires_at": {"$gt": now}},
+        {"$set": {"rotated_at": now}}
+    )
+    if stored is None:
+        stored = await db.refresh_tokens.find_one({"_id": digest})
+        if stored is None or stored.get("rotated_at") is None or stored["expires_at"] <= now:
+            raise _invalid_refresh_token()
+        if stored["rotated_at"] <= now - timedelta(seconds=REFRESH_TOKEN_REUSE_GRACE):
+            logger.warning("Refresh token reused, revoking family %s", stored["family_id"])
+            await db.refresh_tokens.delete_many({"family_id": stored["family_id"]})
+            raise _invalid_refresh_token()
+
+    successor = await issue_refresh_token(db, stored["user_id"], stored["family_id"])
+    # The family may have been revoked while the successor was written
+    if not await db.refresh_tokens.count_documents({"_id": digest}, limit=1):
+        await db.refresh_tokens.delete_one({"_id": _digest(successor)})
+        raise _invalid_refresh_token()
+    return stored["user_id"], successor
+
+async def revoke_refresh_token(db: AsyncIOMotorDatabase, token: str):
+    """End the session ``token`` belongs to"""
+    stored = await db.refresh_tokens.find_one({"_id": _digest(token)}, {"family_id": 1})
+    if stored is not None:
+        await db.refresh_tokens.delete_many({"family_id": stored["family_id"]})
+
+async def revoke_user_refresh_tokens(db: AsyncIOMotorDatabase, user_id: str):
+    await db.refresh_tokens.delete_many({"user_id": user_id})
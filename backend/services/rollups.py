@@ -0,0 +1,198 @@
+"""
+Incrementally maintained monthly spending rollups.
+
+``transaction_rollups`` holds one document per (user, month, category) with
+credit/debit totals and counts. The transfer engine updates it with ``$inc``
+upserts next to every transaction it records, so dashboard summaries read
+O(months) documents instead of aggregating the full history.
+
+Backfill or verify from the command line (run from the backend directory):
+
+    python -m services.rollups rebuild [--user-id ID]
+    python -m services.rollups check [--user-id ID]
+"""
+
+from collections import defaultdict
+from datetime import datetime
+from typing import Iterable, List, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+import uuid
+from models.transaction import CategoryTotal, MonthlyTotal, SpendingSummary
+
+ROLLUP_FIELDS = ("credit", "debit", "credit_count", "debit_count")
+
+# Totals differing by less than this are considered consistent
+TOLERANCE = 0.005
+
+def rollup_month(date: datetime) -> str:
+    return date.strftime("%Y-%m")
+
+def _rollup_operations(transactions: Iterable[dict], sign: int) -> List[UpdateOne]:
+    # Combine transactions sharing a key so each rollup is touched once
+    increments = defaultdict(lambda: dict.fromkeys(ROLLUP_FIELDS, 0))
+    for t in transactions:
+        key = (t["user_id"], rollup_month(t["date"]), t["category"])
+        increments[key][t["type"]] += sign * t["amount"]
+        increments[key][f"{t['type']}_count"] += sign
+
+    now = datetime.utcnow()
+    return [
+        UpdateOne(
+            {"user_id": user_id, "month": month, "category": category},
+            {"$inc": inc, "$set": {"updated_at": now}},
+            upsert=True
+        ) for (user_id, month, category), inc in increments.items()
+    ]
+
+async def record(
+    db: AsyncIOMotorDatabase,
+    transactions: Iterable[dict],
+    sign: int = 1,
+    session=None
+):
+    """Fold transaction documents into their rollups (``sign=-1`` reverses them)"""
+    operations = _rollup_operations(transactions, sign)
+    if operations:
+        await db.transaction_rollups.bulk_write(operations, ordered=False, session=session)
+
+async def summary(db: AsyncIOMotorDatabase, user_id: str, from_month: str) -> SpendingSummary:
+    """Monthly and per-category totals since ``from_month`` ("YYYY-MM") from the rollups"""
+    monthly = defaultdict(lambda: {"credit": 0.0, "debit": 0.0, "count": 0})
+    categories = defaultdict(lambda: {"total": 0.0, "count": 0})
+
+    cursor = db.transaction_rollups.find(
+        {"user_id": user_id, "month": {"$gte": from_month}},
+        {"_id": 0, "month": 1, "category": 1, **dict.fromkeys(ROLLUP_FIELDS, 1)}
+    )
+    async for r in cursor:
+        month = monthly[r["month"]]
+        for type in ("credit", "debit"):
+            month[type] += r[type]
+            month["count"] += r[f"{type}_count"]
+            if r[f"{type}_count"]:
+                category = categories[(r["category"], type)]
+                category["total"] += r[type]
+                category["count"] += r[f"{type}_count"]
+
+    return SpendingSummary(
+        monthly=[
+            MonthlyTotal(month=m, net=t["credit"] - t["debit"], **t)
+            for m, t in sorted(monthly.items())
+        ],
+        categories=sorted(
+            (CategoryTotal(category=c, type=type, **t) for (c, type), t in categories.items()),
+            key=lambda c: c.total,
+            reverse=True
+        )
+    )
+
+def _aggregate_pipeline(user_id: Optional[str]) -> List[dict]:
+    match = {"user_id": user_id} if user_id else {}
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": {
+                "user_id": "$user_id",
+                "month": {"$dateToString": {"format": "%Y-%m", "date": "$date"}},
+                "category": "$category",
+            },
+            "credit": {"$sum": {"$cond": [{"$eq": ["$type", "credit"]}, "$amount", 0]}},
+            "debit": {"$sum": {"$cond": [{"$eq": ["$type", "debit"]}, "$amount", 0]}},
+            "credit_count": {"$sum": {"$cond": [{"$eq": ["$type", "credit"]}, 1, 0]}},
+            "debit_count": {"$sum": {"$cond": [{"$eq": ["$type", "debit"]}, 1, 0]}},
+        }},
+        {"$project": {
+            "_id": 0,
+            "user_id": "$_id.user_id",
+            "month": "$_id.month",
+            "category": "$_id.category",
+            **dict.fromkeys(ROLLUP_FIELDS, 1),
+            "updated_at": "$$NOW",
+        }},
+    ]
+
+async def rebuild(db: AsyncIOMotorDatabase, user_id: Optional[str] = None) -> int:
+    """Recompute rollups from the transactions collection (all users or one).
+
+    The totals are aggregated into a scratch collection first and then
+    merged over the live rollups, replacing each one in a single write, so
+    readers never see a rollup missing or zeroed mid-rebuild. Rollups no
+    longer backed by any transaction are removed last. Increments recorded
+    while the rebuild runs can be overwritten; run ``check`` afterwards.
+    """
+    scope = {"user_id": user_id} if user_id else {}
+    started = datetime.utcnow()
+    scratch = db[f"transaction_rollups_rebuild_{uuid.uuid4().hex}"]
+
+    try:
+        await db.transactions.aggregate(
+            _aggregate_pipeline(user_id) + [{"$set": {"updated_at": started}}, {"$out": scratch.name}]
+        ).to_list(None)
+        await scratch.aggregate([
+            {"$project": {"_id": 0}},
+            {"$merge": {
+                "into": "transaction_rollups",
+                "on": ["user_id", "month", "category"],
+                "whenMatched": "replace",
+                "whenNotMatched": "insert",
+            }},
+        ]).to_list(None)
+    finally:
+        await scratch.drop()
+
+    # Everything rebuilt or recorded since has a newer updated_at
+    await db.transaction_rollups.delete_many({**scope, "updated_at": {"$lt": started}})
+    return await db.transaction_rollups.count_documents(scope)
+
+async def check(db: AsyncIOMotorDatabase, user_id: Optional[str] = None) -> List[dict]:
+    """Compare stored rollups with a fresh aggregation; returns the mismatches"""
+    scope = {"user_id": user_id} if user_id else {}
+    key = lambda r: (r["user_id"], r["month"], r["category"])
+
+    expected = {key(r): r async for r in db.transactions.aggregate(_aggregate_pipeline(user_id))}
+    stored = {key(r): r async for r in db.transaction_rollups.find(scope, {"_id": 0})}
+
+    empty = dict.fromkeys(ROLLUP_FIELDS, 0)
+    mismatches = []
+    for k in expected.keys() | stored.keys():
+        want = expected.get(k, empty)
+        have = stored.get(k, empty)
+        if any(abs(want[f] - have[f]) > TOLERANCE for f in ROLLUP_FIELDS):
+            mismatches.append({
+                "user_id": k[0],
+                "month": k[1],
+                "category": k[2],
+                "expected": {f: want[f] for f in ROLLUP_FIELDS},
+                "stored": {f: have[f] for f in ROLLUP_FIELDS},
+            })
+    return mismatches
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    from pathlib import Path
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).parent.parent / '.env')
+    from database import get_database
+
+    parser = argparse.ArgumentParser(description="Maintain transaction rollups")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    parser.add_argument("--user-id")
+    args = parser.parse_args()
+
+    async def main():
+        db = await get_database()
+        if args.command == "rebuild":
+            count = await rebuild(db, args.user_id)
+            print(f"Rebuilt {count} rollups")
+        else:
+            mismatches = await check(db, args.user_id)
+            for m in mismatches:
+                print(f"{m['user_id']} {m['month']} {m['category']}: "
+                      f"expected {m['expected']}, stored {m['stored']}")
+            print(f"{len(mismatches)} inconsistent rollups")
+            raise SystemExit(1 if mismatches else 0)
+
+    asyncio.run(main())
@@ -0,0 +1,62 @@
+"""
+Projection and serialization fast path for response models.
+
+- ``projection(Model)`` asks Mongo for exactly the model's fields, so
+  ``_id``, password hashes and internal state never leave the database.
+- ``render(Model, content)`` validates the projected documents in a single
+  pydantic-core pass and encodes them straight to JSON bytes. Returning the
+  ``Response`` makes FastAPI skip its own dump, re-validate and
+  ``json.dumps`` round, so ``response_model`` is then only used for the docs.
+- ``ORJSONResponse`` is the app's default response class for everything
+  else, encoding with orjson instead of ``json.dumps``. It extends
+  FastAPI's class of the same name with a fallback encoder.
+
+Building rows with ``model_construct`` was measured and is slower than
+this. It runs in Python per row, while validating plain documents runs in
+Rust (see benchmarks/response_serialization.py).
+"""
+
+from functools import lru_cache
+from typing import Any
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse as FastAPIORJSONResponse
+from pydantic import TypeAdapter
+import orjson
+
+@lru_cache(maxsize=None)
+def projection(model: type) -> dict:
+    """Mongo projection selecting only ``model``'s fields"""
+    return {"_id": 0, **dict.fromkeys(model.model_fields, 1)}
+
+@lru_cache(maxsize=None)
+def _adapter(model: Any) -> TypeAdapter:
+    return TypeAdapter(model)
+
+def render(model: Any, content: Any, status_code: int = 200) -> Response:
+    """JSON response for ``content`` (documents or dicts) shaped as ``model``.
+
+    ``model`` may be a response model or a type such as ``List[Model]``.
+    """
+    adapter = _adapter(model)
+    body = adapter.dump_json(adapter.validate_python(content))
+    return Response(content=body, status_code=status_code, media_type="application/json")
+
+class ORJSONResponse(FastAPIORJSONResponse):
+    """FastAPI's ``ORJSONResponse`` that can also encode models and other types.
+
+    The only difference is ``default=jsonable_encoder``. FastAPI's class
+    raises on anything orjson doesn't know (pydantic models, ``Decimal``,
+    ``ObjectId``, sets), while this one hands those to ``jsonable_encoder``.
+    Route handlers can then return them directly. Everything else is the
+    same: the options are the same, ``datetime``/``date`` are written as
+    ISO 8601 like pydantic does for the response models (naive datetimes
+    stay without an offset), and numpy values are encoded natively.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=jsonable_encoder,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        )
@@ -0,0 +1,95 @@
+from datetime import datetime
+from typing import AsyncIterator, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+import csv
+import io
+import json
+import zlib
+
+# Columns of an exported statement, in output order
+STATEMENT_FIELDS = [
+    "id", "date", "type", "amount", "description", "category",
+    "recipient_name", "recipient_account", "balance_after", "status",
+]
+STATEMENT_PROJECTION = {"_id": 0, **{field: 1 for field in STATEMENT_FIELDS}}
+
+CURSOR_BATCH_SIZE = 1000
+# Rows are buffered and flushed in chunks of roughly this many bytes
+CHUNK_SIZE = 64 * 1024
+
+def statement_query(
+    user_id: str,
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None,
+    category: Optional[str] = None
+) -> dict:
+    query = {"user_id": user_id}
+    if from_date or to_date:
+        query["date"] = {}
+        if from_date:
+            query["date"]["$gte"] = from_date
+        if to_date:
+            query["date"]["$lt"] = to_date
+    if category:
+        query["category"] = category
+    return query
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+async def _ndjson_rows(cursor) -> AsyncIterator[str]:
+    async for row in cursor:
+        yield json.dumps(row, default=_json_default, separators=(",", ":")) + "\n"
+
+async def _csv_rows(cursor) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=STATEMENT_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    async for row in cursor:
+        if isinstance(row.get("date"), datetime):
+            row["date"] = row["date"].isoformat()
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Only the header was written when the statement is empty
+    if buffer.tell():
+        yield buffer.getvalue()
+
+async def stream_statement(
+    db: AsyncIOMotorDatabase,
+    query: dict,
+    format: str = "ndjson",
+    compress: bool = False
+) -> AsyncIterator[bytes]:
+    """Stream a statement straight from a Motor cursor in constant memory.
+
+    Rows are read in batches of ``CURSOR_BATCH_SIZE`` in date order, encoded
+    as NDJSON or CSV and yielded in chunks of about ``CHUNK_SIZE`` bytes,
+    gzip-compressed on the fly when ``compress`` is set.
+    """
+    cursor = db.transactions.find(query, STATEMENT_PROJECTION).sort("date", 1).batch_size(CURSOR_BATCH_SIZE)
+    rows = _csv_rows(cursor) if format == "csv" else _ndjson_rows(cursor)
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if compress else None
+
+    pending = []
+    pending_size = 0
+    async for text in rows:
+        pending.append(text)
+        pending_size += len(text)
+        if pending_size >= CHUNK_SIZE:
+            chunk = "".join(pending).encode()
+            pending, pending_size = [], 0
+            if compressor:
+                chunk = compressor.compress(chunk)
+                if not chunk:
+                    continue
+            yield chunk
+
+    chunk = "".join(pending).encode()
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
@@ -0,0 +1,111 @@
+"""
+Access-token signing and verification.
+
+- ``Keyring`` holds the signing keys by ``kid``, constructed once as jose
+  key objects so nothing is parsed per request. New tokens are signed with
+  the active key and name it in their ``kid`` header. Retired keys stay
+  verifiable until they are removed, so keys can rotate without logging
+  anyone out. Keys come from ``JWT_KEYS`` (comma separated ``kid:secret``
+  pairs) and ``JWT_ACTIVE_KID``, or default to ``SECRET_KEY`` under the kid
+  ``default``. Tokens issued before they carried a kid verify against the
+  key named by ``JWT_LEGACY_KID``.
+- ``TokenVerifier`` remembers the claims of recently verified tokens in a
+  bounded LRU keyed by the token's SHA-256 digest, each until the token
+  expires. A repeat request skips the base64/JSON parsing and the HMAC.
+  Any object with ``signing_key()`` and ``verification_key(kid)`` can
+  stand in for the keyring.
+"""
+
+from typing import Dict, Optional, Tuple
+from jose import JWTError, jwk, jwt
+from jose.backends.base import Key
+from services.cache import TTLCache
+import hashlib
+import os
+import time
+
+SECRET_KEY = os.environ.get("SECRET_KEY", "your-secret-key-here")
+ALGORITHM = "HS256"
+JWT_LEGACY_KID = os.environ.get("JWT_LEGACY_KID", "default")
+
+# Verified tokens remembered per worker, and for at most this many seconds
+JWT_VERIFY_CACHE_SIZE = int(os.environ.get("JWT_VERIFY_CACHE_SIZE", "10000"))
+JWT_VERIFY_CACHE_TTL = float(os.environ.get("JWT_VERIFY_CACHE_TTL", "900"))
+
+class Keyring:
+    def __init__(
+        self,
+        keys: Dict[str, str],
+        active_kid: str,
+        algorithm: str = ALGORITHM,
+        legacy_kid: Optional[str] = JWT_LEGACY_KID
+    ):
+        self.algorithm = algorithm
+        self.legacy_kid = legacy_kid
+        self._keys: Dict[str, Key] = {}
+        for kid, secret in keys.items():
+            self.add(kid, secret)
+        self.activate(active_kid)
+
+    @classmethod
+    def from_env(cls) -> "Keyring":
+        pairs = [pair.split(":", 1) for pair in os.environ.get("JWT_KEYS", "").split(",") if pair.strip()]
+        keys = {kid.strip(): secret.strip() for kid, secret in pairs}
+        if not keys:
+            keys = {"default": SECRET_KEY}
+        return cls(keys, os.environ.get("JWT_ACTIVE_KID", next(iter(keys))))
+
+    def add(self, kid: str, secret: str):
+        self._keys[kid] = jwk.construct(secret, self.algorithm)
+
+    def activate(self, kid: str):
+        """Sign new tokens with ``kid`` from now on"""
+        if kid not in self._keys:
+            raise KeyError(f"Unknown signing key {kid!r}")
+        self.active_kid = kid
+
+    def remove(self, kid: str):
+        """Stop accepting tokens signed with ``kid``"""
+        if kid == self.active_kid:
+            raise ValueError("Cannot remove the active signing key")
+        self._keys.pop(kid, None)
+
+    def signing_key(self) -> Tuple[str, Key]:
+        return self.active_kid, self._keys[self.active_kid]
+
+    def verification_key(self, kid: Optional[str]) -> Optional[Key]:
+        return self._keys.get(self.legacy_kid if kid is None else kid)
+
+class TokenVerifier:
+    def __init__(self, keyring, maxsize: int = JWT_VERIFY_CACHE_SIZE, ttl: float = JWT_VERIFY_CACHE_TTL):
+        self.keyring = keyring
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def sign(self, claims: dict) -> str:
+        kid, key = self.keyring.signing_key()
+        return jwt.encode(claims, key, algorithm=self.keyring.algorithm, headers={"kid": kid})
+
+    def verify(self, token: str) -> dict:
+        """Claims of a valid token; raises JWTError otherwise"""
+        digest = hashlib.sha256(token.encode()).digest()
+        cached = self.cache.get(digest)
+        # A token signed with a key removed since must not keep working
+        if cached is not None and self.keyring.verification_key(cached[0]) is not None:
+            return dict(cached[1])
+
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = self.keyring.verification_key(kid)
+        if key is None:
+            raise JWTError("Token signed with an unknown key")
+        claims = jwt.decode(token, key, algorithms=[self.keyring.algorithm])
+
+        # Tokens without exp are not cached; they are verified every time
+        ttl = claims.get("exp", 0) - time.time()
+        self.cache.set(digest, (kid, claims), ttl=ttl)
+        return dict(claims)
+
+    def stats(self) -> dict:
+        return self.cache.stats()
+
+keyring = Keyring.from_env()
+verifier = TokenVerifier(keyring)
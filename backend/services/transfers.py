@@ -0,0 +1,395 @@
+import asyncio
+import logging
+import os
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Sequence, Tuple
+import bson
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import PyMongoError
+from models.transaction import Transaction
+from services.auth import invalidate_user
+from services.ledger import apply_delta
+from services import rollups
+
+logger = logging.getLogger(__name__)
+
+# "auto" uses multi-document transactions when the deployment supports them
+# (replica set or sharded cluster), "on" forces them and "off" disables them
+TRANSFER_TRANSACTIONS = os.environ.get("TRANSFER_TRANSACTIONS", "auto").lower()
+
+# Journal entries still pending after this long were left behind by a crash
+TRANSFER_RECOVERY_AFTER = int(os.environ.get("TRANSFER_RECOVERY_AFTER", "300"))
+# How often the API sweeps for them (seconds); 0 disables the sweep
+TRANSFER_RECOVERY_INTERVAL = int(os.environ.get("TRANSFER_RECOVERY_INTERVAL", "60"))
+
+_transactions_supported: Optional[bool] = None
+
+# An update is (collection, filter, update, compensating update or None).
+# The filter must include the document's "id". The compensation must restore
+# absolute prior values (e.g. $set). It is only applied while the document
+# still holds what the update set, so an update made only of $set lets crash
+# recovery tell whether it ran, and whether later writes have built on it.
+TransferUpdate = Tuple[str, dict, dict, Optional[dict]]
+# An insert is (collection, document)
+TransferInsert = Tuple[str, dict]
+
+class TransferFailed(Exception):
+    """Raised when the writes of a money movement failed and were rolled back"""
+
+class TransferConflict(TransferFailed):
+    """Raised when a conditional update of a movement matched no document"""
+
+async def supports_transactions(db: AsyncIOMotorDatabase) -> bool:
+    global _transactions_supported
+    if TRANSFER_TRANSACTIONS in ("on", "off"):
+        return TRANSFER_TRANSACTIONS == "on"
+
+    if _transactions_supported is None:
+        try:
+            hello = await db.client.admin.command("hello")
+            _transactions_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+        except Exception:
+            _transactions_supported = False
+    return _transactions_supported
+
+async def execute_transfer(
+    db: AsyncIOMotorDatabase,
+    user_id: str,
+    delta: float,
+    transaction: dict,
+    inserts: Sequence[TransferInsert] = (),
+    updates: Sequence[TransferUpdate] = ()
+) -> Optional[Tuple[float, Transaction]]:
+    """Move money and write every document that goes with it as one unit.
+
+    ``delta`` is applied to the user's balance (negative for debits) and a
+    ``Transaction`` is built from ``transaction`` with the resulting
+    ``balance_after``. ``inserts`` and ``updates`` are the other documents
+    belonging to the movement, e.g. the EMI payment and the loan. Every
+    update must match a document; one that doesn't (e.g. because its filter
+    guards against a concurrent change) fails the movement with
+    ``TransferConflict``. The transaction is also folded into the monthly
+    spending rollups.
+
+    With transaction support everything runs inside one session. Otherwise
+    a ``pending`` entry is written to ``transfer_journal`` first, then the
+    conditional balance update (which marks the user document with the
+    entry) and then the remaining writes, concurrently. The entry ends up
+    ``completed``, or ``compensated`` when a write failed and the movement
+    was undone before ``TransferFailed`` is raised. Entries a crash left
+    ``pending`` are settled by ``recover_stale_transfers``: rolled forward
+    if every write landed, rolled back otherwise.
+
+    Returns ``(new_balance, transaction)``, or ``None`` when the balance
+    does not cover a debit.
+    """
+    result = await _execute(db, user_id, delta, [transaction], inserts, updates)
+    if result is None:
+        return None
+    new_balance, records = result
+    return new_balance, records[0]
+
+async def execute_batch_transfer(
+    db: AsyncIOMotorDatabase,
+    user_id: str,
+    transactions: List[dict],
+    inserts: Sequence[TransferInsert] = (),
+    updates: Sequence[TransferUpdate] = ()
+) -> Optional[Tuple[float, List[Transaction]]]:
+    """Like ``execute_transfer`` for many transactions settled by a single balance update.
+
+    The balance moves once by the net of all ``transactions`` and each
+    record gets the running ``balance_after`` in list order. All records are
+    written with one ``insert_many``. Returns ``(new_balance, transactions)``
+    or ``None`` when the balance does not cover the total.
+    """
+    delta = sum(_signed_amount(t) for t in transactions)
+    return await _execute(db, user_id, delta, transactions, inserts, updates)
+
+def _signed_amount(transaction: dict) -> float:
+    return transaction["amount"] if transaction["type"] == "credit" else -transaction["amount"]
+
+def _build_records(
+    user_id: str,
+    new_balance: float,
+    delta: float,
+    transactions: List[dict],
+    ids: Optional[List[str]] = None
+) -> List[Transaction]:
+    balance = new_balance - delta
+    records = []
+    for i, transaction in enumerate(transactions):
+        balance += _signed_amount(transaction)
+        if ids:
+            transaction = {**transaction, "id": ids[i]}
+        records.append(Transaction(user_id=user_id, balance_after=balance, **transaction))
+    # Guard against float drift so the last record matches the stored balance
+    records[-1].balance_after = new_balance
+    return records
+
+async def _execute(db, user_id, delta, transactions, inserts, updates):
+    if await supports_transactions(db):
+        result = await _execute_in_session(db, user_id, delta, transactions, inserts, updates)
+        invalidate_user(user_id)
+        return result
+    return await _execute_with_compensation(db, user_id, delta, transactions, inserts, updates)
+
+def _check_matched(collection: str, result):
+    if result.matched_count == 0:
+        raise TransferConflict(f"{collection} update matched no document")
+    return result
+
+async def _update_one(db, collection, query, update):
+    return _check_matched(collection, await db[collection].update_one(query, update))
+
+def _group_inserts(inserts: Iterable[TransferInsert]) -> dict:
+    grouped = defaultdict(list)
+    for collection, document in inserts:
+        grouped[collection].append(document)
+    return grouped
+
+async def _execute_in_session(db, user_id, delta, transactions, inserts, updates):
+    async def apply(session):
+        new_balance = await apply_delta(db, user_id, delta, session=session)
+        if new_balance is None:
+            return None
+
+        records = _build_records(user_id, new_balance, delta, transactions)
+        grouped = _group_inserts([*inserts, *(("transactions", r.dict()) for r in records)])
+        for collection, documents in grouped.items():
+            await db[collection].insert_many(documents, session=session)
+        for collection, query, update, _ in updates:
+            _check_matched(collection, await db[collection].update_one(query, update, session=session))
+        await rollups.record(db, grouped["transactions"], session=session)
+        return new_balance, records
+
+    try:
+        async with await db.client.start_session() as session:
+            # with_transaction retries transient errors and unknown commit results
+            return await session.with_transaction(apply)
+    except PyMongoError as e:
+        raise TransferFailed(str(e)) from e
+
+def _identity(query: dict) -> dict:
+    return {"id": query["id"]} if "id" in query else query
+
+def _applied(query: dict, update: dict) -> Optional[dict]:
+    """Filter matching the document only while it holds what ``update`` set"""
+    if set(update) != {"$set"}:
+        return None
+    return {**_identity(query), **update["$set"]}
+
+async def _update_state(db, spec: dict) -> str:
+    """Whether a journalled update was ``applied``, ``not_applied``, ``moved_on`` or is ``unknown``"""
+    collection = db[spec["collection"]]
+    applied = _applied(spec["query"], spec["update"])
+    if applied is None:
+        return "unknown"
+    if await collection.count_documents(applied, limit=1):
+        return "applied"
+    if await collection.count_documents(spec["query"], limit=1):
+        return "not_applied"
+    # Applied, then changed again by a later write
+    return "moved_on"
+
+def _journal_entry(user_id, delta, transaction_ids, inserts, updates) -> dict:
+    """Pending journal entry describing everything needed to undo a movement"""
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "delta": delta,
+        "transaction_ids": transaction_ids,
+        # The other documents the movement writes, to find and remove or restore them
+        "inserted": [{"collection": collection, "id": document["id"]} for collection, document in inserts],
+        "updated": [
+            {
+                "collection": collection,
+                "id": query.get("id"),
+                # Stored BSON-encoded, since updates have $-prefixed keys
+                "spec": bson.encode({
+                    "collection": collection,
+                    "query": query,
+                    "update": update,
+                    "compensation": compensation,
+                }),
+            }
+            for collection, query, update, compensation in updates
+        ],
+        "status": "pending",
+        "created_at": datetime.utcnow(),
+    }
+
+async def _execute_with_compensation(db, user_id, delta, transactions, inserts, updates):
+    transaction_ids = [t.get("id") or str(uuid.uuid4()) for t in transactions]
+    journal = _journal_entry(user_id, delta, transaction_ids, inserts, updates)
+    await db.transfer_journal.insert_one(journal)
+
+    new_balance = await apply_delta(db, user_id, delta, transfer_id=journal["id"])
+    if new_balance is None:
+        # Nothing moved
+        await db.transfer_journal.delete_one({"id": journal["id"]})
+        return None
+
+    records = _build_records(user_id, new_balance, delta, transactions, transaction_ids)
+    grouped = _group_inserts([*inserts, *(("transactions", r.dict()) for r in records)])
+
+    operations = [db[collection].insert_many(documents) for collection, documents in grouped.items()]
+    operations += [_update_one(db, collection, query, update) for collection, query, update, _ in updates]
+    operations.append(rollups.record(db, grouped["transactions"]))
+    results = await asyncio.gather(*operations, return_exceptions=True)
+
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if errors:
+        await _compensate(db, journal, grouped, updates, results[len(grouped):], errors[0])
+        if isinstance(errors[0], TransferFailed):
+            raise errors[0]
+        raise TransferFailed(str(errors[0])) from errors[0]
+
+    await asyncio.gather(
+        db.transfer_journal.update_one(
+            {"id": journal["id"]},
+            {"$set": {"status": "completed", "completed_at": datetime.utcnow()}}
+        ),
+        db.users.update_one({"id": user_id}, {"$pull": {"pending_transfers": journal["id"]}}),
+    )
+    return new_balance, records
+
+async def _undo_balance(db, journal: dict):
+    """Reverse the journalled balance movement, at most once"""
+    restored = await apply_delta(db, journal["user_id"], -journal["delta"], transfer_id=journal["id"], settles=True)
+    if restored is None and await db.users.count_documents(
+        {"id": journal["user_id"], "pending_transfers": journal["id"]}, limit=1
+    ):
+        raise TransferFailed("balance could not be restored")
+
+async def _finish_journal(db, journal: dict, error: Optional[BaseException], status: str = "compensated", **fields):
+    update = {"status": status, "finished_at": datetime.utcnow(), **fields}
+    if error is not None:
+        update["error"] = str(error)
+    await db.transfer_journal.update_one({"id": journal["id"]}, {"$set": update})
+
+async def _compensate(db, journal, grouped, updates, update_results, error):
+    """Undo the parts of a failed movement that did get applied"""
+    try:
+        undo = [_undo_balance(db, journal)]
+        for collection, documents in grouped.items():
+            undo.append(db[collection].delete_many({"id": {"$in": [d["id"] for d in documents]}}))
+        for (collection, query, update, compensation), result in zip(updates, update_results):
+            if compensation is not None and not isinstance(result, BaseException):
+                undo.append(db[collection].update_one(_applied(query, update) or _identity(query), compensation))
+        if not isinstance(update_results[-1], BaseException):
+            undo.append(rollups.record(db, grouped["transactions"], sign=-1))
+        await asyncio.gather(*undo)
+    except Exception as e:
+        logger.exception("Compensation failed for transactions %s", journal["transaction_ids"])
+        await _finish_journal(db, journal, error, "compensation_failed", compensation_error=str(e))
+        return
+    await _finish_journal(db, journal, error)
+
+async def _recover(db: AsyncIOMotorDatabase, journal: dict) -> str:
+    """Settle a movement that a crash left half done; returns the entry's new status.
+
+    When every write landed it is rolled forward (only the journal update
+    and the balance mark were lost). Otherwise it is rolled back, unless a
+    later write already built on one of its updates (e.g. the next EMI was
+    paid on the advanced loan) or an update can't be checked; those are
+    left ``compensation_failed`` for manual review.
+    """
+    records = await db.transactions.find({"id": {"$in": journal["transaction_ids"]}}, {"_id": 0}).to_list(None)
+    moved = await db.users.count_documents({"id": journal["user_id"], "pending_transfers": journal["id"]}, limit=1)
+    if not moved:
+        # Either the balance never moved, or the movement completed and only
+        # the journal update was lost
+        status = "completed" if records else "abandoned"
+        await _finish_journal(db, journal, None, status)
+        return status
+
+    specs = [bson.decode(document["spec"]) for document in journal["updated"]]
+    try:
+        states = [await _update_state(db, spec) for spec in specs]
+        inserted = [
+            await db[document["collection"]].count_documents({"id": document["id"]}, limit=1)
+            for document in journal["inserted"]
+        ]
+        if len(records) == len(journal["transaction_ids"]) and all(inserted) and all(
+            state in ("applied", "moved_on") for state in states
+        ):
+            await db.users.update_one(
+                {"id": journal["user_id"]},
+                {"$pull": {"pending_transfers": journal["id"]}}
+            )
+            await _finish_journal(db, journal, None, "completed", recovered=True)
+            return "completed"
+        if "moved_on" in states or "unknown" in states:
+            raise TransferFailed(f"updates can't be rolled back safely: {states}")
+
+        # Delete before reversing the rollups, so a second recovery can't reverse them twice
+        await db.transactions.delete_many({"id": {"$in": journal["transaction_ids"]}})
+        for document in journal["inserted"]:
+            await db[document["collection"]].delete_one({"id": document["id"]})
+        for spec, state in zip(specs, states):
+            if state == "applied" and spec["compensation"] is not None:
+                await db[spec["collection"]].update_one(_applied(spec["query"], spec["update"]), spec["compensation"])
+        await rollups.record(db, records, sign=-1)
+        await _undo_balance(db, journal)
+    except Exception as e:
+        logger.exception("Recovery of transfer %s failed", journal["id"])
+        await _finish_journal(db, journal, None, "compensation_failed", compensation_error=str(e))
+        return "compensation_failed"
+    await _finish_journal(db, journal, None, "compensated", recovered=True)
+    return "compensated"
+
+async def recover_stale_transfers(db: AsyncIOMotorDatabase, older_than: int = TRANSFER_RECOVERY_AFTER) -> dict:
+    """Settle every movement left ``pending`` for longer than ``older_than`` seconds.
+
+    Each entry is first claimed as ``recovering``, so concurrent sweeps
+    don't handle the same one; a sweep that died mid-way is picked up again
+    once its claim is as old.
+    """
+    counts = defaultdict(int)
+    while True:
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=older_than)
+        journal = await db.transfer_journal.find_one_and_update(
+            {"$or": [
+                {"status": "pending", "created_at": {"$lt": cutoff}},
+                {"status": "recovering", "recovering_since": {"$lt": cutoff}},
+            ]},
+            {"$set": {"status": "recovering", "recovering_since": now}},
+            projection={"_id": 0}
+        )
+        if journal is None:
+            break
+        counts[await _recover(db, journal)] += 1
+
+    if counts:
+        logger.warning("Recovered stale transfers: %s", dict(counts))
+    return dict(counts)
+
+async def recovery_loop(db: AsyncIOMotorDatabase, interval: int = TRANSFER_RECOVERY_INTERVAL):
+    """Sweep for stale transfers every ``interval`` seconds until cancelled"""
+    while True:
+        try:
+            await recover_stale_transfers(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Transfer recovery sweep failed")
+        await asyncio.sleep(interval)
+
+if __name__ == "__main__":
+    from pathlib import Path
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).parent.parent / '.env')
+    from database import get_database
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    async def main():
+        db = await get_database()
+        print(await recover_stale_transfers(db))
+
+    asyncio.run(main())
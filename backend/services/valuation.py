@@ -0,0 +1,109 @@
+"""
+Revaluation of investment holdings from market prices.
+
+Holdings are valued as ``units * price``. One price tick becomes one
+pipeline ``UpdateMany`` per instrument name, which recomputes
+``current_value``, ``returns`` and ``returns_percent`` inside the database
+for every active holding of that instrument. The updates go out in
+``bulk_write`` batches, so thousands of holdings take a few round trips.
+Holdings without units (e.g. fixed deposits) are not marked to market.
+
+Revalue once from the command line (run from the backend directory):
+
+    python -m services.valuation [--csv PATH]
+"""
+
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateMany
+from services.prices import PriceFeed, Quote, price_feed
+
+logger = logging.getLogger(__name__)
+
+# Instruments updated per bulk_write round trip
+REVALUATION_BATCH_SIZE = int(os.environ.get("REVALUATION_BATCH_SIZE", "500"))
+
+def valuation(amount: float, units: Optional[float], price: Optional[float]) -> dict:
+    """current_value/returns/returns_percent of one holding; at cost when unpriced"""
+    current_value = round(units * price, 2) if units and price else amount
+    returns = current_value - amount
+    return {
+        "current_value": current_value,
+        "returns": returns,
+        "returns_percent": returns / amount * 100 if amount > 0 else 0,
+    }
+
+def revaluation_update(quote: Quote) -> UpdateMany:
+    """The pipeline equivalent of ``valuation`` for every holding of one instrument"""
+    return UpdateMany(
+        {"name": quote.name, "status": "active", "units": {"$gt": 0}},
+        [
+            {"$set": {
+                "current_value": {"$round": [{"$multiply": ["$units", quote.price]}, 2]},
+                "price": quote.price,
+                "priced_at": quote.as_of,
+                "updated_at": "$$NOW",
+            }},
+            {"$set": {"returns": {"$subtract": ["$current_value", "$amount"]}}},
+            {"$set": {"returns_percent": {"$cond": [
+                {"$gt": ["$amount", 0]},
+                {"$multiply": [{"$divide": ["$returns", "$amount"]}, 100]},
+                0,
+            ]}}},
+        ]
+    )
+
+async def revalue(
+    db: AsyncIOMotorDatabase,
+    quotes: Dict[str, Quote],
+    batch_size: int = REVALUATION_BATCH_SIZE
+) -> dict:
+    """Apply ``quotes`` to all active holdings; returns counts and timing"""
+    started = time.perf_counter()
+    operations: List[UpdateMany] = [revaluation_update(q) for q in quotes.values()]
+    matched = modified = round_trips = 0
+
+    for i in range(0, len(operations), batch_size):
+        result = await db.investments.bulk_write(operations[i:i + batch_size], ordered=False)
+        matched += result.matched_count
+        modified += result.modified_count
+        round_trips += 1
+
+    report = {
+        "instruments": len(operations),
+        "holdings_matched": matched,
+        "holdings_modified": modified,
+        "round_trips": round_trips,
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+    }
+    logger.info("Revaluation finished: %s", report)
+    return report
+
+async def revalue_from_feed(db: AsyncIOMotorDatabase, feed: PriceFeed = price_feed) -> dict:
+    return await revalue(db, await feed.quotes())
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    from pathlib import Path
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).parent.parent / '.env')
+    from database import get_database
+    from services.prices import CSVPriceFeed
+
+    parser = argparse.ArgumentParser(description="Revalue investments from market prices")
+    parser.add_argument("--csv", help="price file to use instead of PRICE_FEED_CSV")
+    args = parser.parse_args()
+
+    async def main():
+        db = await get_database()
+        feed = CSVPriceFeed(args.csv) if args.csv else price_feed
+        report = await revalue_from_feed(db, feed)
+        for key, value in report.items():
+            print(f"{key}: {value}")
+
+    asyncio.run(main())
@@ -9,6 +9,9 @@ import json
 import os
 from datetime import datetime, date, timedelta
 import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 # Get backend URL from environment
 BACKEND_URL = "https://513cbdc5-0ed4-4463-90ec-cb1a23d861e2.preview.emergentagent.com/api"
@@ -19,6 +22,12 @@ TEST_USER = {
     "password": "password123"
 }
 
+# Attempts at a rate-limited request before giving up
+RATE_LIMIT_RETRIES = 10
+
+# Seconds a rotated refresh token may be presented again (the server's REFRESH_TOKEN_REUSE_GRACE)
+REFRESH_REUSE_GRACE = 10
+
 # Global variables for test state
 auth_token = None
 user_data = None
@@ -57,31 +66,42 @@ class TestResult:
 
 result = TestResult()
 
-def make_request(method, endpoint, data=None, headers=None, params=None):
-    """Make HTTP request with error handling"""
+def make_request(method, endpoint, data=None, headers=None, params=None, retry_rate_limited=True):
+    """Make HTTP request with error handling.
+
+    A 429 from the rate limiter is retried after its Retry-After, so the
+    tests that burst through a bucket don't fail the ones after them.
+    """
     url = f"{BACKEND_URL}{endpoint}"
     
     default_headers = {"Content-Type": "application/json"}
     if headers:
         default_headers.update(headers)
     
-    try:
+    def send():
         if method.upper() == "GET":
-            response = requests.get(url, headers=default_headers, params=params, timeout=10)
+            return requests.get(url, headers=default_headers, params=params, timeout=10)
         elif method.upper() == "POST":
             if params:
                 # For POST with query parameters
-                response = requests.post(url, headers=default_headers, params=params, timeout=10)
+                return requests.post(url, headers=default_headers, params=params, timeout=10)
             else:
                 # For POST with JSON body
-                response = requests.post(url, headers=default_headers, json=data, timeout=10)
+                return requests.post(url, headers=default_headers, json=data, timeout=10)
         elif method.upper() == "PUT":
-            response = requests.put(url, headers=default_headers, json=data, timeout=10)
+            return requests.put(url, headers=default_headers, json=data, timeout=10)
         elif method.upper() == "DELETE":
-            response = requests.delete(url, headers=default_headers, timeout=10)
+            return requests.delete(url, headers=default_headers, timeout=10)
         else:
             raise ValueError(f"Unsupported HTTP method: {method}")
-        
+    
+    try:
+        response = send()
+        for _ in range(RATE_LIMIT_RETRIES if retry_rate_limited else 0):
+            if response.status_code != 429:
+                break
+            time.sleep(int(response.headers.get("Retry-After", "1")))
+            response = send()
         return response
     except requests.exceptions.RequestException as e:
         raise Exception(f"Request failed: {str(e)}")
@@ -155,6 +175,93 @@ def test_user_login():
     except Exception as e:
         result.add_fail("User Login", str(e))
 
+def test_refresh_token():
+    """Test refresh-token rotation"""
+    try:
+        response = make_request("POST", "/auth/login", TEST_USER)
+        refresh_token = response.json().get("refresh_token") if response.status_code == 200 else None
+        if not refresh_token:
+            result.add_fail("Refresh Token Issued", f"Status code: {response.status_code}")
+            return
+        result.add_pass("Refresh Token Issued")
+
+        response = make_request("POST", "/auth/refresh", {"refresh_token": refresh_token})
+        if response.status_code != 200:
+            result.add_fail("Refresh Access Token", f"Status code: {response.status_code}")
+            return
+        data = response.json()
+        headers = {"Authorization": f"Bearer {data['access_token']}"}
+        if make_request("GET", "/auth/me", headers=headers).status_code == 200 and data["refresh_token"] != refresh_token:
+            result.add_pass("Refresh Access Token")
+        else:
+            result.add_fail("Refresh Access Token", "Refreshed token rejected or refresh token not rotated")
+
+        # Tabs sharing a stored token may present it again right away
+        response = make_request("POST", "/auth/refresh", {"refresh_token": refresh_token})
+        if response.status_code == 200 and response.json()["refresh_token"] != data["refresh_token"]:
+            result.add_pass("Concurrent Refresh Within Grace")
+        else:
+            result.add_fail("Concurrent Refresh Within Grace", f"Status code: {response.status_code}")
+
+        # After the grace window a rotated refresh token must not work again
+        time.sleep(REFRESH_REUSE_GRACE + 1)
+        response = make_request("POST", "/auth/refresh", {"refresh_token": refresh_token})
+        if response.status_code == 401:
+            result.add_pass("Refresh Token Reuse Rejected")
+        else:
+            result.add_fail("Refresh Token Reuse Rejected", f"Expected 401, got {response.status_code}")
+
+        # Reuse revokes the whole family, successors included
+        response = make_request("POST", "/auth/refresh", {"refresh_token": data["refresh_token"]})
+        if response.status_code == 401:
+            result.add_pass("Refresh Family Revoked On Reuse")
+        else:
+            result.add_fail("Refresh Family Revoked On Reuse", f"Expected 401, got {response.status_code}")
+
+    except Exception as e:
+        result.add_fail("Refresh Token", str(e))
+
+def test_otp():
+    """Test OTP issue and rejection of a wrong code"""
+    try:
+        email = f"otp-{uuid.uuid4().hex[:8]}@example.com"
+        response = make_request("POST", "/auth/request-otp", {"email": email})
+        if response.status_code == 200:
+            result.add_pass("Request OTP")
+        else:
+            result.add_fail("Request OTP", f"Status code: {response.status_code}")
+            return
+
+        # The code itself is only delivered out of band
+        response = make_request("POST", "/auth/verify-otp", {"email": email, "otp": "abcdef"})
+        if response.status_code == 400:
+            result.add_pass("Wrong OTP Rejected")
+        else:
+            result.add_fail("Wrong OTP Rejected", f"Expected 400, got {response.status_code}")
+
+        response = make_request("POST", "/auth/request-otp", {"email": email, "purpose": "anything"})
+        if response.status_code == 422:
+            result.add_pass("Unknown OTP Purpose Rejected")
+        else:
+            result.add_fail("Unknown OTP Purpose Rejected", f"Expected 422, got {response.status_code}")
+
+        # Signup needs the proof returned by a successful verification
+        signup = {"name": "OTP Check", "email": email, "phone": "9999999999", "password": "password123"}
+        response = make_request("POST", "/auth/signup", signup)
+        if response.status_code == 422:
+            result.add_pass("Signup Without OTP Rejected")
+        else:
+            result.add_fail("Signup Without OTP Rejected", f"Expected 422, got {response.status_code}")
+
+        response = make_request("POST", "/auth/signup", {**signup, "verification_token": "forged"})
+        if response.status_code == 400:
+            result.add_pass("Signup With Forged Proof Rejected")
+        else:
+            result.add_fail("Signup With Forged Proof Rejected", f"Expected 400, got {response.status_code}")
+
+    except Exception as e:
+        result.add_fail("OTP", str(e))
+
 def test_user_profile():
     """Test user profile endpoints"""
     try:
@@ -170,6 +277,20 @@ def test_user_profile():
         else:
             result.add_fail("Get User Profile", f"Status code: {response.status_code}")
         
+        # A profile update must not be hidden by the cached principal
+        original_name = response.json().get("name") if response.status_code == 200 else None
+        new_name = f"Cache Check {uuid.uuid4().hex[:6]}"
+        response = make_request("PUT", "/user/profile", {"name": new_name}, headers=get_auth_headers())
+        if response.status_code == 200:
+            response = make_request("GET", "/user/profile", headers=get_auth_headers())
+            if response.status_code == 200 and response.json().get("name") == new_name:
+                result.add_pass("Profile Update Refreshes Cache")
+            else:
+                result.add_fail("Profile Update Refreshes Cache", "Stale profile after update")
+            make_request("PUT", "/user/profile", {"name": original_name}, headers=get_auth_headers())
+        else:
+            result.add_fail("Profile Update Refreshes Cache", f"Status code: {response.status_code}")
+        
         # Test get balance
         response = make_request("GET", "/user/balance", headers=get_auth_headers())
         
@@ -192,8 +313,9 @@ def test_transaction_history():
         response = make_request("GET", "/transactions/history", headers=get_auth_headers())
         
         if response.status_code == 200:
-            transactions = response.json()
-            if isinstance(transactions, list):
+            page = response.json()
+            transactions = page.get("transactions")
+            if isinstance(transactions, list) and "next_cursor" in page:
                 result.add_pass("Get Transaction History")
                 
                 # Check transaction structure if any exist
@@ -208,10 +330,28 @@ def test_transaction_history():
                 else:
                     result.add_pass("Transaction Structure (No transactions)")
             else:
-                result.add_fail("Get Transaction History", "Response is not a list")
+                result.add_fail("Get Transaction History", "Response is not a page of transactions")
         else:
             result.add_fail("Get Transaction History", f"Status code: {response.status_code}")
         
+        # Test walking the history page by page with the cursor
+        response = make_request("GET", "/transactions/history",
+                              headers=get_auth_headers(), params={"limit": 2})
+        if response.status_code == 200 and response.json()["next_cursor"]:
+            first_page = response.json()
+            response = make_request("GET", "/transactions/history", headers=get_auth_headers(),
+                                  params={"limit": 2, "cursor": first_page["next_cursor"]})
+            first_ids = {t["id"] for t in first_page["transactions"]}
+            second_ids = {t["id"] for t in response.json()["transactions"]}
+            if response.status_code == 200 and second_ids and not first_ids & second_ids:
+                result.add_pass("Transaction History Cursor Pagination")
+            else:
+                result.add_fail("Transaction History Cursor Pagination", "Second page overlaps or is empty")
+        elif response.status_code == 200:
+            result.add_pass("Transaction History Cursor Pagination (Single page)")
+        else:
+            result.add_fail("Transaction History Cursor Pagination", f"Status code: {response.status_code}")
+        
         # Test get recent transactions
         response = make_request("GET", "/transactions/recent", headers=get_auth_headers())
         
@@ -227,6 +367,46 @@ def test_transaction_history():
     except Exception as e:
         result.add_fail("Transaction History", str(e))
 
+def test_statement_export():
+    """Test streaming statement export"""
+    try:
+        response = make_request("GET", "/transactions/statement", headers=get_auth_headers())
+        if response.status_code == 200:
+            rows = [json.loads(line) for line in response.text.splitlines() if line]
+            if all("id" in row and "balance_after" in row for row in rows):
+                result.add_pass("Statement Export (NDJSON)")
+            else:
+                result.add_fail("Statement Export (NDJSON)", "Rows missing id or balance_after")
+        else:
+            result.add_fail("Statement Export (NDJSON)", f"Status code: {response.status_code}")
+        
+        response = make_request("GET", "/transactions/statement", headers=get_auth_headers(),
+                              params={"format": "csv", "gzip": "true"})
+        if response.status_code == 200 and response.text.startswith("id,date,type,amount"):
+            result.add_pass("Statement Export (Gzipped CSV)")
+        else:
+            result.add_fail("Statement Export (Gzipped CSV)", f"Status code: {response.status_code}")
+            
+    except Exception as e:
+        result.add_fail("Statement Export", str(e))
+
+def test_spending_analytics():
+    """Test server-side spending analytics"""
+    try:
+        response = make_request("GET", "/transactions/analytics", headers=get_auth_headers())
+        if response.status_code == 200:
+            analytics = response.json()
+            missing_fields = [f for f in ["monthly", "categories", "balances"] if f not in analytics]
+            if missing_fields:
+                result.add_fail("Spending Analytics", f"Missing fields: {missing_fields}")
+            else:
+                result.add_pass("Spending Analytics")
+        else:
+            result.add_fail("Spending Analytics", f"Status code: {response.status_code}")
+            
+    except Exception as e:
+        result.add_fail("Spending Analytics", str(e))
+
 def test_send_money():
     """Test send money functionality"""
     try:
@@ -278,10 +458,76 @@ def test_send_money():
         else:
             result.add_fail("Send Money Insufficient Balance Check", 
                           f"Expected 400, got {response.status_code}")
+        
+        # Zero and negative amounts are rejected, not turned into debits
+        for amount in (0, -100.0):
+            response = make_request("POST", "/transactions/send-money", {**send_data, "amount": amount},
+                                    headers=get_auth_headers())
+            if response.status_code == 422:
+                result.add_pass(f"Send Money Rejects Amount {amount}")
+            else:
+                result.add_fail(f"Send Money Rejects Amount {amount}", f"Expected 422, got {response.status_code}")
             
     except Exception as e:
         result.add_fail("Send Money", str(e))
 
+def test_idempotent_send_money():
+    """Test a retried send-money with the same Idempotency-Key only debits once"""
+    try:
+        send_data = {
+            "recipient_name": "Jane Smith",
+            "recipient_account": "ACC1234567890",
+            "amount": 1.0,
+            "description": "Idempotent transfer",
+            "pin": "1234"
+        }
+        headers = {**get_auth_headers(), "Idempotency-Key": str(uuid.uuid4())}
+        
+        first = make_request("POST", "/transactions/send-money", send_data, headers=headers)
+        retry = make_request("POST", "/transactions/send-money", send_data, headers=headers)
+        
+        if first.status_code != 200 or retry.status_code != 200:
+            result.add_fail("Idempotent Send Money", f"Status codes: {first.status_code}, {retry.status_code}")
+        elif first.json() == retry.json() and retry.headers.get("Idempotent-Replayed") == "true":
+            result.add_pass("Idempotent Send Money")
+        else:
+            result.add_fail("Idempotent Send Money", "Retry was executed again instead of replayed")
+        
+        # The same key with a different body is rejected
+        response = make_request("POST", "/transactions/send-money", {**send_data, "amount": 2.0}, headers=headers)
+        if response.status_code == 422:
+            result.add_pass("Idempotency Key Reuse Check")
+        else:
+            result.add_fail("Idempotency Key Reuse Check", f"Expected 422, got {response.status_code}")
+            
+    except Exception as e:
+        result.add_fail("Idempotent Send Money", str(e))
+
+def test_batch_send_money():
+    """Test batch payments with one valid and one invalid item"""
+    try:
+        batch_data = {"items": [
+            {"recipient_name": "Payroll One", "recipient_account": "ACC1000000001",
+             "amount": 10.0, "description": "Batch payout", "pin": "1234"},
+            {"recipient_name": "Payroll Two", "recipient_account": "ACC1000000002",
+             "amount": 10.0, "description": "Batch payout", "pin": "12"},
+        ]}
+        
+        response = make_request("POST", "/transactions/batch-send", batch_data, headers=get_auth_headers())
+        
+        if response.status_code == 200:
+            batch_result = response.json()
+            statuses = [item["status"] for item in batch_result.get("results", [])]
+            if statuses == ["completed", "rejected"] and batch_result["total_debited"] == 10.0:
+                result.add_pass("Batch Send Money")
+            else:
+                result.add_fail("Batch Send Money", f"Unexpected per-item results: {statuses}")
+        else:
+            result.add_fail("Batch Send Money", f"Status code: {response.status_code}")
+            
+    except Exception as e:
+        result.add_fail("Batch Send Money", str(e))
+
 def test_request_money():
     """Test request money functionality"""
     try:
@@ -345,10 +591,64 @@ def test_qr_payment():
                 result.add_fail("QR Payment", "Missing transaction_id or new_balance")
         else:
             result.add_fail("QR Payment", f"Status code: {response.status_code}")
+        
+        for amount in (0, -25.0):
+            response = make_request("POST", "/transactions/qr-payment",
+                                  params={**qr_data, "amount": amount}, headers=get_auth_headers())
+            if response.status_code == 422:
+                result.add_pass(f"QR Payment Rejects Amount {amount}")
+            else:
+                result.add_fail(f"QR Payment Rejects Amount {amount}", f"Expected 422, got {response.status_code}")
             
     except Exception as e:
         result.add_fail("QR Payment", str(e))
 
+def test_concurrent_debits(count=200, amount=1.0):
+    """Fire many parallel debits at one account and check no update is lost"""
+    try:
+        balance_response = make_request("GET", "/user/balance", headers=get_auth_headers())
+        if balance_response.status_code != 200:
+            result.add_fail("Concurrent Debits - Get Balance", "Could not get current balance")
+            return
+        
+        start_balance = balance_response.json()["balance"]
+        headers = get_auth_headers()
+        
+        def debit_once(_):
+            return make_request("POST", "/user/update-balance",
+                                params={"amount": -amount}, headers=headers, retry_rate_limited=False)
+        
+        with ThreadPoolExecutor(max_workers=50) as pool:
+            responses = list(pool.map(debit_once, range(count)))
+        
+        succeeded = sum(1 for r in responses if r.status_code == 200)
+        # update-balance is in the transfers rate-limit group, so a burst
+        # this size is partly turned away before it reaches the balance
+        limited = [r for r in responses if r.status_code == 429]
+        
+        balance_response = make_request("GET", "/user/balance", headers=get_auth_headers())
+        final_balance = balance_response.json()["balance"]
+        expected_balance = start_balance - succeeded * amount
+        
+        if succeeded and succeeded + len(limited) == count and abs(final_balance - expected_balance) < 0.01:
+            result.add_pass(f"Concurrent Debits ({count} parallel, {len(limited)} rate limited)")
+        else:
+            result.add_fail("Concurrent Debits",
+                          f"{succeeded}/{count} succeeded, {len(limited)} rate limited, "
+                          f"expected balance: {expected_balance}, got: {final_balance}")
+        
+        if all(r.headers.get("Retry-After", "").isdigit() for r in limited):
+            result.add_pass("Rate Limited Debits Carry Retry-After")
+        else:
+            result.add_fail("Rate Limited Debits Carry Retry-After", "429 without a Retry-After header")
+        
+        # Restore the balance for the remaining tests
+        make_request("POST", "/user/update-balance",
+                     params={"amount": succeeded * amount}, headers=get_auth_headers())
+            
+    except Exception as e:
+        result.add_fail("Concurrent Debits", str(e))
+
 def test_loans():
     """Test loan management functionality"""
     try:
@@ -356,7 +656,7 @@ def test_loans():
         response = make_request("GET", "/loans/", headers=get_auth_headers())
         
         if response.status_code == 200:
-            loans = response.json()
+            loans = response.json().get("loans")
             if isinstance(loans, list):
                 result.add_pass("Get User Loans")
                 
@@ -375,10 +675,30 @@ def test_loans():
                 else:
                     result.add_pass("Loan Structure (No loans)")
             else:
-                result.add_fail("Get User Loans", "Response is not a list")
+                result.add_fail("Get User Loans", "Response has no loans list")
         else:
             result.add_fail("Get User Loans", f"Status code: {response.status_code}")
         
+        # Test closed loans are listed separately
+        response = make_request("GET", "/loans/", headers=get_auth_headers(), params={"status": "closed"})
+        
+        if response.status_code == 200 and all(l["status"] == "closed" for l in response.json()["loans"]):
+            result.add_pass("Closed Loans Filter")
+        else:
+            result.add_fail("Closed Loans Filter", f"Status code: {response.status_code}")
+        
+        # Test loans due within the next month
+        response = make_request("GET", "/loans/due", headers=get_auth_headers(), params={"days": 31})
+        
+        if response.status_code == 200 and isinstance(response.json(), list):
+            due_dates = [loan["next_due_date"] for loan in response.json()]
+            if due_dates == sorted(due_dates):
+                result.add_pass("Loans Due")
+            else:
+                result.add_fail("Loans Due", "Loans are not ordered by due date")
+        else:
+            result.add_fail("Loans Due", f"Status code: {response.status_code}")
+        
         # Test loan application
         loan_app_data = {
             "loan_type": "Personal Loan",
@@ -413,6 +733,30 @@ def test_loans():
                 result.add_pass("Loan Calculator")
         else:
             result.add_fail("Loan Calculator", f"Status code: {response.status_code}")
+        
+        # Out-of-range inputs are rejected instead of producing inf/nan
+        for params in (
+            {"loan_amount": 100000, "interest_rate": 10.5, "tenure_months": 0},
+            {"loan_amount": 100000, "interest_rate": -1, "tenure_months": 24},
+            {"loan_amount": -5, "interest_rate": 10.5, "tenure_months": 24},
+        ):
+            response = make_request("GET", "/loans/calculator", params=params)
+            if response.status_code == 422:
+                result.add_pass(f"Loan Calculator Rejects {params}")
+            else:
+                result.add_fail(f"Loan Calculator Rejects {params}", f"Expected 422, got {response.status_code}")
+        
+        # The batch calculator applies the same bounds to every grid value
+        for grid in (
+            {"loan_amounts": [100000], "interest_rates": [10.5], "tenure_months": [24, 0]},
+            {"loan_amounts": [100000], "interest_rates": [10.5, -1], "tenure_months": [24]},
+            {"loan_amounts": [100000, -5], "interest_rates": [10.5], "tenure_months": [24]},
+        ):
+            response = make_request("POST", "/loans/calculator/batch", grid)
+            if response.status_code == 422:
+                result.add_pass(f"Loan Calculator Batch Rejects {grid}")
+            else:
+                result.add_fail(f"Loan Calculator Batch Rejects {grid}", f"Expected 422, got {response.status_code}")
             
     except Exception as e:
         result.add_fail("Loans", str(e))
@@ -441,6 +785,13 @@ def test_emi_payment(loan_id):
                     result.add_pass("EMI Payment Balance Update")
                 else:
                     result.add_fail("EMI Payment Balance Update", "Balance not deducted")
+                
+                # Verify the installment was split into principal and interest
+                split = round(emi_result.get("principal", 0) + emi_result.get("interest", 0), 2)
+                if "principal" in emi_result and split == emi_result.get("amount_paid"):
+                    result.add_pass("EMI Payment Principal/Interest Split")
+                else:
+                    result.add_fail("EMI Payment Principal/Interest Split", f"Unexpected split: {emi_result}")
             else:
                 result.add_fail("EMI Payment", "Missing transaction_id or new_balance")
         elif response.status_code == 400:
@@ -466,6 +817,13 @@ def test_investments():
                 result.add_fail("Portfolio Summary", f"Missing fields: {missing_fields}")
             else:
                 result.add_pass("Portfolio Summary")
+                
+                # Per-type breakdown must add up to the totals
+                by_type_count = sum(t["investments_count"] for t in portfolio.get("by_type", []))
+                if by_type_count == portfolio["investments_count"]:
+                    result.add_pass("Portfolio Summary By Type")
+                else:
+                    result.add_fail("Portfolio Summary By Type", f"{by_type_count} != {portfolio['investments_count']}")
         else:
             result.add_fail("Portfolio Summary", f"Status code: {response.status_code}")
         
@@ -473,7 +831,7 @@ def test_investments():
         response = make_request("GET", "/investments/", headers=get_auth_headers())
         
         if response.status_code == 200:
-            investments = response.json()
+            investments = response.json().get("investments")
             if isinstance(investments, list):
                 result.add_pass("Get User Investments")
                 
@@ -489,16 +847,23 @@ def test_investments():
                 else:
                     result.add_pass("Investment Structure (No investments)")
             else:
-                result.add_fail("Get User Investments", "Response is not a list")
+                result.add_fail("Get User Investments", "Response has no investments list")
         else:
             result.add_fail("Get User Investments", f"Status code: {response.status_code}")
         
+        # Units are derived from the market price, so inflated units are refused
+        inflated = {"type": "Mutual Fund", "name": "Equity Growth Fund", "amount": 100, "units": 1000000}
+        response = make_request("POST", "/investments/", inflated, headers=get_auth_headers())
+        if response.status_code == 422:
+            result.add_pass("Inflated Units Rejected")
+        else:
+            result.add_fail("Inflated Units Rejected", f"Expected 422, got {response.status_code}")
+        
         # Test create investment
         investment_data = {
             "type": "Mutual Fund",
             "name": "Test Growth Fund",
-            "amount": 5000,
-            "units": 250
+            "amount": 5000
         }
         
         response = make_request("POST", "/investments/", investment_data, headers=get_auth_headers())
@@ -597,10 +962,52 @@ def test_authentication_middleware():
         else:
             result.add_fail("Authentication Middleware (Invalid Token)", 
                           f"Expected 401/403, got {response.status_code}")
+        
+        # Internal endpoints need a token with the admin scope
+        for endpoint in ("/internal/cache-stats", "/internal/hashing-stats", "/internal/pool-stats"):
+            anonymous = make_request("GET", endpoint)
+            customer = make_request("GET", endpoint, headers=get_auth_headers())
+            if anonymous.status_code in (401, 403) and customer.status_code == 403:
+                result.add_pass(f"Internal Endpoint Protected ({endpoint})")
+            else:
+                result.add_fail(f"Internal Endpoint Protected ({endpoint})",
+                              f"Got {anonymous.status_code} without and {customer.status_code} with a customer token")
             
     except Exception as e:
         result.add_fail("Authentication Middleware", str(e))
 
+def test_token_revocation():
+    """Test that signing out all sessions revokes earlier access tokens"""
+    global auth_token
+
+    try:
+        response = make_request("POST", "/auth/logout-all", headers=get_auth_headers())
+        if response.status_code != 200:
+            result.add_fail("Logout All Sessions", f"Status code: {response.status_code}")
+            return
+        result.add_pass("Logout All Sessions")
+
+        response = make_request("GET", "/transactions/history", headers=get_auth_headers())
+        if response.status_code == 401:
+            result.add_pass("Revoked Token Rejected")
+        else:
+            result.add_fail("Revoked Token Rejected", f"Expected 401, got {response.status_code}")
+
+        # A fresh login carries the new token version
+        response = make_request("POST", "/auth/login", TEST_USER)
+        if response.status_code == 200:
+            auth_token = response.json()["access_token"]
+            response = make_request("GET", "/transactions/history", headers=get_auth_headers())
+            if response.status_code == 200:
+                result.add_pass("Token After Revocation")
+            else:
+                result.add_fail("Token After Revocation", f"Status code: {response.status_code}")
+        else:
+            result.add_fail("Token After Revocation", f"Login status code: {response.status_code}")
+
+    except Exception as e:
+        result.add_fail("Token Revocation", str(e))
+
 def run_all_tests():
     """Run all backend tests"""
     print("🚀 Starting SecureBank Backend API Tests")
@@ -618,14 +1025,22 @@ def run_all_tests():
         result.summary()
         return
     
+    test_refresh_token()
+    test_otp()
+    
     # User management tests
     test_user_profile()
     
     # Transaction tests
     test_transaction_history()
+    test_statement_export()
+    test_spending_analytics()
     test_send_money()
+    test_idempotent_send_money()
+    test_batch_send_money()
     test_request_money()
     test_qr_payment()
+    test_concurrent_debits()
     
     # Loan tests
     test_loans()
@@ -635,6 +1050,7 @@ def run_all_tests():
     
     # Security tests
     test_authentication_middleware()
+    test_token_revocation()
     
     # Print summary
     result.summary()
@@ -2,6 +2,7 @@ import React, { useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useAuth } from '../contexts/AuthContext';
 import { useToast } from '../contexts/ToastContext';
+import { authAPI } from '../services/api';
 import { Button } from './ui/button';
 import { Input } from './ui/input';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from './ui/card';
@@ -65,7 +66,12 @@ const AuthFlow = () => {
     }
 
     setLoading(true);
-    setShowOTP(true);
+    try {
+      await authAPI.requestOTP(formData.email);
+      setShowOTP(true);
+    } catch (error) {
+      addToast(error.response?.data?.detail || 'Could not send OTP', 'error');
+    }
     setLoading(false);
   };
 
@@ -77,17 +83,23 @@ const AuthFlow = () => {
     }
 
     setLoading(true);
-    // Simulate OTP verification
-    setTimeout(() => {
-      const result = signup(formData);
-      if (result.success) {
-        addToast('Account created successfully!', 'success');
-        navigate('/');
-      } else {
-        addToast('Signup failed', 'error');
-      }
+    let verificationToken;
+    try {
+      const response = await authAPI.verifyOTP(otpCode, formData.email);
+      verificationToken = response.data.verification_token;
+    } catch (error) {
+      addToast(error.response?.data?.detail || 'Invalid OTP', 'error');
       setLoading(false);
-    }, 1000);
+      return;
+    }
+    const result = await signup({ ...formData, verification_token: verificationToken });
+    if (result.success) {
+      addToast('Account created successfully!', 'success');
+      navigate('/');
+    } else {
+      addToast(result.error || 'Signup failed', 'error');
+    }
+    setLoading(false);
   };
 
   if (showOTP) {
@@ -100,7 +112,7 @@ const AuthFlow = () => {
             </div>
             <CardTitle className="text-2xl font-bold text-gray-900">Verify OTP</CardTitle>
             <CardDescription>
-              Enter the 6-digit code sent to {formData.phone}
+              Enter the 6-digit code sent to {formData.email}
             </CardDescription>
           </CardHeader>
           <CardContent>
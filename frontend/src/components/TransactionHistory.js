@@ -13,6 +13,8 @@ const TransactionHistory = () => {
   const { addToast } = useToast();
   const [transactions, setTransactions] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
   const [searchTerm, setSearchTerm] = useState('');
   const [filterType, setFilterType] = useState('all');
   const [filterCategory, setFilterCategory] = useState('all');
@@ -21,15 +23,19 @@ const TransactionHistory = () => {
     loadTransactions();
   }, [filterType, filterCategory]);
 
+  const buildParams = () => {
+    const params = {};
+    if (filterType !== 'all') params.type = filterType;
+    if (filterCategory !== 'all') params.category = filterCategory;
+    return params;
+  };
+
   const loadTransactions = async () => {
     try {
       setLoading(true);
-      const params = {};
-      if (filterType !== 'all') params.type = filterType;
-      if (filterCategory !== 'all') params.category = filterCategory;
-      
-      const response = await transactionAPI.getHistory(params);
-      setTransactions(response.data);
+      const response = await transactionAPI.getHistory(buildParams());
+      setTransactions(response.data.transactions);
+      setNextCursor(response.data.next_cursor);
     } catch (error) {
       addToast('Failed to load transactions', 'error');
     } finally {
@@ -37,6 +43,19 @@ const TransactionHistory = () => {
     }
   };
 
+  const loadMoreTransactions = async () => {
+    try {
+      setLoadingMore(true);
+      const response = await transactionAPI.getHistory({ ...buildParams(), cursor: nextCursor });
+      setTransactions(prev => [...prev, ...response.data.transactions]);
+      setNextCursor(response.data.next_cursor);
+    } catch (error) {
+      addToast('Failed to load transactions', 'error');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const filteredTransactions = transactions.filter(transaction => 
     transaction.description.toLowerCase().includes(searchTerm.toLowerCase())
   );
@@ -234,6 +253,16 @@ const TransactionHistory = () => {
                 </CardContent>
               </Card>
             ))}
+            {nextCursor && (
+              <Button
+                variant="outline"
+                onClick={loadMoreTransactions}
+                disabled={loadingMore}
+                className="w-full"
+              >
+                {loadingMore ? 'Loading...' : 'Load More'}
+              </Button>
+            )}
           </div>
         )}
       </div>
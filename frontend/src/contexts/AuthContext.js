@@ -32,6 +32,7 @@ export const AuthProvider = ({ children }) => {
         .catch(() => {
           // Token is invalid
           localStorage.removeItem('authToken');
+          localStorage.removeItem('refreshToken');
           localStorage.removeItem('bankingUser');
           setUser(null);
         });
@@ -42,10 +43,11 @@ export const AuthProvider = ({ children }) => {
   const login = async (email, password) => {
     try {
       const response = await authAPI.login(email, password);
-      const { user: userData, access_token } = response.data;
+      const { user: userData, access_token, refresh_token } = response.data;
       
       setUser(userData);
       localStorage.setItem('authToken', access_token);
+      localStorage.setItem('refreshToken', refresh_token);
       localStorage.setItem('bankingUser', JSON.stringify(userData));
       
       return { success: true };
@@ -60,10 +62,11 @@ export const AuthProvider = ({ children }) => {
   const signup = async (userData) => {
     try {
       const response = await authAPI.signup(userData);
-      const { user: newUser, access_token } = response.data;
+      const { user: newUser, access_token, refresh_token } = response.data;
       
       setUser(newUser);
       localStorage.setItem('authToken', access_token);
+      localStorage.setItem('refreshToken', refresh_token);
       localStorage.setItem('bankingUser', JSON.stringify(newUser));
       
       return { success: true };
@@ -76,8 +79,14 @@ export const AuthProvider = ({ children }) => {
   };
 
   const logout = () => {
+    const refreshToken = localStorage.getItem('refreshToken');
+    if (refreshToken) {
+      // Best effort, the session also ends when the refresh token expires
+      authAPI.logout(refreshToken).catch(() => {});
+    }
     setUser(null);
     localStorage.removeItem('authToken');
+    localStorage.removeItem('refreshToken');
     localStorage.removeItem('bankingUser');
   };
 
@@ -25,14 +25,50 @@ api.interceptors.request.use(
   }
 );
 
-// Add response interceptor to handle auth errors
+const clearSession = () => {
+  localStorage.removeItem('authToken');
+  localStorage.removeItem('refreshToken');
+  localStorage.removeItem('bankingUser');
+};
+
+// Refresh tokens are single use, so concurrent 401s share one refresh call
+let refreshing = null;
+
+const refreshAccessToken = () => {
+  if (!refreshing) {
+    const refreshToken = localStorage.getItem('refreshToken');
+    refreshing = axios
+      .post(`${API_BASE_URL}/auth/refresh`, { refresh_token: refreshToken })
+      .then((response) => {
+        localStorage.setItem('authToken', response.data.access_token);
+        localStorage.setItem('refreshToken', response.data.refresh_token);
+        return response.data.access_token;
+      })
+      .finally(() => {
+        refreshing = null;
+      });
+  }
+  return refreshing;
+};
+
+// Add response interceptor to renew expired tokens and handle auth errors
 api.interceptors.response.use(
   (response) => response,
-  (error) => {
+  async (error) => {
+    const request = error.config;
     if (error.response?.status === 401) {
+      if (localStorage.getItem('refreshToken') && request && !request._retried) {
+        request._retried = true;
+        try {
+          const token = await refreshAccessToken();
+          request.headers.Authorization = `Bearer ${token}`;
+          return api(request);
+        } catch (refreshError) {
+          // Refresh token expired or revoked, fall through to a new login
+        }
+      }
       // Token expired or invalid
-      localStorage.removeItem('authToken');
-      localStorage.removeItem('bankingUser');
+      clearSession();
       window.location.href = '/auth';
     }
     return Promise.reject(error);
@@ -47,11 +83,17 @@ export const authAPI = {
   signup: (userData) => 
     api.post('/auth/signup', userData),
   
+  requestOTP: (email) => 
+    api.post('/auth/request-otp', { email }),
+  
   verifyOTP: (otp, email) => 
     api.post('/auth/verify-otp', { otp, email }),
   
   getCurrentUser: () => 
     api.get('/auth/me'),
+  
+  logout: (refreshToken) => 
+    api.post('/auth/logout', { refresh_token: refreshToken }),
 };
 
 // User API
@@ -74,6 +116,9 @@ export const transactionAPI = {
   sendMoney: (sendData) => 
     api.post('/transactions/send-money', sendData),
   
+  batchSendMoney: (items) => 
+    api.post('/transactions/batch-send', { items }),
+  
   requestMoney: (requestData) => 
     api.post('/transactions/request-money', requestData),
   
@@ -83,14 +128,20 @@ export const transactionAPI = {
   getRecent: (limit = 5) => 
     api.get('/transactions/recent', { params: { limit } }),
   
+  getAnalytics: (months = 12) => 
+    api.get('/transactions/analytics', { params: { months } }),
+  
+  getSummary: (months = 6) => 
+    api.get('/transactions/summary', { params: { months } }),
+  
   processQRPayment: (paymentData) => 
     api.post('/transactions/qr-payment', paymentData),
 };
 
 // Loan API
 export const loanAPI = {
-  getLoans: () => 
-    api.get('/loans'),
+  getLoans: (params = {}) => 
+    api.get('/loans', { params }),
   
   applyForLoan: (loanData) => 
     api.post('/loans/apply', loanData),
@@ -102,6 +153,16 @@ export const loanAPI = {
     api.get('/loans/calculator', { 
       params: { loan_amount: loanAmount, interest_rate: interestRate, tenure_months: tenureMonths } 
     }),
+  
+  getEMISchedule: (loanAmount, interestRate, tenureMonths) => 
+    api.get('/loans/calculator/schedule', { 
+      params: { loan_amount: loanAmount, interest_rate: interestRate, tenure_months: tenureMonths } 
+    }),
+  
+  compareEMIScenarios: (loanAmounts, interestRates, tenureMonths) => 
+    api.post('/loans/calculator/batch', { 
+      loan_amounts: loanAmounts, interest_rates: interestRates, tenure_months: tenureMonths 
+    }),
 };
 
 // Investment API
@@ -109,8 +170,8 @@ export const investmentAPI = {
   getPortfolioSummary: () => 
     api.get('/investments/portfolio'),
   
-  getInvestments: () => 
-    api.get('/investments'),
+  getInvestments: (params = {}) => 
+    api.get('/investments', { params }),
   
   createInvestment: (investmentData) => 
     api.post('/investments', investmentData),
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The backend is imported as it runs, from its own directory
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
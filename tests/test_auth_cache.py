@@ -0,0 +1,117 @@
+import asyncio
+import time
+import pytest
+from fastapi import HTTPException
+from services import auth, ledger
+from services.cache import TTLCache
+
+class Users:
+    def __init__(self, *users):
+        self.users = {user["id"]: user for user in users}
+
+    async def find_one(self, query, projection=None):
+        user = self.users.get(query.get("id"))
+        if user is None:
+            return None
+        # Only exclusion projections matter here
+        return {key: value for key, value in user.items() if (projection or {}).get(key, 1)}
+
+class Database:
+    def __init__(self, *users):
+        self.users = Users(*users)
+
+def user(user_id):
+    return {"id": user_id, "email": f"{user_id}@example.com", "token_version": 0, "balance": 100.0}
+
+def token(user_id, ttl=60):
+    return auth.verifier.sign({
+        "sub": f"{user_id}@example.com",
+        "uid": user_id,
+        "ver": 0,
+        "exp": int(time.time()) + ttl,
+    })
+
+def reset(maxsize, ttl=30):
+    auth.principal_cache = TTLCache(maxsize=maxsize, ttl=ttl, on_evict=auth._forget_token)
+    auth._tokens_by_user.clear()
+
+def tracked():
+    return sum(len(tokens) for tokens in auth._tokens_by_user.values())
+
+def test_evict_callback_on_lru_and_expiry():
+    evicted = []
+    cache = TTLCache(maxsize=2, ttl=30, on_evict=lambda key, value: evicted.append(key))
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("c", 3)
+    assert evicted == ["a"]
+
+    cache.set("d", 4, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("d") is None
+    assert evicted == ["a", "b", "d"]
+
+    cache.pop("c")
+    assert evicted == ["a", "b", "d"]
+
+def test_tokens_by_user_bounded_by_cache():
+    reset(maxsize=5)
+    db = Database(*(user(f"u{i}") for i in range(20)))
+
+    async def logins():
+        for i in range(20):
+            for _ in range(3):
+                await auth.get_current_user(token(f"u{i}"), db)
+
+    asyncio.run(logins())
+    assert len(auth.principal_cache) == 5
+    assert tracked() == 5
+
+def test_expired_tokens_are_forgotten():
+    reset(maxsize=100, ttl=0.01)
+    db = Database(user("u1"))
+    expired = token("u1")
+    asyncio.run(auth.get_current_user(expired, db))
+    time.sleep(0.02)
+    # Looking it up again drops the expired entry
+    assert auth.principal_cache.get(expired) is None
+    assert tracked() == 0
+
+def test_invalidate_user_drops_cached_principals():
+    reset(maxsize=100)
+    db = Database(user("u1"), user("u2"))
+    first, second, other = token("u1"), token("u1", ttl=120), token("u2")
+
+    async def login_all():
+        for t in (first, second, other):
+            await auth.get_current_user(t, db)
+
+    asyncio.run(login_all())
+    db.users.users["u1"]["name"] = "Renamed"
+    auth.invalidate_user("u1")
+
+    assert first not in auth.principal_cache and second not in auth.principal_cache
+    assert other in auth.principal_cache
+    assert "u1" not in auth._tokens_by_user
+    assert asyncio.run(auth.get_current_user(first, db))["name"] == "Renamed"
+
+def test_balance_is_never_cached():
+    reset(maxsize=100)
+    db = Database(user("u1"))
+    t = token("u1")
+
+    assert "balance" not in asyncio.run(auth.get_current_user(t, db))
+    # Another worker moves money; this worker's cached principal is untouched
+    db.users.users["u1"]["balance"] = 40.0
+    assert t in auth.principal_cache
+    assert asyncio.run(ledger.current_balance(db, "u1")) == 40.0
+
+def test_inactive_user_is_rejected():
+    reset(maxsize=100)
+    db = Database({**user("u1"), "is_active": False})
+    t = token("u1")
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(auth.get_current_user(t, db))
+    assert exc.value.status_code == 401
+    assert t not in auth.principal_cache
@@ -0,0 +1,140 @@
+import asyncio
+import time
+from services import rate_limit
+from services.rate_limit import LocalBucketStore, RateLimitMiddleware, Rule
+from services.tokens import verifier
+
+RULES = {
+    "auth": Rule("auth", burst=2, rate=1.0, per_user=False),
+    "transfers": Rule("transfers", burst=2, rate=1.0, per_user=True),
+    "reads": Rule("reads", burst=5, rate=1.0, per_user=True),
+}
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class RecordingStore:
+    """Lets every request through and remembers the bucket keys"""
+
+    def __init__(self):
+        self.taken = []
+
+    async def take(self, key, rule):
+        self.taken.append((key, rule.group))
+        return 0.0
+
+async def app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+def call(middleware, method, path, headers=(), client="10.0.0.1"):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "headers": [(name.encode(), value.encode()) for name, value in headers],
+        "client": (client, 50000),
+    }
+    asyncio.run(middleware(scope, None, send))
+    start = messages[0]
+    return start["status"], dict(start["headers"])
+
+def token(user_id):
+    return verifier.sign({"sub": f"{user_id}@example.com", "uid": user_id, "ver": 0, "exp": int(time.time()) + 60})
+
+def test_bucket_allows_burst_then_refills(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    store = LocalBucketStore()
+    rule = Rule("test", burst=3, rate=0.5, per_user=False)
+
+    take = lambda: asyncio.run(store.take("k", rule))
+    assert [take() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert take() == 2.0
+
+    clock.now += 1
+    assert take() == 1.0
+    clock.now += 2
+    assert take() == 0.0
+
+    # Refilling never exceeds the burst
+    clock.now += 100
+    assert [take() for _ in range(4)] == [0.0, 0.0, 0.0, 2.0]
+
+def test_bucket_store_drops_least_recently_used():
+    store = LocalBucketStore(max_keys=2)
+    rule = Rule("test", burst=1, rate=0.001, per_user=False)
+    for key in ("a", "b", "a", "c"):
+        asyncio.run(store.take(key, rule))
+    assert list(store._buckets) == ["a", "c"]
+
+def test_rejection_is_429_with_retry_after(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    middleware = RateLimitMiddleware(app, rules=RULES, store=LocalBucketStore(), proxy_hops=0)
+
+    assert call(middleware, "POST", "/api/auth/login")[0] == 200
+    assert call(middleware, "POST", "/api/auth/login")[0] == 200
+    status, headers = call(middleware, "POST", "/api/auth/login")
+    assert status == 429
+    assert headers[b"retry-after"] == b"1"
+    assert headers[b"content-type"] == b"application/json"
+
+    clock.now += 1
+    assert call(middleware, "POST", "/api/auth/login")[0] == 200
+
+def test_route_groups():
+    store = RecordingStore()
+    middleware = RateLimitMiddleware(app, rules=RULES, store=store, proxy_hops=0)
+    requests = [
+        ("POST", "/api/auth/signup", "auth"),
+        ("POST", "/api/transactions/send-money", "transfers"),
+        ("POST", "/api/loans/pay-emi/loan-1", "transfers"),
+        ("POST", "/api/user/update-balance", "transfers"),
+        ("DELETE", "/api/investments/inv-1", "transfers"),
+        ("GET", "/api/investments/", "reads"),
+        ("GET", "/api/transactions/history", "reads"),
+    ]
+    for method, path, _ in requests:
+        call(middleware, method, path)
+    assert [group for _, group in store.taken] == [group for _, _, group in requests]
+
+    # Health checks, preflights and paths outside the API are not limited
+    call(middleware, "GET", "/api/health")
+    call(middleware, "OPTIONS", "/api/transactions/send-money")
+    call(middleware, "GET", "/docs")
+    assert len(store.taken) == len(requests)
+
+def test_keys_per_user_and_per_ip():
+    store = RecordingStore()
+    middleware = RateLimitMiddleware(app, rules=RULES, store=store, proxy_hops=0)
+    bearer = [("authorization", f"Bearer {token('user-1')}")]
+
+    call(middleware, "POST", "/api/transactions/send-money", bearer)
+    call(middleware, "POST", "/api/transactions/send-money", bearer, client="10.0.0.2")
+    call(middleware, "POST", "/api/transactions/send-money", [("authorization", "Bearer forged")])
+    # Auth endpoints are limited per IP even with a token
+    call(middleware, "POST", "/api/auth/refresh", bearer)
+    assert [key for key, _ in store.taken] == [
+        "transfers:user:user-1",
+        "transfers:user:user-1",
+        "transfers:ip:10.0.0.1",
+        "auth:ip:10.0.0.1",
+    ]
+
+def test_client_ip_behind_proxy():
+    store = RecordingStore()
+    middleware = RateLimitMiddleware(app, rules=RULES, store=store, proxy_hops=1)
+
+    call(middleware, "POST", "/api/auth/login", [("x-forwarded-for", "spoofed, 203.0.113.7")], client="10.0.0.9")
+    call(middleware, "POST", "/api/auth/login", client="10.0.0.9")
+    assert [key for key, _ in store.taken] == ["auth:ip:203.0.113.7", "auth:ip:10.0.0.9"]
@@ -0,0 +1,102 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from services import rollups
+
+# $out and $merge need a real server; point this at a disposable MongoDB
+MONGO_TEST_URL = os.environ.get("MONGO_TEST_URL")
+
+pytestmark = pytest.mark.skipif(not MONGO_TEST_URL, reason="MONGO_TEST_URL is not set")
+
+def transaction(user_id, type, amount, category, date):
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "type": type,
+        "amount": amount,
+        "category": category,
+        "description": "test",
+        "date": date,
+    }
+
+TRANSACTIONS = [
+    transaction("u1", "debit", 120.5, "Shopping", datetime(2024, 1, 3)),
+    transaction("u1", "debit", 30.25, "Shopping", datetime(2024, 1, 20)),
+    transaction("u1", "credit", 5000.0, "Salary", datetime(2024, 1, 31, 23, 59)),
+    transaction("u1", "debit", 99.99, "Bills", datetime(2024, 2, 1)),
+    transaction("u2", "credit", 250.0, "Transfer", datetime(2024, 1, 15)),
+    transaction("u2", "debit", 75.1, "Food", datetime(2024, 3, 9)),
+]
+
+def stored(documents):
+    return {
+        (r["user_id"], r["month"], r["category"]): {f: r[f] for f in rollups.ROLLUP_FIELDS}
+        for r in documents
+    }
+
+def assert_same(actual, expected):
+    assert actual.keys() == expected.keys()
+    for key, totals in expected.items():
+        assert actual[key] == pytest.approx(totals, abs=rollups.TOLERANCE)
+
+def run(test):
+    async def with_database():
+        client = AsyncIOMotorClient(MONGO_TEST_URL)
+        name = f"rollups_test_{uuid.uuid4().hex}"
+        db = client[name]
+        try:
+            await db.transaction_rollups.create_index(
+                [("user_id", 1), ("month", -1), ("category", 1)], unique=True
+            )
+            await test(db)
+        finally:
+            await client.drop_database(name)
+            client.close()
+
+    asyncio.run(with_database())
+
+async def record_incrementally(db):
+    """Insert the transactions and fold them in the way the transfer engine does"""
+    for t in TRANSACTIONS:
+        await db.transactions.insert_one(dict(t))
+        await rollups.record(db, [t])
+    return stored(await db.transaction_rollups.find({}, {"_id": 0}).to_list(None))
+
+def test_rebuild_matches_incremental_rollups():
+    async def test(db):
+        incremental = await record_incrementally(db)
+        # A rollup drifted and one is no longer backed by any transaction
+        await db.transaction_rollups.update_one(
+            {"user_id": "u1", "month": "2024-01", "category": "Shopping"}, {"$inc": {"debit": 1}}
+        )
+        await db.transaction_rollups.insert_one(
+            {"user_id": "u1", "month": "2023-12", "category": "Food",
+             "credit": 0, "debit": 10, "credit_count": 0, "debit_count": 1,
+             "updated_at": datetime(2023, 12, 31)}
+        )
+        assert await rollups.check(db)
+
+        assert await rollups.rebuild(db) == len(incremental)
+        assert_same(stored(await db.transaction_rollups.find({}, {"_id": 0}).to_list(None)), incremental)
+        assert await rollups.check(db) == []
+        assert not [name for name in await db.list_collection_names() if name.startswith("transaction_rollups_rebuild_")]
+
+    run(test)
+
+def test_rebuild_of_one_user_leaves_others_alone():
+    async def test(db):
+        incremental = await record_incrementally(db)
+        await db.transaction_rollups.update_many({"user_id": "u2"}, {"$inc": {"credit": 1}})
+        drifted = stored(await db.transaction_rollups.find({"user_id": "u2"}, {"_id": 0}).to_list(None))
+
+        await rollups.rebuild(db, "u1")
+        assert_same(
+            stored(await db.transaction_rollups.find({"user_id": "u1"}, {"_id": 0}).to_list(None)),
+            {k: v for k, v in incremental.items() if k[0] == "u1"}
+        )
+        assert stored(await db.transaction_rollups.find({"user_id": "u2"}, {"_id": 0}).to_list(None)) == drifted
+
+    run(test)